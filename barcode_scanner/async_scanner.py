@@ -0,0 +1,304 @@
+'''
+`asyncio` facade for `BarcodeScanner`.
+
+Usage (Python 2, using the `trollius` backport of `asyncio`):
+
+    import trollius as asyncio
+    from trollius import From
+
+    @asyncio.coroutine
+    def print_symbols(pipeline_command):
+        scanner = AsyncScanner(pipeline_command)
+        yield From(scanner.open())
+        try:
+            while True:
+                try:
+                    event = yield From(scanner.get())
+                except ScannerClosed:
+                    break
+                print [symbol.data for symbol in event.symbols]
+        finally:
+            yield From(scanner.close())
+
+    asyncio.get_event_loop().run_until_complete(print_symbols(command))
+
+The GLib main loop (and GStreamer pipeline) runs in a helper thread, so
+consumers never block frame capture.  Events are buffered in a bounded
+buffer with a configurable overflow policy (see `OVERFLOW_POLICIES`).
+
+The asynchronous context manager and iterator protocols (i.e., `async with`
+and `async for`) are also implemented, for interpreters with `async`
+syntax; no `async` syntax is used in this module.
+'''
+from collections import deque, namedtuple
+import logging
+import threading
+
+try:
+    import asyncio
+except ImportError:
+    import trollius as asyncio
+
+try:
+    StopAsyncIteration = StopAsyncIteration
+except NameError:
+    # Python < 3.5.
+    class StopAsyncIteration(Exception):
+        pass
+
+logger = logging.getLogger(__name__)
+
+#: Buffer overflow policies.
+#:
+#:  - `drop-oldest`: Drop oldest buffered event (newest event wins).
+#:  - `drop-newest`: Drop new event.
+#:  - `block`: Block the emitting thread (i.e., frame capture or decoding)
+#:    until the consumer catches up.
+OVERFLOW_POLICIES = ('drop-oldest', 'drop-newest', 'block')
+
+#: Scanner event.
+#:
+#:  - `kind`: `'symbols'` (`symbols-found`) or `'frame'` (`frame-update`).
+#:  - `np_img`: Video frame.
+#:  - `symbols`: List of symbol records (`None` for `frame` events).
+ScanEvent = namedtuple('ScanEvent', 'kind np_img symbols')
+
+
+class ScannerClosed(Exception):
+    '''
+    Raised by `AsyncScanner.get` once the scanner is closed and all buffered
+    events have been consumed.
+    '''
+    pass
+
+
+class AsyncScanner(object):
+    '''
+    Bridge `BarcodeScanner` signals into an `asyncio` event loop.
+
+    Parameters
+    ----------
+    pipeline_command : str
+        `gst-launch` pipeline command (see `BarcodeScanner`).
+    maxsize : int, optional
+        Maximum number of buffered events.
+    overflow : str, optional
+        Policy when buffer is full (see `OVERFLOW_POLICIES`).
+    frames : bool, optional
+        Also buffer `frame` events for every video frame.
+    loop : asyncio.AbstractEventLoop, optional
+        Event loop of consumer (default: current event loop).
+    **scanner_kwargs
+        Keyword arguments for `BarcodeScanner`.
+
+    Attributes
+    ----------
+    dropped : int
+        Number of events dropped by overflow policy.
+    '''
+    def __init__(self, pipeline_command, maxsize=64, overflow='drop-oldest',
+                 frames=False, loop=None, **scanner_kwargs):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('Overflow policy must be one of: %s' %
+                             ', '.join(OVERFLOW_POLICIES))
+        self.pipeline_command = pipeline_command
+        self.maxsize = max(1, maxsize)
+        self.overflow = overflow
+        self.frames = frames
+        self.loop = asyncio.get_event_loop() if loop is None else loop
+        self.scanner_kwargs = scanner_kwargs
+        self.scanner = None
+        self.dropped = 0
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._waiters = deque()
+        self._closed = False
+        self._error = None
+        self._glib_loop = None
+        self._glib_thread = None
+
+    ###########################################################################
+    # Producer (GLib, GStreamer, or decode worker threads)
+    def _put(self, event):
+        with self._condition:
+            if self._closed:
+                return
+            if len(self._buffer) >= self.maxsize:
+                if self.overflow == 'drop-newest':
+                    self.dropped += 1
+                    return
+                elif self.overflow == 'drop-oldest':
+                    self._buffer.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self._buffer) >= self.maxsize and not \
+                            self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        return
+            self._buffer.append(event)
+        self.loop.call_soon_threadsafe(self._wake)
+
+    def _on_symbols_found(self, scanner, np_img, symbols):
+        self._put(ScanEvent('symbols', np_img, symbols))
+
+    def _on_frame_update(self, scanner, np_img):
+        self._put(ScanEvent('frame', np_img, None))
+
+    def _close(self, error=None):
+        with self._condition:
+            self._closed = True
+            if error is not None and self._error is None:
+                self._error = error
+            self._condition.notify_all()
+        self.loop.call_soon_threadsafe(self._wake)
+
+    ###########################################################################
+    # Consumer (event loop thread)
+    def _wake(self):
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.done():
+                # Cancelled.
+                self._waiters.popleft()
+                continue
+            with self._condition:
+                if self._buffer:
+                    event = self._buffer.popleft()
+                    self._condition.notify()
+                elif self._closed:
+                    event = None
+                else:
+                    return
+            self._waiters.popleft()
+            if event is None:
+                waiter.set_exception(self._error or ScannerClosed())
+            else:
+                waiter.set_result(event)
+
+    def _create_future(self):
+        if hasattr(self.loop, 'create_future'):
+            return self.loop.create_future()
+        return asyncio.Future(loop=self.loop)
+
+    def get(self):
+        '''
+        Returns
+        -------
+        asyncio.Future
+            Next event (see `ScanEvent`).  Raises `ScannerClosed` once the
+            scanner is closed and all buffered events have been consumed
+            (or the pipeline error, if the pipeline failed).
+        '''
+        waiter = self._create_future()
+        self._waiters.append(waiter)
+        self._wake()
+        return waiter
+
+    def detections(self):
+        '''
+        Returns
+        -------
+        AsyncScanner
+            Asynchronous iterator over events, ending when the scanner is
+            closed (e.g., at end of stream).
+        '''
+        return self
+
+    def __aiter__(self):
+        return self
+
+    def __anext__(self):
+        result = self._create_future()
+
+        def on_done(future):
+            if result.done():
+                # Cancelled by consumer.
+                return
+            elif future.cancelled():
+                result.cancel()
+            elif isinstance(future.exception(), ScannerClosed):
+                result.set_exception(StopAsyncIteration())
+            elif future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                result.set_result(future.result())
+
+        waiter = self.get()
+        waiter.add_done_callback(on_done)
+        result.add_done_callback(lambda future: future.cancelled() and
+                                 waiter.cancel())
+        return result
+
+    ###########################################################################
+    # Control methods
+    def start(self):
+        '''
+        Start GLib main loop thread and scanner pipeline (blocking).
+        '''
+        import gobject
+
+        from .scanner import BarcodeScanner
+
+        gobject.threads_init()
+        self.scanner = BarcodeScanner(**self.scanner_kwargs)
+        self.scanner.connect('symbols-found', self._on_symbols_found)
+        if self.frames:
+            self.scanner.connect('frame-update', self._on_frame_update)
+        pipeline, status = self.scanner.start(self.pipeline_command,
+                                              enable_scan=True)
+        bus = pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect('message::eos', lambda bus, message: self._close())
+        bus.connect('message::error', self._on_error)
+
+        self._glib_loop = gobject.MainLoop()
+        self._glib_thread = threading.Thread(target=self._glib_loop.run,
+                                             name='glib-main-loop')
+        self._glib_thread.daemon = True
+        self._glib_thread.start()
+        return self
+
+    def _on_error(self, bus, message):
+        error, debug = message.parse_error()
+        logger.error('Pipeline error: %s (%s)', error, debug)
+        self._close(RuntimeError('Pipeline error: %s' % error))
+
+    def stop(self):
+        '''
+        Stop scanner pipeline and GLib main loop thread (blocking).
+        '''
+        self._close()
+        if self.scanner is not None:
+            self.scanner.stop()
+        if self._glib_loop is not None:
+            self._glib_loop.quit()
+            self._glib_thread.join()
+            self._glib_loop = None
+            self._glib_thread = None
+
+    def open(self):
+        '''
+        Returns
+        -------
+        asyncio.Future
+            Completes once the scanner is started (see `start`; starting the
+            pipeline may block, e.g., opening a camera).
+        '''
+        return self.loop.run_in_executor(None, self.start)
+
+    def close(self):
+        '''
+        Returns
+        -------
+        asyncio.Future
+            Completes once the scanner is stopped (see `stop`).
+        '''
+        return self.loop.run_in_executor(None, self.stop)
+
+    def __aenter__(self):
+        return self.open()
+
+    def __aexit__(self, exc_type, exc_value, traceback):
+        # Result of `None` does not suppress exceptions.
+        return self.close()
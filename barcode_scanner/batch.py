@@ -0,0 +1,280 @@
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.bmp', '.gif', '.jpeg', '.jpg', '.pgm', '.png', '.ppm',
+                    '.tif', '.tiff')
+VIDEO_EXTENSIONS = ('.avi', '.m4v', '.mkv', '.mov', '.mp4', '.mpeg', '.mpg',
+                    '.ogv', '.webm', '.wmv')
+
+# Per-process `zbar.ImageScanner` (see `_init_worker`).
+_image_scanner = None
+
+
+def is_image(path):
+    return os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS
+
+
+def is_video(path):
+    return os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS
+
+
+def expand_paths(patterns):
+    '''
+    Parameters
+    ----------
+    patterns : list
+        Directories (searched recursively), file paths, and/or glob
+        patterns.
+
+    Returns
+    -------
+    list
+        Sorted list of unique image and video file paths.
+    '''
+    paths = set()
+    for pattern_i in patterns:
+        if os.path.isdir(pattern_i):
+            for root, dirs, files in os.walk(pattern_i):
+                paths.update(os.path.join(root, f) for f in files)
+        else:
+            paths.update(glob.glob(pattern_i))
+    return sorted(p for p in paths if is_image(p) or is_video(p))
+
+
+def iter_image_frames(path):
+    '''
+    Iterate through frames of image file (multi-frame images, e.g., TIFF or
+    GIF, yield each frame).
+
+    Yields
+    ------
+    numpy.ndarray
+        Luma plane of each frame.
+    '''
+    import numpy as np
+    import PIL.Image
+
+    image = PIL.Image.open(path)
+    frame_index = 0
+    while True:
+        yield np.asarray(image.convert('L'))
+        frame_index += 1
+        try:
+            image.seek(frame_index)
+        except EOFError:
+            break
+
+
+def iter_video_frames(path):
+    '''
+    Iterate through frames of video file, decoded by GStreamer.
+
+    Yields
+    ------
+    numpy.ndarray
+        Luma plane of each frame.
+
+    Raises
+    ------
+    RuntimeError
+        If the pipeline fails (e.g., unsupported container, or missing
+        decoder).
+    '''
+    import gst
+
+    from .frame_format import frame_from_buffer
+
+    pipeline = gst.parse_launch('filesrc name=file-source ! decodebin2 ! '
+                                'ffmpegcolorspace ! '
+                                'video/x-raw-gray,bpp=8,depth=8 ! '
+                                'appsink name=app-video sync=false')
+    pipeline.get_by_name('file-source').set_property('location', path)
+    app = pipeline.get_by_name('app-video')
+    errors = []
+
+    def on_sync_message(bus, message):
+        # Called on the thread posting the message (e.g., a streaming
+        # thread).  Pulling a buffer never returns after a pipeline error,
+        # so end the stream at the `appsink` to unblock `pull-buffer`.
+        if message.type == gst.MESSAGE_ERROR:
+            error, debug = message.parse_error()
+            errors.append(error.message)
+            app.get_static_pad('sink').send_event(gst.event_new_eos())
+        return gst.BUS_PASS
+
+    bus = pipeline.get_bus()
+    bus.set_sync_handler(on_sync_message)
+    try:
+        if pipeline.set_state(gst.STATE_PLAYING) == \
+                gst.STATE_CHANGE_FAILURE and not errors:
+            errors.append('Could not start pipeline.')
+        while not errors:
+            # Blocks until next buffer is available, or returns `None` at
+            # end of stream (or after a pipeline error).
+            buf = app.emit('pull-buffer')
+            if buf is None:
+                break
+            yield frame_from_buffer(buf.data, buf.caps[0])
+        if errors:
+            raise RuntimeError('Error decoding `%s`: %s' % (path, errors[0]))
+    finally:
+        pipeline.set_state(gst.STATE_NULL)
+        bus.set_sync_handler(None)
+
+
+def iter_frames(path):
+    if is_video(path):
+        return iter_video_frames(path)
+    return iter_image_frames(path)
+
+
+def _init_worker(scanner_config):
+    from .symbologies import create_image_scanner
+
+    global _image_scanner
+    _image_scanner = create_image_scanner(scanner_config)
+
+
+def scan_file(path):
+    '''
+    Scan every frame of image or video file (in worker process).
+
+    Returns
+    -------
+    tuple
+        `(path, detections, error)`, where `detections` is a list of
+        detection dictionaries with `filename`, `frame`, `type`, `data` and
+        `location`, and `error` is `None` unless scanning failed.
+    '''
+    from .scanner import scan_frame
+
+    detections = []
+    try:
+        for frame_index, np_luma in enumerate(iter_frames(path)):
+            for record_i in scan_frame(_image_scanner, np_luma):
+                detections.append({'filename': path, 'frame': frame_index,
+                                   'type': record_i.type,
+                                   'data': record_i.data,
+                                   'location': record_i.location})
+    except Exception as exception:
+        return path, detections, str(exception)
+    return path, detections, None
+
+
+def _done_path(output_path):
+    return output_path + '.done'
+
+
+def _prepare_resume(output_path):
+    '''
+    Discard detections of files that were not completely scanned (e.g., if
+    the output file was only partially written).
+
+    Returns
+    -------
+    set
+        Paths of files that were completely scanned.
+    '''
+    done_path = _done_path(output_path)
+    if not os.path.exists(done_path):
+        done = set()
+    else:
+        with open(done_path) as done_file:
+            done = set(line.rstrip('\n') for line in done_file
+                       if line.endswith('\n'))
+    if os.path.exists(output_path):
+        with open(output_path) as output:
+            lines = [line for line in output if line.endswith('\n')]
+        temp_path = output_path + '.tmp'
+        with open(temp_path, 'w') as output:
+            for line_i in lines:
+                if json.loads(line_i)['filename'] in done:
+                    output.write(line_i)
+        os.rename(temp_path, output_path)
+    # Rewrite list of completed files, dropping any truncated last line.
+    with open(done_path, 'w') as done_file:
+        done_file.writelines('%s\n' % path_i for path_i in sorted(done))
+    return done
+
+
+def scan_files(patterns, output_path='-', processes=None, chunksize=1,
+               resume=False, scanner_config=None):
+    '''
+    Scan image and video files across a pool of processes, writing one JSON
+    line per detection.
+
+    Parameters
+    ----------
+    patterns : list
+        Directories, file paths, and/or glob patterns (see `expand_paths`).
+    output_path : str, optional
+        Output file path, or `-` for `stdout`.  Completed files are tracked
+        in `<output_path>.done`.
+    processes : int, optional
+        Number of worker processes (default: number of CPUs).
+    chunksize : int, optional
+        Number of files handed to a worker process at once.
+    resume : bool, optional
+        Skip files already completed in a previous run writing to the same
+        output file.
+    scanner_config : tuple, optional
+        `zbar` configuration (default: `symbologies.scanner_config()`).
+
+    Returns
+    -------
+    dict
+        Number of `files` scanned, `detections` written, and `errors`.
+    '''
+    if scanner_config is None:
+        from .symbologies import scanner_config as default_config
+
+        scanner_config = default_config()
+
+    paths = expand_paths(patterns)
+    use_stdout = (output_path == '-')
+    if resume and not use_stdout:
+        done = _prepare_resume(output_path)
+        paths = [p for p in paths if p not in done]
+        logger.info('Resuming: %d file(s) already scanned.', len(done))
+
+    if use_stdout:
+        output, done_file = sys.stdout, None
+    else:
+        output = open(output_path, 'a' if resume else 'w')
+        done_file = open(_done_path(output_path), 'a' if resume else 'w')
+
+    summary = {'files': 0, 'detections': 0, 'errors': 0}
+    pool = multiprocessing.Pool(processes, _init_worker, (scanner_config, ))
+    try:
+        for path_i, detections_i, error_i in\
+                pool.imap_unordered(scan_file, paths, chunksize):
+            summary['files'] += 1
+            for detection_j in detections_i:
+                output.write(json.dumps(detection_j) + '\n')
+            summary['detections'] += len(detections_i)
+            if error_i is not None:
+                summary['errors'] += 1
+                logger.error('Error scanning `%s`: %s', path_i, error_i)
+                continue
+            output.flush()
+            if done_file is not None:
+                # Only mark file as complete after its detections are
+                # written.
+                done_file.write(path_i + '\n')
+                done_file.flush()
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        if not use_stdout:
+            output.close()
+            done_file.close()
+    return summary
@@ -1,32 +1,167 @@
 from argparse import ArgumentParser
 import json
 import logging
-import pprint
+import os
 import sys
 
-import gtk
-
+# Only lightweight modules are imported here; heavy modules (e.g., `gtk`,
+# `gst`, `zbar`, `matplotlib`, `PIL`, `pygst_utils`) are imported by each
+# subcommand as needed, to keep command-line startup fast.
+from ..dedup import POLICIES, SymbolDeduplicator
 from ..io_redirect import nostderr
-from ..scanner import BarcodeScanner
+from ..pipeline import (DEFAULT_LATENCY_PROFILE, LATENCY_PROFILES,
+                        PipelineBuilder)
+from ..symbologies import PROFILES, SYMBOLOGIES, scanner_config
 
 logger = logging.getLogger(__name__)
 
 
-def gui_main(pipeline_command):
-    from ..gtk_matplotlib import ScannerView
+def scanner_config_from_args(args):
+    '''
+    Returns
+    -------
+    tuple
+        `zbar` configuration strings, according to `--symbologies`,
+        `--x-density`, and `--y-density` command-line arguments.
+    '''
+    return scanner_config(args.symbologies, x_density=args.x_density,
+                          y_density=args.y_density)
+
+
+def scanner_kwargs_from_args(args):
+    '''
+    Returns
+    -------
+    dict
+        Keyword arguments for `BarcodeScanner`, according to command-line
+        arguments.
+    '''
+    kwargs = {'decode_workers': args.decode_workers,
+              'decode_backend': args.decode_backend,
+              'scanner_config': scanner_config_from_args(args)}
+    if args.roi_tracking:
+        from ..roi import RoiTracker
+
+        kwargs['roi_tracker'] = \
+            RoiTracker(full_scan_interval=args.roi_full_scan_interval)
+    if args.pyramid:
+        from ..pyramid import ScanPyramid
+
+        levels = [int(v) for v in args.pyramid.split(',')]
+        kwargs['pyramid'] = ScanPyramid(levels, method=args.pyramid_method,
+                                        near_miss=args.pyramid_near_miss,
+                                        escalate=args.pyramid_escalate)
+    if args.scene_gate:
+        from ..scene_gate import SceneChangeGate
+
+        kwargs['scene_gate'] = \
+            SceneChangeGate(threshold=args.scene_threshold,
+                            max_interval=args.scene_max_interval)
+    if args.cpu_budget:
+        from ..scheduler import ScanScheduler
+
+        kwargs['scheduler'] = ScanScheduler(cpu_budget=args.cpu_budget,
+                                            idle_after=args.idle_after,
+                                            idle_interval=args.idle_interval,
+                                            burst_duration=
+                                            args.burst_duration,
+                                            max_burst=args.max_burst)
+    if args.retry_preprocess:
+        from ..preprocess import STEPS, RetryPreprocessor
+
+        steps = (STEPS if args.retry_preprocess == 'default' else
+                 [v for v in args.retry_preprocess.split(',') if v])
+        kwargs['preprocessor'] = \
+            RetryPreprocessor(steps, min_structure=args.retry_min_structure,
+                              time_budget=args.retry_budget_ms / 1e3)
+    kwargs['dedup'] = SymbolDeduplicator(policy=args.dedup_policy,
+                                         cooldown=args.dedup_cooldown)
+    if args.stats_interval:
+        kwargs['stats_interval'] = args.stats_interval
+    if args.latency_profile:
+        kwargs['latency_profile'] = args.latency_profile
+    return kwargs
+
+
+def sinks_from_args(args):
+    '''
+    Returns
+    -------
+    list
+        Result sinks (see `sinks.sink_from_url`), according to `--sink` and
+        `--event-store` command-line arguments (writer threads started).
+    '''
+    sinks = []
+    if args.event_store:
+        from ..event_store import EventStoreSink
+
+        max_age = (None if args.event_retention_days is None
+                   else args.event_retention_days * 24 * 60 * 60)
+        sinks.append(EventStoreSink(args.event_store, max_age=max_age,
+                                    max_events=args.event_max_events,
+                                    batch_size=args.sink_batch_size,
+                                    flush_interval=args.sink_flush_interval))
+    if not args.sink:
+        return sinks
+
+    from ..sinks import sink_from_url
+
+    for i, url_i in enumerate(args.sink):
+        spill_path = (None if args.sink_spill_dir is None else
+                      os.path.join(args.sink_spill_dir, 'sink-%d.jsonl' % i))
+        sinks.append(sink_from_url(url_i, batch_size=args.sink_batch_size,
+                                   flush_interval=args.sink_flush_interval,
+                                   spill_path=spill_path))
+    return sinks
+
+
+def log_scanner_stats(scanner):
+    if scanner.pyramid is not None:
+        logger.info('Scan pyramid hits/misses per level: %s',
+                    scanner.pyramid.stats)
+    if scanner.scene_gate is not None:
+        logger.info('Scene gate frames scanned/skipped: %s',
+                    scanner.scene_gate.stats)
+    if scanner.scheduler is not None:
+        logger.info('Scan scheduler: %s', scanner.scheduler.summary())
+    if scanner.preprocessor is not None:
+        logger.info('Retry preprocessing: %s', scanner.preprocessor.summary())
+
+
+def gui_main(pipeline_command, preview='pixbuf', preview_fps=15, sinks=(),
+             **scanner_kwargs):
+    import gtk
+
+    from ..scanner import BarcodeScanner
 
     gtk.gdk.threads_init()
-    scanner = BarcodeScanner()
+    scanner = BarcodeScanner(**scanner_kwargs)
+    for sink_i in sinks:
+        sink_i.attach(scanner)
+    if scanner.stats_interval:
+        from ..stats import log_stats_update
+
+        scanner.connect('stats-update', log_stats_update)
 
     with nostderr():
         pipeline, status = scanner.start(pipeline_command)
 
     def on_exit(*args):
         scanner.stop()
+        for sink_i in sinks:
+            sink_i.close()
+        log_scanner_stats(scanner)
         gtk.main_quit()
 
     window = gtk.Window()
-    scanner_view = ScannerView(scanner)
+    if preview == 'matplotlib':
+        from ..gtk_matplotlib import ScannerView
+
+        scanner_view = ScannerView(scanner)
+    else:
+        from ..gtk_pixbuf import PixbufScannerView
+
+        scanner_view = PixbufScannerView(scanner, max_fps=preview_fps)
     window.add(scanner_view.widget)
     window.connect('destroy', on_exit)
     window.show_all()
@@ -34,30 +169,36 @@ def gui_main(pipeline_command):
     gtk.main()
 
 
-def pipeline_command_from_json(json_source):
-    # Import here, since importing `gst` before calling `parse_args` causes
-    # command-line help to be overridden by GStreamer help.
-    with nostderr():
-        from pygst_utils.video_source import VIDEO_SOURCE_PLUGIN, DEVICE_KEY
-
-    # Set `(red|green|blue)_mask` to ensure RGB channel order for both YUY2
-    # and I420 video sources.  If this is not done, red and blue channels
-    # might be swapped.
-    #
-    # See [here][1] for default mask values.
-    #
-    # [1]: https://www.freedesktop.org/software/gstreamer-sdk/data/docs/latest/gst-plugins-bad-plugins-0.10/gst-plugins-bad-plugins-videoparse.html#GstVideoParse--blue-mask
-    caps_str = (u'video/x-raw-rgb,width={width:d},height={height:d},'
-                u'framerate={framerate_num:d}/{framerate_denom:d}'
-                .format(**json_source))
-    device_str = u'{} {}="{}"'.format(VIDEO_SOURCE_PLUGIN, DEVICE_KEY,
-                                      json_source['device_name'])
-    logging.info('[View] video config device string: %s', device_str)
-    logging.info('[View] video config caps string: %s', caps_str)
-
-    video_command = ''.join([device_str, ' ! ffmpegcolorspace ! ', caps_str,
-                             ' ! appsink name=app-video emit-signals=true'])
-    return video_command
+def run_pipeline(args, pipeline_command):
+    '''
+    Run scanner pipeline, either headless or with GTK preview window.
+    '''
+    scanner_kwargs = scanner_kwargs_from_args(args)
+    if args.headless:
+        from ..headless import headless_main
+
+        scanner = headless_main(pipeline_command, args.output,
+                                sinks=sinks_from_args(args), **scanner_kwargs)
+        log_scanner_stats(scanner)
+    else:
+        gui_main(pipeline_command, preview=args.preview,
+                 preview_fps=args.preview_fps, sinks=sinks_from_args(args),
+                 **scanner_kwargs)
+
+
+def pipeline_command_from_json(json_source, latency_profile=None,
+                               device_cache=None):
+    latency_profile = latency_profile or DEFAULT_LATENCY_PROFILE
+    builder = PipelineBuilder.from_json(json_source, device_cache,
+                                        latency_profile=latency_profile)
+    logging.info('[View] video config device string: %s', builder.source)
+    logging.info('[View] video config caps string: %s', builder.caps)
+    return builder.command()
+
+
+def default_pipeline_command(latency_profile=None):
+    return PipelineBuilder(latency_profile=latency_profile or
+                           DEFAULT_LATENCY_PROFILE).command()
 
 
 def parse_args(args=None):
@@ -70,53 +211,332 @@ def parse_args(args=None):
                             'zbar, and gtk.')
     log_levels = ('critical', 'error', 'warning', 'info', 'debug', 'notset')
 
-    parser_pipeline = ArgumentParser(add_help=False)
+    parser_symbologies = ArgumentParser(add_help=False)
+    parser_symbologies.add_argument('--symbologies', default='default',
+                                    help='Symbology profile (%s), or '
+                                    'comma-separated symbologies (%s).  '
+                                    'Default: %%(default)s' %
+                                    (', '.join(sorted(PROFILES)),
+                                     ', '.join(SYMBOLOGIES)))
+    parser_symbologies.add_argument('--x-density', type=int, help='Scan '
+                                    'every n-th pixel column (zbar default: '
+                                    '1).')
+    parser_symbologies.add_argument('--y-density', type=int, help='Scan '
+                                    'every n-th pixel row (zbar default: 1).')
+
+    parser_pipeline = ArgumentParser(add_help=False,
+                                     parents=[parser_symbologies])
     parser_pipeline.add_argument('-i', '--interactive', action='store_true',
                                  help='Do not start main loop.')
     parser_pipeline.add_argument('-l', '--log-level', type=str, choices=log_levels,
                         default='info')
-
-    default_pipeline = [
-        'autovideosrc name=video-source', '!',
-        'ffmpegcolorspace', '!',
-        'video/x-raw-rgb,format=(fourcc)I420,framerate=30/1,'
-        'width=640,height=480', '!',
-        'videorate', '!',
-        'appsink',
-            'name=app-video',
-            #'enable-last-buffer=true',
-            'emit-signals=true',
-            #'sync=true',
-    ]
-    default_pipeline_command = " ".join(default_pipeline)
+    parser_pipeline.add_argument('--headless', action='store_true',
+                                 help='Run without GUI (GTK is not loaded), '
+                                 'writing one JSON line per found symbol to '
+                                 '`--output`.')
+    parser_pipeline.add_argument('-o', '--output', default='-',
+                                 help='Output JSON lines file for `--headless`'
+                                 ' mode (`-` for stdout).  Default: '
+                                 '%(default)s')
+    parser_pipeline.add_argument('--preview', choices=('pixbuf', 'matplotlib'),
+                                 default='pixbuf', help='Preview widget.  '
+                                 'Default: %(default)s')
+    parser_pipeline.add_argument('--preview-fps', type=float, default=15.,
+                                 help='Maximum preview redraw rate (frames per '
+                                 'second).  Default: %(default)s')
+    parser_pipeline.add_argument('--decode-workers', type=int, default=0,
+                                 help='Number of threads to decode frames on '
+                                 '(newest frame wins when all are busy).  If '
+                                 '0, decode on the GStreamer streaming thread.'
+                                 '  Default: %(default)s')
+    parser_pipeline.add_argument('--decode-backend',
+                                 choices=('thread', 'process'),
+                                 default='thread', help='Decode on worker '
+                                 'threads, or on worker processes fed '
+                                 'through a shared memory frame ring (Python-'
+                                 'side decode work is not serialized by the '
+                                 'GIL).  Default: %(default)s')
+    parser_pipeline.add_argument('--roi-tracking', action='store_true',
+                                 help='After a detection, only scan a region '
+                                 'around the detected symbol(s).')
+    parser_pipeline.add_argument('--roi-full-scan-interval', type=int,
+                                 default=30, help='Maximum number of frames '
+                                 'scanned within region of interest before a '
+                                 'full frame scan.  Default: %(default)s')
+    parser_pipeline.add_argument('--pyramid', metavar='LEVELS',
+                                 help='Comma-separated decimation factors '
+                                 '(e.g., `4,2`) of coarse scan levels.  Full '
+                                 'resolution is only scanned if a coarse '
+                                 'level finds (or nearly finds) a symbol.')
+    parser_pipeline.add_argument('--pyramid-method', choices=('stride', 'box'),
+                                 default='stride', help='Decimation method.  '
+                                 'Default: %(default)s')
+    parser_pipeline.add_argument('--pyramid-near-miss', type=float,
+                                 default=0.02, help='Minimum fraction of edge '
+                                 'pixels in coarse level to escalate to next '
+                                 'level.  Default: %(default)s')
+    parser_pipeline.add_argument('--pyramid-escalate',
+                                 choices=('region', 'full'), default='region',
+                                 help='Full resolution rescan after coarse '
+                                 'level hit.  Default: %(default)s')
+    parser_pipeline.add_argument('--scene-gate', action='store_true',
+                                 help='Skip scanning frames where the scene '
+                                 'has not changed since the last scan.')
+    parser_pipeline.add_argument('--scene-threshold', type=float, default=3.,
+                                 help='Minimum mean absolute luma difference '
+                                 'of scene change.  Default: %(default)s')
+    parser_pipeline.add_argument('--scene-max-interval', type=float,
+                                 default=1., help='Maximum number of seconds '
+                                 'between scans of an unchanged scene.  '
+                                 'Default: %(default)s')
+    parser_pipeline.add_argument('--retry-preprocess', metavar='STEPS',
+                                 nargs='?', const='default',
+                                 help='Rescan frames with barcode-like '
+                                 'structure where nothing was decoded, after '
+                                 'each comma-separated preprocessing step '
+                                 '(`stretch`, `threshold`, `sharpen`) in '
+                                 'turn.  Default steps: all, in that order.')
+    parser_pipeline.add_argument('--retry-min-structure', type=float,
+                                 default=0.02, help='Minimum fraction of edge'
+                                 ' pixels to retry frame.  Default: '
+                                 '%(default)s')
+    parser_pipeline.add_argument('--retry-budget-ms', type=float,
+                                 default=15., help='Maximum milliseconds '
+                                 'spent retrying a frame.  Default: '
+                                 '%(default)s')
+    parser_pipeline.add_argument('--cpu-budget', type=float,
+                                 metavar='FRACTION', help='Adapt scan rate '
+                                 'to spend at most FRACTION of one CPU core '
+                                 'decoding (per camera), scanning at a low '
+                                 'rate while idle and ahead of budget after '
+                                 'a detection or scene change.')
+    parser_pipeline.add_argument('--idle-after', type=float, default=10.,
+                                 help='Seconds without detections (or scene '
+                                 'changes) before scanning at idle rate '
+                                 '(`--cpu-budget`).  Default: %(default)s')
+    parser_pipeline.add_argument('--idle-interval', type=float, default=1.,
+                                 help='Minimum seconds between scans while '
+                                 'idle (`--cpu-budget`).  Default: '
+                                 '%(default)s')
+    parser_pipeline.add_argument('--burst-duration', type=float, default=2.,
+                                 help='Seconds of burst scanning after a '
+                                 'detection or scene change (`--cpu-budget`).'
+                                 '  Default: %(default)s')
+    parser_pipeline.add_argument('--max-burst', type=float, default=10.,
+                                 help='Maximum seconds of burst scanning, '
+                                 'e.g., while a code is held in view '
+                                 '(`--cpu-budget`).  Default: %(default)s')
+    parser_pipeline.add_argument('--dedup-policy', choices=POLICIES,
+                                 default='set-change', help='When to emit '
+                                 'repeated symbols.  Default: %(default)s')
+    parser_pipeline.add_argument('--dedup-cooldown', type=float, default=5.,
+                                 help='Seconds before the same symbol is '
+                                 'emitted again (`cooldown` policy).  '
+                                 'Default: %(default)s')
+    parser_pipeline.add_argument('--sink', action='append', metavar='URL',
+                                 help='Also publish symbols to sink (may be '
+                                 'repeated): `file:PATH[?max_bytes=N&'
+                                 'backup_count=N]` (JSON lines file, rotated '
+                                 'at 64 MiB by default), `unix:PATH` (Unix '
+                                 'domain socket), or `http://...` (JSON '
+                                 '`POST`).  '
+                                 'Sinks write batches on a background '
+                                 'thread.')
+    parser_pipeline.add_argument('--sink-batch-size', type=int, default=100,
+                                 help='Maximum number of symbols per sink '
+                                 'batch.  Default: %(default)s')
+    parser_pipeline.add_argument('--sink-flush-interval', type=float,
+                                 default=1., help='Maximum number of seconds '
+                                 'before a sink batch is written.  Default: '
+                                 '%(default)s')
+    parser_pipeline.add_argument('--sink-spill-dir', help='Directory to spill'
+                                 ' undeliverable sink batches to (default: '
+                                 'drop).')
+    parser_pipeline.add_argument('--event-store', metavar='DATABASE',
+                                 help='Also store symbols in SQLite event '
+                                 'store (see `query` subcommand).')
+    parser_pipeline.add_argument('--event-retention-days', type=float,
+                                 help='Delete stored events older than this '
+                                 'number of days.')
+    parser_pipeline.add_argument('--event-max-events', type=int,
+                                 help='Keep at most this number of stored '
+                                 'events.')
+    parser_pipeline.add_argument('--latency-profile',
+                                 choices=sorted(LATENCY_PROFILES),
+                                 help='Frame buffering in front of the '
+                                 'scanner: `realtime` (always scan the newest'
+                                 ' frame), `balanced`, or `lossless` (never '
+                                 'drop frames).  Default: `%s` for built-in '
+                                 'pipelines.  The appsink of a custom '
+                                 'pipeline is only reconfigured if this '
+                                 'option is given.' % DEFAULT_LATENCY_PROFILE)
+    parser_pipeline.add_argument('--stats-interval', type=float,
+                                 metavar='SECONDS', help='Collect per-stage '
+                                 'latency and frame statistics, and log a '
+                                 'summary line every SECONDS.')
 
     subparsers = parser.add_subparsers(help='sub-command help', dest='command')
 
     parser_launch = subparsers.add_parser('launch', help='Configure pipeline '
                                           'using `gst-launch` syntax.',
                                           parents=[parser_pipeline])
-    parser_launch.add_argument('pipeline', nargs='?',
-                               default=default_pipeline_command,
-                               help='Default: %(default)s')
+    parser_launch.add_argument('pipeline', nargs='?', help='Default: %s' %
+                               default_pipeline_command())
 
     parser_json = subparsers.add_parser('fromjson', help='Configure pipeline'
                                         'from json object including: '
                                         'device_name, width, height, '
-                                        'framerate_num, framerate_denom',
+                                        'framerate_num, framerate_denom '
+                                        '(and optionally fourcc)',
                                         parents=[parser_pipeline])
+    parser_json.add_argument('--no-validate', action='store_true',
+                             help='Do not check configuration against '
+                             'cached device capabilities (see '
+                             '`device_caps`).')
     parser_json.add_argument('json', help='JSON object including: '
                              'device_name, width, height, framerate_num, '
-                             'framerate_denom')
-
-    subparsers.add_parser('device_list', help='List available device names')
+                             'framerate_denom.  If fourcc is a YUV or GRAY8 '
+                             'format, frames are scanned without colorspace '
+                             'conversion.')
+
+    parser_multi = subparsers.add_parser('multi', help='Run several '
+                                         'pipelines (e.g., one per camera) '
+                                         'headless in one process, sharing '
+                                         'decode workers.',
+                                         parents=[parser_pipeline])
+    parser_multi.add_argument('sources', nargs='+', metavar='ID=PIPELINE',
+                              help='Source identifier and `gst-launch` '
+                              'pipeline command (appsink must be named '
+                              '`app-video`).')
+
+    parser_record = subparsers.add_parser('record', help='Record raw frames '
+                                          'of pipeline to a memory-mapped '
+                                          'file (see `replay`).')
+    parser_record.add_argument('pipeline', nargs='?', help='Default: %s' %
+                               default_pipeline_command('lossless'))
+    parser_record.add_argument('-o', '--output', required=True,
+                               help='Output recording file.')
+    parser_record.add_argument('--fps', type=float, help='Nominal frames per '
+                               'second (default: measured frame rate).')
+    parser_record.add_argument('--max-frames', type=int, help='Stop after '
+                               'recording this number of frames.')
+    parser_record.add_argument('--duration', type=float, help='Stop after '
+                               'this number of seconds.')
+
+    parser_replay = subparsers.add_parser('replay', help='Scan frames of a '
+                                          'recording (see `record`), writing '
+                                          'one JSON line per found symbol to '
+                                          '`--output`.',
+                                          parents=[parser_pipeline])
+    parser_replay.add_argument('recording', help='Recording file.')
+    parser_replay.add_argument('--pace', choices=('recorded', 'max'),
+                               default='recorded', help='Replay at recorded '
+                               'frame times, or as fast as frames are '
+                               'processed.  Default: %(default)s')
+    parser_replay.add_argument('--repeat', type=int, default=1,
+                               help='Number of times to replay recording.  '
+                               'Default: %(default)s')
+
+    parser_device_cache = ArgumentParser(add_help=False)
+    parser_device_cache.add_argument('--refresh', action='store_true',
+                                     help='Probe devices, even if cached.')
+    parser_device_cache.add_argument('--cache-ttl', type=float, default=7 *
+                                     24, metavar='HOURS', help='Maximum age '
+                                     'of cached device information (entries '
+                                     'are also refreshed when a device is '
+                                     'plugged or unplugged).  Default: '
+                                     '%(default)s')
+
+    subparsers.add_parser('device_list', help='List available device names',
+                          parents=[parser_device_cache])
 
     parser_device_caps = subparsers.add_parser('device_caps', help='List '
                                                'JSON serialized capabilities '
                                                'for device (compatible with '
-                                               '`fromjson` subcommand).')
+                                               '`fromjson` subcommand).',
+                                               parents=[parser_device_cache])
     parser_device_caps.add_argument('device_name')
 
+    parser_scan_files = subparsers.add_parser('scan-files', help='Scan image '
+                                              'and video files, writing one '
+                                              'JSON line per detection.',
+                                              parents=[parser_symbologies])
+    parser_scan_files.add_argument('paths', nargs='+', help='Directories '
+                                   '(searched recursively), files, or glob '
+                                   'patterns.')
+    parser_scan_files.add_argument('-o', '--output', default='-',
+                                   help='Output JSON lines file (`-` for '
+                                   'stdout).  Default: %(default)s')
+    parser_scan_files.add_argument('-j', '--processes', type=int,
+                                   help='Number of worker processes.  '
+                                   'Default: number of CPUs')
+    parser_scan_files.add_argument('--chunksize', type=int, default=1,
+                                   help='Number of files handed to a worker '
+                                   'process at once.  Default: %(default)s')
+    parser_scan_files.add_argument('--resume', action='store_true',
+                                   help='Skip files completed by a previous '
+                                   'run writing to the same output file.')
+
+    parser_query = subparsers.add_parser('query', help='Query event store '
+                                         '(see `--event-store`), writing '
+                                         'one JSON line per event (newest '
+                                         'first) or per rollup period.')
+    parser_query.add_argument('database', help='Event store database.')
+    parser_query.add_argument('--code', help='Symbol data.')
+    parser_query.add_argument('--type', help='Symbol type (e.g., `QRCODE`).')
+    parser_query.add_argument('--source', help='Source identifier.')
+    parser_query.add_argument('--since', help='UTC ISO 8601 time (or '
+                              'prefix, e.g., `2016-05-01T13`), inclusive.')
+    parser_query.add_argument('--until', help='UTC ISO 8601 time (or '
+                              'prefix), exclusive.')
+    parser_query.add_argument('--limit', type=int, default=100,
+                              help='Maximum number of events (0 for no '
+                              'limit).  Default: %(default)s')
+    parser_query.add_argument('--rollup', choices=('hour', 'day'),
+                              help='Count events per period and type.')
+
+    parser_compact = subparsers.add_parser('compact', help='Apply retention '
+                                           'to event store and rebuild '
+                                           'database.')
+    parser_compact.add_argument('database', help='Event store database.')
+    parser_compact.add_argument('--retention-days', type=float,
+                                help='Delete events older than this number '
+                                'of days.')
+    parser_compact.add_argument('--max-events', type=int, help='Keep at most'
+                                ' this number of events.')
+
+    parser_calibrate = subparsers.add_parser('calibrate', help='Find the '
+                                             'cheapest symbology/density '
+                                             'configuration that decodes all '
+                                             'symbols in sample frames.')
+    parser_calibrate.add_argument('paths', nargs='+', help='Sample image/'
+                                  'video files, directories, or glob '
+                                  'patterns.')
+    parser_calibrate.add_argument('--max-frames', type=int, default=200,
+                                  help='Maximum number of sample frames.  '
+                                  'Default: %(default)s')
+    parser_calibrate.add_argument('--profiles', default=','
+                                  .join(sorted(PROFILES)), help='Comma-'
+                                  'separated candidate profiles.  Default: '
+                                  '%(default)s')
+    parser_calibrate.add_argument('--densities', default='1,2,3,4',
+                                  help='Comma-separated candidate scan '
+                                  'densities.  Default: %(default)s')
+    parser_calibrate.add_argument('--repeat', type=int, default=3,
+                                  help='Timing runs per candidate (best is '
+                                  'used).  Default: %(default)s')
+
     args = parser.parse_args()
+    if args.command == 'multi':
+        # Always headless, with decode workers shared by all sources; options
+        # of a single pipeline that do not apply are rejected.
+        for option_i in ('headless', 'preview', 'preview_fps',
+                         'decode_backend'):
+            if (getattr(args, option_i) !=
+                    parser_pipeline.get_default(option_i)):
+                parser.error('`--%s` is not supported by `multi` (sources '
+                             'always run headless, decoded by shared worker '
+                             'threads).' % option_i.replace('_', '-'))
     if hasattr(args, 'log_level'):
         args.log_level = getattr(logging, args.log_level.upper())
     return args
@@ -124,27 +544,114 @@ def parse_args(args=None):
 
 def main(args=None):
     args = parse_args(args)
+    # Summaries (e.g., `--stats-interval` reports) are logged (to stderr) at
+    # `info` level, which is also used by subcommands without `--log-level`.
+    logging.basicConfig(level=getattr(args, 'log_level', logging.INFO))
 
     if args.command == 'launch':
-        gui_main(args.pipeline)
+        pipeline_command = (args.pipeline or
+                            default_pipeline_command(args.latency_profile))
+        run_pipeline(args, pipeline_command)
     elif args.command == 'fromjson':
+        from ..device_cache import DeviceCache
+
         json_config = json.loads(args.json)
-        pipeline_command = pipeline_command_from_json(json_config)
-        gui_main(pipeline_command)
+        device_cache = None if args.no_validate else DeviceCache()
+        pipeline_command = pipeline_command_from_json(json_config,
+                                                      args.latency_profile,
+                                                      device_cache)
+        run_pipeline(args, pipeline_command)
+    elif args.command == 'multi':
+        from ..headless import headless_manager_main
+
+        sources = []
+        for source_i in args.sources:
+            source_id, _, pipeline_command = source_i.partition('=')
+            if not pipeline_command:
+                raise ValueError('Source must be of the form '
+                                 '`ID=PIPELINE`: %s' % source_i)
+            # Per-source state (deduplication, region of interest, etc.).
+            sources.append((source_id, pipeline_command,
+                            scanner_kwargs_from_args(args)))
+        headless_manager_main(sources, args.output,
+                              decode_workers=args.decode_workers,
+                              stats_log=bool(args.stats_interval),
+                              sinks=sinks_from_args(args))
+    elif args.command == 'record':
+        from ..recording import record_main
+
+        pipeline_command = (args.pipeline or
+                            default_pipeline_command('lossless'))
+        record_main(pipeline_command, args.output, fps=args.fps,
+                    max_frames=args.max_frames, duration=args.duration)
+    elif args.command == 'replay':
+        from ..recording import replay_main
+
+        scanner = replay_main(args.recording, args.output, pace=args.pace,
+                              repeat=args.repeat, sinks=sinks_from_args(args),
+                              **scanner_kwargs_from_args(args))
+        log_scanner_stats(scanner)
     elif args.command == 'device_list':
-        with nostderr():
-            from pygst_utils.video_source import get_video_source_names
+        from ..device_cache import DeviceCache
 
-            print '\n'.join(get_video_source_names())
+        device_cache = DeviceCache(ttl=args.cache_ttl * 60 * 60)
+        print '\n'.join(device_cache.device_names(refresh=args.refresh))
     elif args.command == 'device_caps':
-        with nostderr():
-            from pygst_utils.video_source import (expand_allowed_capabilities,
-                                                  get_allowed_capabilities)
-
-            df_allowed_caps = get_allowed_capabilities(args.device_name)
-            df_source_caps = expand_allowed_capabilities(df_allowed_caps)
-            print '\n'.join([c.to_json() for i, c in
-                             df_source_caps.iterrows()])
+        from ..device_cache import DeviceCache
+
+        device_cache = DeviceCache(ttl=args.cache_ttl * 60 * 60)
+        caps = device_cache.capabilities(args.device_name,
+                                         refresh=args.refresh)
+        print '\n'.join([json.dumps(c, separators=(',', ':')) for c in caps])
+    elif args.command == 'scan-files':
+        from ..batch import scan_files
+
+        summary = scan_files(args.paths, args.output,
+                             processes=args.processes,
+                             chunksize=args.chunksize, resume=args.resume,
+                             scanner_config=scanner_config_from_args(args))
+        logger.info('Scanned %(files)d file(s): %(detections)d detection(s), '
+                    '%(errors)d error(s).', summary)
+    elif args.command == 'query':
+        from ..event_store import EventStore
+
+        store = EventStore(args.database)
+        kwargs = dict(data=args.code, type_=args.type, source=args.source,
+                      since=args.since, until=args.until)
+        if args.rollup:
+            rows = store.rollup(args.rollup, **kwargs)
+        else:
+            rows = store.events(limit=args.limit, **kwargs)
+        for row_i in rows:
+            print json.dumps(row_i, sort_keys=True)
+        store.close()
+    elif args.command == 'compact':
+        from ..event_store import EventStore
+
+        store = EventStore(args.database)
+        max_age = (None if args.retention_days is None
+                   else args.retention_days * 24 * 60 * 60)
+        deleted = store.apply_retention(max_age, args.max_events)
+        store.compact(full=True)
+        store.close()
+        logger.info('Deleted %d event(s).', deleted)
+    elif args.command == 'calibrate':
+        from ..calibrate import calibrate, load_frames
+
+        frames = load_frames(args.paths, args.max_frames)
+        best, candidates = \
+            calibrate(frames, profiles=args.profiles.split(','),
+                      densities=[int(v) for v in args.densities.split(',')],
+                      repeat=args.repeat)
+        for candidate_i in candidates:
+            print json.dumps(candidate_i, sort_keys=True)
+        if best is None:
+            logger.warning('No candidate decoded all symbols.')
+        else:
+            print ('Cheapest configuration: --symbologies %s --x-density %d '
+                   '--y-density %d (%.3f s for %d frame(s))' %
+                   (best['symbologies'], best['x_density'],
+                    best['y_density'], best['seconds'], len(frames)))
 
 
 if __name__ == "__main__":
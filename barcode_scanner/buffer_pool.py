@@ -0,0 +1,128 @@
+'''
+Reusable luma buffers and `zbar.Image` objects.
+
+`zbar.Image` only accepts (immutable) strings as image data, so converting
+frames the obvious way allocates a new luma array, intermediate arrays (for
+RGB frames), a string copy of the luma array, and a new `zbar.Image` for
+every frame.  A `BufferPool` instead keeps, per resolution, a luma array
+and RGB conversion scratch space that frames are converted into in place,
+and a `zbar.Image` that is reused for every frame.  Only the string handed
+to `zbar` is allocated per frame.
+
+Luma planes that already are C-contiguous views of a string (e.g., `I420`
+GStreamer buffers) are handed to the pooled `zbar.Image` as is, without
+copying.
+'''
+from collections import OrderedDict
+import threading
+
+import numpy as np
+
+from . import frame_format
+
+
+class LumaBuffer(object):
+    '''
+    Preallocated luma buffer and `zbar.Image` of one resolution.
+    '''
+    def __init__(self, width, height):
+        import zbar
+
+        self.width = width
+        self.height = height
+        #: Luma of last converted frame.
+        self.array = np.empty((height, width), dtype='uint8')
+        #: Scratch space for RGB conversion (allocated on first use).
+        self.scratch = None
+        self.zbar_image = zbar.Image(width, height, 'Y800')
+
+    def image(self, np_img):
+        '''
+        Returns
+        -------
+        zbar.Image
+            Pooled image holding luma of frame (see `frame_format.luma`).
+        '''
+        zbar_image = self.zbar_image
+        if np_img.ndim == 2 or np_img.shape[2] == 1:
+            np_luma = frame_format.luma(np_img)
+            base = frame_format.y800_base(np_luma)
+            if base is not None:
+                # Zero-copy (e.g., planar YUV buffer).
+                zbar_image.data = base
+                return zbar_image
+            np.copyto(self.array, np_luma)
+        else:
+            if self.scratch is None:
+                self.scratch = np.empty((2, self.height, self.width),
+                                        dtype='uint16')
+            frame_format.rgb_to_luma(np_img, out=self.array,
+                                     scratch=self.scratch)
+        # New string per frame, so strings held by callers (e.g.,
+        # `zbar_image.data` of a previous frame) never change.
+        zbar_image.data = self.array.tobytes()
+        return zbar_image
+
+
+class BufferPool(object):
+    '''
+    Per-thread pool of `LumaBuffer` objects, keyed by resolution.
+
+    Each thread (e.g., decode worker) has its own buffers, since a buffer is
+    overwritten by the next frame scanned.  Up to `max_sizes` resolutions
+    are kept per thread (e.g., full frame and scan pyramid levels); buffers
+    are only (re)allocated when a new resolution is seen, e.g., when caps
+    change.
+
+    Attributes
+    ----------
+    stats : dict
+        Number of buffer `allocations`, and number of frames converted into
+        an existing buffer (`reuses`).
+    '''
+    def __init__(self, max_sizes=4):
+        self.max_sizes = max_sizes
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {'allocations': 0, 'reuses': 0}
+
+    def buffer(self, width, height):
+        '''
+        Returns
+        -------
+        LumaBuffer
+            Buffer of calling thread for resolution.
+        '''
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = OrderedDict()
+        key = (width, height)
+        buffer_ = buffers.pop(key, None)
+        with self._lock:
+            self.stats['reuses' if buffer_ is not None else
+                       'allocations'] += 1
+        if buffer_ is None:
+            buffer_ = LumaBuffer(width, height)
+            while len(buffers) >= self.max_sizes:
+                # Evict least recently used resolution.
+                buffers.popitem(last=False)
+        buffers[key] = buffer_
+        return buffer_
+
+    def image(self, np_img):
+        '''
+        Returns
+        -------
+        zbar.Image
+            Pooled image of calling thread holding luma of frame.  Valid
+            until the next frame of the same resolution is converted by the
+            same thread.
+        '''
+        height, width = np_img.shape[:2]
+        return self.buffer(width, height).image(np_img)
+
+    def reset(self):
+        '''
+        Release buffers of calling thread.
+        '''
+        self._local.buffers = OrderedDict()
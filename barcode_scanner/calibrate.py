@@ -0,0 +1,132 @@
+import itertools
+import logging
+import time
+
+from .symbologies import (PROFILES, SYMBOLOGIES, create_image_scanner,
+                          scanner_config, symbology_name)
+
+logger = logging.getLogger(__name__)
+
+
+def load_frames(patterns, max_frames=None):
+    '''
+    Returns
+    -------
+    list
+        Luma frames from image and video files (see `batch.expand_paths`).
+    '''
+    from .batch import expand_paths, iter_frames
+
+    frames = []
+    for path_i in expand_paths(patterns):
+        for np_luma in iter_frames(path_i):
+            frames.append(np_luma)
+            if max_frames is not None and len(frames) >= max_frames:
+                return frames
+    return frames
+
+
+def ean13_check_digit(digits):
+    '''
+    Returns
+    -------
+    str
+        EAN-13 check digit of first 12 digits.
+    '''
+    total = sum(int(d) * (3 if i % 2 else 1)
+                for i, d in enumerate(digits[:12]))
+    return str((10 - total % 10) % 10)
+
+
+def normalized_symbol(symbol_type, data):
+    '''
+    ISBN codes are EAN-13 codes, which `zbar` reports as `ISBN10`/`ISBN13`
+    only while the ISBN symbologies are enabled.
+
+    Returns
+    -------
+    tuple
+        `(type, data)` of symbol, with ISBN codes as `EAN13` codes.
+    '''
+    symbol_type = str(symbol_type)
+    if symbol_type == 'ISBN13':
+        return 'EAN13', data
+    elif symbol_type == 'ISBN10' and len(data) == 10:
+        # `zbar` reports ISBN-10 data (i.e., `978` prefix and EAN-13 check
+        # digit replaced by ISBN-10 check digit).
+        digits = '978' + data[:9]
+        return 'EAN13', digits + ean13_check_digit(digits)
+    return symbol_type, data
+
+
+def scan_all(config, frames, repeat=1):
+    '''
+    Returns
+    -------
+    tuple
+        `(seconds, decoded)`, where `seconds` is the best total time to scan
+        all frames, and `decoded` is the set of `(frame index, type, data)`
+        symbols found (see `normalized_symbol`).
+    '''
+    from .scanner import scan_frame
+
+    image_scanner = create_image_scanner(config)
+    best = None
+    for i in xrange(repeat):
+        decoded = set()
+        start = time.time()
+        for frame_index, np_luma in enumerate(frames):
+            for record_i in scan_frame(image_scanner, np_luma):
+                decoded.add((frame_index, ) +
+                            normalized_symbol(record_i.type, record_i.data))
+        seconds = time.time() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, decoded
+
+
+def calibrate(frames, profiles=None, densities=(1, 2, 3, 4), repeat=3):
+    '''
+    Find cheapest `zbar` configuration that decodes every symbol found by
+    scanning all frames with all symbologies at full density.
+
+    Candidate configurations are every combination of profile (including an
+    `observed` profile enabling only symbologies found in the reference
+    scan) with x/y scan densities.
+
+    Returns
+    -------
+    tuple
+        `(best, candidates)`, where `candidates` is a list of result
+        dictionaries (sorted by scan time) with `symbologies`, `x_density`,
+        `y_density`, `seconds`, `config`, `missed` (number of reference
+        symbols not decoded) and `ok`, and `best` is the fastest candidate
+        that missed no symbol (or `None`).
+    '''
+    reference_seconds, reference = scan_all(scanner_config(SYMBOLOGIES),
+                                            frames)
+    logger.info('Reference scan found %d symbol(s) in %d frame(s).',
+                len(reference), len(frames))
+
+    if profiles is None:
+        profiles = sorted(PROFILES)
+    candidates_symbologies = [(name_i, PROFILES[name_i])
+                              for name_i in profiles]
+    observed = tuple(sorted(set(symbology_name(type_i)
+                                for frame_index, type_i, data in reference)))
+    if observed:
+        candidates_symbologies.append(('observed', observed))
+
+    candidates = []
+    for (name_i, symbologies_i), x_density, y_density in \
+            itertools.product(candidates_symbologies, densities, densities):
+        config = scanner_config(symbologies_i, x_density, y_density)
+        seconds, decoded = scan_all(config, frames, repeat)
+        missed = len(reference - decoded)
+        candidates.append({'profile': name_i,
+                           'symbologies': ','.join(symbologies_i),
+                           'x_density': x_density, 'y_density': y_density,
+                           'seconds': seconds, 'config': list(config),
+                           'missed': missed, 'ok': not missed})
+    candidates.sort(key=lambda c: c['seconds'])
+    best = next((c for c in candidates if c['ok']), None)
+    return best, candidates
@@ -93,28 +93,19 @@ class BarcodeCanvas(GtkCairoView):
 
 
 def source_string(json_source):
-    # Import here, since importing `gst` before calling `parse_args` causes
-    # command-line help to be overridden by GStreamer help.
-    from pygst_utils.video_source import VIDEO_SOURCE_PLUGIN, DEVICE_KEY
-
-    # Set `(red|green|blue)_mask` to ensure RGB channel order for both YUY2
-    # and I420 video sources.  If this is not done, red and blue channels
-    # might be swapped.
-    #
-    # See [here][1] for default mask values.
-    #
-    # [1]: https://www.freedesktop.org/software/gstreamer-sdk/data/docs/latest/gst-plugins-bad-plugins-0.10/gst-plugins-bad-plugins-videoparse.html#GstVideoParse--blue-mask
-    caps_str = (u'video/x-yuv,width={width:d},height={height:d},'
-                u'red_mask=(int)255,green_mask=(int)65280,'
-                u'blue_mask=(int)16711680,'
-                u'framerate={framerate_num:d}/{framerate_denom:d}'
-                .format(**json_source))
-    device_str = u'{} {}="{}"'.format(VIDEO_SOURCE_PLUGIN, DEVICE_KEY,
-                                      json_source['device_name'])
-    logging.info('[View] video config device string: %s', device_str)
-    logging.info('[View] video config caps string: %s', caps_str)
-
-    return ''.join([device_str, ' ! ffmpegcolorspace ! ', caps_str])
+    '''
+    Returns
+    -------
+    unicode
+        Source part of pipeline for video source configuration (see
+        `pipeline.PipelineBuilder.from_json`), converted to RGB.
+    '''
+    from .pipeline import PipelineBuilder
+
+    builder = PipelineBuilder.from_json(json_source, rgb=True)
+    logging.info('[View] video config device string: %s', builder.source)
+    logging.info('[View] video config caps string: %s', builder.caps)
+    return builder.source_command()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _clock_gettime_ns():
+    '''
+    Returns
+    -------
+    function or None
+        Function returning `CLOCK_MONOTONIC` time (in nanoseconds), read
+        through `clock_gettime` (POSIX), or `None` if not available.
+    '''
+    import ctypes
+    import os
+
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    # `CLOCK_MONOTONIC` is 6 on macOS, and 1 on Linux and most other
+    # platforms.
+    clock_id = 6 if sys.platform == 'darwin' else 1
+    # Symbols of the running process (i.e., the C library), or `librt`
+    # (`glibc < 2.17`).  `ctypes.util.find_library` is not used, since it
+    # runs external commands (slow startup).
+    for name_i in (None, 'librt.so.1'):
+        try:
+            clock_gettime = ctypes.CDLL(name_i, use_errno=True).clock_gettime
+        except (OSError, AttributeError):
+            continue
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        break
+    else:
+        return None
+
+    def monotonic_ns():
+        value = timespec()
+        if clock_gettime(clock_id, ctypes.byref(value)) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return value.tv_sec * 1000000000 + value.tv_nsec
+
+    try:
+        monotonic_ns()
+    except OSError:
+        return None
+    return monotonic_ns
+
+
+try:
+    monotonic_ns = time.monotonic_ns
+except AttributeError:
+    try:
+        _monotonic = time.monotonic
+
+        def monotonic_ns():
+            return int(_monotonic() * 1e9)
+    except AttributeError:
+        # Python < 3.3 has no monotonic clock in the standard library.
+        monotonic_ns = _clock_gettime_ns()
+        if monotonic_ns is None:
+            logger.warning('No monotonic clock available; using wall clock '
+                           '(timing may jump when the system time changes).')
+
+            def monotonic_ns():
+                return int(time.time() * 1e9)
+
+# Reference point relating monotonic clock to wall clock.
+_EPOCH_NS = monotonic_ns()
+_EPOCH_UTC = datetime.utcnow()
+
+
+def utc_datetime(timestamp_ns):
+    '''
+    Returns
+    -------
+    datetime.datetime
+        UTC time corresponding to monotonic timestamp (in nanoseconds).
+    '''
+    return _EPOCH_UTC + timedelta(microseconds=(timestamp_ns - _EPOCH_NS) //
+                                  1000)
+
+
+def utc_isoformat(timestamp_ns):
+    '''
+    Returns
+    -------
+    str
+        UTC time corresponding to monotonic timestamp (in nanoseconds), in ISO
+        8601 format.
+    '''
+    return utc_datetime(timestamp_ns).isoformat()
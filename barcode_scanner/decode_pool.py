@@ -0,0 +1,262 @@
+from collections import OrderedDict
+import logging
+import multiprocessing
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LatestFrameQueue(object):
+    '''
+    Bounded single-slot queue, where the newest item always wins.
+
+    Putting an item while another item is still pending replaces the pending
+    item.  The replaced item is returned to the caller so that it may be
+    accounted for (e.g., marked as dropped).
+    '''
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+
+    def __len__(self):
+        return 0 if self._item is None else 1
+
+    def put(self, item):
+        '''
+        Put item in queue, replacing pending item (if any).
+
+        Returns
+        -------
+
+            Replaced item, or `None` if no item was pending.
+        '''
+        with self._condition:
+            displaced = self._item
+            self._item = item
+            if displaced is not None:
+                self.dropped += 1
+            self._condition.notify()
+        return displaced
+
+    def get(self):
+        '''
+        Block until an item is available.
+
+        Returns
+        -------
+
+            Next item, or `None` if the queue has been closed.
+        '''
+        with self._condition:
+            while self._item is None and not self._closed:
+                self._condition.wait()
+            item, self._item = self._item, None
+            return item
+
+    def discard(self, owner):
+        '''
+        Remove pending `(owner, item)` job of `owner` (if any).
+
+        Returns
+        -------
+
+            Removed job, or `None` if no job of `owner` was pending.
+        '''
+        with self._condition:
+            if self._item is None or self._item[0] is not owner:
+                return None
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        '''
+        Wake all waiting consumers.
+
+        Returns
+        -------
+        list
+            Pending items (if any).
+        '''
+        with self._condition:
+            self._closed = True
+            item, self._item = self._item, None
+            self._condition.notify_all()
+        return [] if item is None else [item]
+
+
+class RoundRobinFrameQueue(object):
+    '''
+    Queue of `(owner, item)` jobs holding at most one pending item per
+    owner, where the newest item of each owner always wins.
+
+    Owners are served in round-robin order: replacing a pending item keeps
+    the owner's place in line, and an owner whose item was taken goes to
+    the back of the line.  A source producing frames faster than the others
+    therefore cannot starve them.
+    '''
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._items = OrderedDict()
+        self._closed = False
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, job):
+        '''
+        Put `(owner, item)` job in queue, replacing pending job of the same
+        owner (if any).
+
+        Returns
+        -------
+
+            Replaced job, or `None` if no job of owner was pending.
+        '''
+        owner, item = job
+        with self._condition:
+            displaced = self._items.get(owner)
+            self._items[owner] = item
+            if displaced is not None:
+                self.dropped += 1
+                displaced = owner, displaced
+            self._condition.notify()
+        return displaced
+
+    def get(self):
+        '''
+        Block until a job is available.
+
+        Returns
+        -------
+
+            Next `(owner, item)` job, or `None` if the queue has been
+            closed.
+        '''
+        with self._condition:
+            while not self._items and not self._closed:
+                self._condition.wait()
+            if not self._items:
+                return None
+            return self._items.popitem(last=False)
+
+    def discard(self, owner):
+        '''
+        Remove pending job of `owner` (if any).
+
+        Returns
+        -------
+
+            Removed `(owner, item)` job, or `None`.
+        '''
+        with self._condition:
+            if owner not in self._items:
+                return None
+            return owner, self._items.pop(owner)
+
+    def close(self):
+        '''
+        Wake all waiting consumers.
+
+        Returns
+        -------
+        list
+            Pending `(owner, item)` jobs.
+        '''
+        with self._condition:
+            self._closed = True
+            items = self._items.items()
+            self._items.clear()
+            self._condition.notify_all()
+        return items
+
+
+class DecodeWorkerPool(object):
+    '''
+    Pool of decode worker threads fed by a latest-frame-wins queue.
+
+    Each item is submitted together with its *owner*, which must provide:
+
+     - `scanner_config`: Tuple of `zbar` configuration strings.
+     - `decode_job(item, image_scanner)`: Decode item using the worker's
+       `zbar.ImageScanner` (`scan` releases the GIL, so workers run
+       concurrently).
+     - `decode_dropped(item)`: Called for items replaced in the queue before
+       a worker picked them up.
+
+    Each worker keeps its own `zbar.ImageScanner` per distinct
+    `scanner_config`, since image scanners must not be shared between
+    threads.
+
+    A pool may be shared by several owners (e.g., one per camera; see
+    `manager.ScannerManager`), in which case a `RoundRobinFrameQueue` should
+    be used as `queue`.
+    '''
+    def __init__(self, workers=None, queue=None):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.workers = max(1, int(workers))
+        self.queue = LatestFrameQueue() if queue is None else queue
+        self._threads = []
+
+    def __len__(self):
+        return len(self.queue)
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def start(self):
+        if self._threads:
+            return
+        for i in xrange(self.workers):
+            thread = threading.Thread(target=self._run,
+                                      name='decode-worker-%d' % i)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        for owner, item in self.queue.close():
+            owner.decode_dropped(item)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, owner, item):
+        '''
+        Queue item for decoding without blocking the caller.
+        '''
+        displaced = self.queue.put((owner, item))
+        if displaced is not None:
+            displaced_owner, displaced_item = displaced
+            displaced_owner.decode_dropped(displaced_item)
+
+    def discard(self, owner):
+        '''
+        Drop pending item of `owner` (if any), e.g., when a source is
+        removed from a shared pool.
+        '''
+        job = self.queue.discard(owner)
+        if job is not None:
+            job[0].decode_dropped(job[1])
+
+    def _run(self):
+        from .symbologies import create_image_scanner
+
+        image_scanners = {}
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            owner, item = job
+            config = owner.scanner_config
+            if config not in image_scanners:
+                image_scanners[config] = create_image_scanner(config)
+            try:
+                owner.decode_job(item, image_scanners[config])
+            except Exception:
+                logger.exception('Error decoding frame.')
+                owner.decode_dropped(item)
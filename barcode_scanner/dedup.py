@@ -0,0 +1,101 @@
+from collections import OrderedDict
+import threading
+import time
+
+#: Supported deduplication policies.
+POLICIES = ('set-change', 'cooldown', 'always')
+
+
+def symbol_key(symbol_record):
+    try:
+        return symbol_record.key
+    except AttributeError:
+        # Symbol record dictionary.
+        return (symbol_record['type'], symbol_record['data'])
+
+
+class SymbolDeduplicator(object):
+    '''
+    Decide which scanned symbols are emitted, keyed on `(type, data)`.
+
+    Policies
+    --------
+
+     - `'set-change'`: Emit all symbols of a frame when the set of symbols
+       differs from the last emitted set (default, matches legacy behaviour).
+     - `'cooldown'`: Emit each symbol at most once per `cooldown` seconds;
+       only symbols that are not cooling down are emitted.
+     - `'always'`: Emit all symbols of every frame.
+
+    Last-emission times are kept in a least-recently-used cache bounded to
+    `max_size` keys, with O(1) lookup per symbol.
+
+    Parameters
+    ----------
+    policy : str, optional
+        One of `POLICIES`.
+    cooldown : float, optional
+        Minimum time (in seconds) between emissions of the same symbol, for
+        the `'cooldown'` policy.
+    max_size : int, optional
+        Maximum number of symbols to remember.
+    '''
+    def __init__(self, policy='set-change', cooldown=5.0, max_size=1024):
+        if policy not in POLICIES:
+            raise ValueError('Unsupported deduplication policy: `%s`.  Must '
+                             'be one of: %s' % (policy, ', '.join(POLICIES)))
+        self.policy = policy
+        self.cooldown = cooldown
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.last_emitted = OrderedDict()
+            self.last_set = frozenset()
+
+    def filter(self, symbols, now=None):
+        '''
+        Parameters
+        ----------
+        symbols : list
+            Symbol records scanned from a frame.
+        now : float, optional
+            Current time (in seconds).
+
+        Returns
+        -------
+        list
+            Symbol records to emit (empty if none).
+        '''
+        if not symbols or self.policy == 'always':
+            return symbols
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            if self.policy == 'set-change':
+                keys = frozenset(symbol_key(s) for s in symbols)
+                if keys == self.last_set:
+                    return []
+                self.last_set = keys
+                for key_i in keys:
+                    self._touch(key_i, now)
+                return symbols
+
+            emitted = []
+            for symbol_i in symbols:
+                key_i = symbol_key(symbol_i)
+                last_time = self.last_emitted.get(key_i)
+                if last_time is None or now - last_time >= self.cooldown:
+                    self._touch(key_i, now)
+                    emitted.append(symbol_i)
+            return emitted
+
+    def _touch(self, key, now):
+        self.last_emitted.pop(key, None)
+        self.last_emitted[key] = now
+        if len(self.last_emitted) > self.max_size:
+            # Evict least recently emitted symbol.
+            self.last_emitted.popitem(last=False)
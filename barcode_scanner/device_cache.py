@@ -0,0 +1,248 @@
+'''
+Persistent cache of video device names and capabilities.
+
+Probing devices through GStreamer (see `pygst_utils.video_source`) takes
+seconds per device, so probe results are cached in a JSON file (see
+`default_cache_path`).  Cached entries are reprobed when:
+
+ - they are older than the cache TTL,
+ - a device was plugged or unplugged since they were probed (see
+   `hotplug_fingerprint`), or the driver identity of the device changed
+   (see `device_identity`), or
+ - a refresh is requested explicitly (e.g., `--refresh`).
+
+Cached capabilities are also used to validate requested caps (see
+`DeviceCache.validate`) without probing.
+'''
+from collections import OrderedDict
+import glob
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+#: Default time to live of cached entries (in seconds).
+DEFAULT_TTL = 7 * 24 * 60 * 60
+#: Caps fields compared by `DeviceCache.validate`.
+CAPS_KEYS = ('width', 'height', 'framerate_num', 'framerate_denom', 'fourcc')
+
+_SYSFS_V4L = '/sys/class/video4linux'
+
+
+def default_cache_path():
+    '''
+    Returns
+    -------
+    str
+        `$XDG_CACHE_HOME/barcode-scanner/devices.json` (by default,
+        `~/.cache/barcode-scanner/devices.json`).
+    '''
+    cache_home = (os.environ.get('XDG_CACHE_HOME') or
+                  os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'barcode-scanner', 'devices.json')
+
+
+def _read(path):
+    try:
+        with open(path) as input_:
+            return input_.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def hotplug_fingerprint():
+    '''
+    Returns
+    -------
+    list
+        Video device nodes with their device numbers and change times (Linux;
+        changes whenever a device is plugged or unplugged).  Empty list on
+        other platforms (entries then only expire by TTL).
+    '''
+    fingerprint = []
+    for node_i in sorted(glob.glob('/dev/video*')):
+        try:
+            stat_i = os.stat(node_i)
+        except OSError:
+            continue
+        fingerprint.append([node_i, stat_i.st_rdev, int(stat_i.st_ctime)])
+    return fingerprint
+
+
+def device_identity(device_name):
+    '''
+    Returns
+    -------
+    list or None
+        Driver identity of device, i.e., the kernel driver, bus location,
+        and name of matching video4linux node(s) (matched by node path or
+        device name), or `None` if not available (e.g., not Linux).
+    '''
+    if not os.path.isdir(_SYSFS_V4L):
+        return None
+    identity = []
+    for sys_path_i in sorted(glob.glob(os.path.join(_SYSFS_V4L, 'video*'))):
+        node_i = '/dev/' + os.path.basename(sys_path_i)
+        name_i = _read(os.path.join(sys_path_i, 'name'))
+        if device_name not in (node_i, name_i):
+            continue
+        device_path_i = os.path.join(sys_path_i, 'device')
+        driver_i = os.path.join(device_path_i, 'driver')
+        identity.append([node_i, name_i,
+                         os.path.basename(os.path.realpath(driver_i))
+                         if os.path.exists(driver_i) else None,
+                         os.path.realpath(device_path_i)])
+    return identity or None
+
+
+def probe_device_names():
+    from .io_redirect import nostderr
+
+    with nostderr():
+        from pygst_utils.video_source import get_video_source_names
+
+        return list(get_video_source_names())
+
+
+def probe_capabilities(device_name):
+    '''
+    Returns
+    -------
+    list
+        JSON capabilities records of device (compatible with `fromjson`
+        subcommand), as ordered dictionaries.
+    '''
+    from .io_redirect import nostderr
+
+    with nostderr():
+        from pygst_utils.video_source import (expand_allowed_capabilities,
+                                              get_allowed_capabilities)
+
+        df_allowed_caps = get_allowed_capabilities(device_name)
+        df_source_caps = expand_allowed_capabilities(df_allowed_caps)
+        return [json.loads(c.to_json(), object_pairs_hook=OrderedDict)
+                for i, c in df_source_caps.iterrows()]
+
+
+class DeviceCache(object):
+    '''
+    JSON file cache of device names and per-device capabilities.
+
+    Parameters
+    ----------
+    path : str, optional
+        Cache file (default: `default_cache_path()`).
+    ttl : float, optional
+        Time to live of cached entries (in seconds).
+    '''
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        self.path = path or default_cache_path()
+        self.ttl = ttl
+        self._data = None
+
+    def _load(self):
+        if self._data is not None:
+            return self._data
+        data = None
+        try:
+            with open(self.path) as input_:
+                data = json.load(input_, object_pairs_hook=OrderedDict)
+        except (IOError, OSError):
+            pass
+        except ValueError:
+            logger.warning('Ignoring corrupt device cache: `%s`', self.path)
+        fingerprint = hotplug_fingerprint()
+        if (data is None or data.get('version') != VERSION or
+                data.get('fingerprint') != fingerprint):
+            # Devices were (un)plugged; discard all entries.
+            data = {'version': VERSION, 'fingerprint': fingerprint,
+                    'devices': None, 'caps': {}}
+        self._data = data
+        return data
+
+    def _save(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            temp_path = '%s.%d.tmp' % (self.path, os.getpid())
+            with open(temp_path, 'w') as output:
+                json.dump(self._data, output, indent=2)
+            # Atomic replace, so concurrent readers never see a partial file.
+            os.rename(temp_path, self.path)
+        except (IOError, OSError) as exception:
+            logger.warning('Could not write device cache `%s`: %s',
+                           self.path, exception)
+
+    def _fresh(self, entry):
+        return (entry is not None and
+                time.time() - entry['timestamp'] < self.ttl)
+
+    def _cached_caps(self, device_name):
+        entry = self._load()['caps'].get(device_name)
+        if (self._fresh(entry) and
+                entry['identity'] == device_identity(device_name)):
+            return entry['caps']
+        return None
+
+    def device_names(self, refresh=False):
+        '''
+        Returns
+        -------
+        list
+            Available device names (probed if not cached).
+        '''
+        data = self._load()
+        if refresh or not self._fresh(data['devices']):
+            data['devices'] = {'timestamp': time.time(),
+                               'names': probe_device_names()}
+            self._save()
+        return data['devices']['names']
+
+    def capabilities(self, device_name, refresh=False):
+        '''
+        Returns
+        -------
+        list
+            JSON capabilities records of device (probed if not cached).
+        '''
+        caps = None if refresh else self._cached_caps(device_name)
+        if caps is None:
+            caps = probe_capabilities(device_name)
+            self._load()['caps'][device_name] = \
+                {'timestamp': time.time(),
+                 'identity': device_identity(device_name), 'caps': caps}
+            self._save()
+        return caps
+
+    def validate(self, json_source):
+        '''
+        Check requested configuration (see `fromjson` subcommand) against
+        cached capabilities of the device, without probing.
+
+        Returns
+        -------
+        bool or None
+            `True` if the configuration matches a cached capabilities
+            record, or `None` if the device capabilities are not cached.
+
+        Raises
+        ------
+        ValueError
+            If the device capabilities are cached, but no record matches.
+        '''
+        device_name = json_source['device_name']
+        caps = self._cached_caps(device_name)
+        if caps is None:
+            return None
+        keys = [k for k in CAPS_KEYS if json_source.get(k) is not None]
+        for caps_i in caps:
+            if all(caps_i.get(k) == json_source[k] for k in keys):
+                return True
+        requested = ', '.join('%s=%s' % (k, json_source[k]) for k in keys)
+        raise ValueError('Device `%s` does not support requested caps (%s); '
+                         'see `device_caps` (use `--refresh` if the device '
+                         'changed).' % (device_name, requested))
@@ -0,0 +1,246 @@
+'''
+Persistent SQLite scan event store.
+
+Events are written by `EventStoreSink` (a `sinks.BatchedSink`), i.e., in
+batches, one transaction per batch, on a background thread, so bursts of
+detections never block scanning.  The database uses write-ahead logging, so
+queries (see `EventStore`) may run while events are being written.
+'''
+from datetime import datetime, timedelta
+import json
+import logging
+import sqlite3
+import time
+
+from .sinks import BatchedSink
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    source TEXT,
+    location TEXT
+);
+CREATE INDEX IF NOT EXISTS events_data ON events (data);
+CREATE INDEX IF NOT EXISTS events_type_timestamp ON events (type, timestamp);
+CREATE INDEX IF NOT EXISTS events_source ON events (source, timestamp);
+CREATE INDEX IF NOT EXISTS events_timestamp ON events (timestamp);
+'''
+
+
+def connect(path):
+    '''
+    Open (and create, if necessary) event store database.
+
+    Returns
+    -------
+    sqlite3.Connection
+        Connection in write-ahead logging mode.
+    '''
+    connection = sqlite3.connect(path, timeout=30)
+    # Must be set before the first table is created to take effect.
+    connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    connection.execute('PRAGMA journal_mode = WAL')
+    # Durable at checkpoints; commits do not wait for `fsync`.
+    connection.execute('PRAGMA synchronous = NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def utc_isoformat_ago(seconds):
+    '''
+    Returns
+    -------
+    str
+        UTC timestamp in ISO 8601 format (as stored), `seconds` ago.
+    '''
+    return (datetime.utcnow() - timedelta(seconds=seconds)).isoformat()
+
+
+class EventStore(object):
+    '''
+    Query, retention and compaction of an event store database.
+
+    Timestamps are UTC ISO 8601 strings (as in symbol records), which sort
+    chronologically, so time ranges may be given as (prefixes of) ISO 8601
+    strings, e.g., `'2016-05-01'` or `'2016-05-01T13:00'`.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.connection = connect(path)
+        self.connection.row_factory = sqlite3.Row
+
+    def close(self):
+        self.connection.close()
+
+    def insert(self, records):
+        '''
+        Insert records (dictionaries with `timestamp`, `type`, `data`, and
+        optionally `source` and `location`) in a single transaction.
+        '''
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO events (timestamp, type, data, source, location)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                [(r['timestamp'], r['type'], r['data'], r.get('source'),
+                  json.dumps(r.get('location'))) for r in records])
+
+    def _where(self, data=None, type_=None, source=None, since=None,
+               until=None):
+        clauses = []
+        parameters = []
+        for column, operator, value in (('data', '=', data),
+                                        ('type', '=', type_),
+                                        ('source', '=', source),
+                                        ('timestamp', '>=', since),
+                                        ('timestamp', '<', until)):
+            if value is not None:
+                clauses.append('%s %s ?' % (column, operator))
+                parameters.append(value)
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return where, parameters
+
+    def events(self, data=None, type_=None, source=None, since=None,
+               until=None, limit=100):
+        '''
+        Returns
+        -------
+        list
+            Matching events (as dictionaries), newest first.
+        '''
+        where, parameters = self._where(data, type_, source, since, until)
+        query = ('SELECT timestamp, type, data, source, location FROM events%s'
+                 ' ORDER BY timestamp DESC' % where)
+        if limit:
+            query += ' LIMIT %d' % limit
+        events = []
+        for row in self.connection.execute(query, parameters):
+            event = dict(row)
+            event['location'] = json.loads(event['location'] or 'null')
+            events.append(event)
+        return events
+
+    def last_seen(self, data):
+        '''
+        Returns
+        -------
+        dict or None
+            Most recent event with `data`.
+        '''
+        events = self.events(data=data, limit=1)
+        return events[0] if events else None
+
+    def rollup(self, period='hour', data=None, type_=None, source=None,
+               since=None, until=None):
+        '''
+        Returns
+        -------
+        list
+            Number of events (and distinct codes) per `period` (`'hour'` or
+            `'day'`) and type, oldest first.
+        '''
+        length = {'hour': 13, 'day': 10}[period]
+        where, parameters = self._where(data, type_, source, since, until)
+        query = ('SELECT substr(timestamp, 1, %d) AS %s, type, COUNT(*) AS '
+                 'events, COUNT(DISTINCT data) AS codes FROM events%s GROUP BY'
+                 ' 1, 2 ORDER BY 1, 2' % (length, period, where))
+        return [dict(row) for row in self.connection.execute(query,
+                                                             parameters)]
+
+    def apply_retention(self, max_age=None, max_events=None):
+        '''
+        Delete events older than `max_age` seconds, and all but the newest
+        `max_events` events.
+
+        Returns
+        -------
+        int
+            Number of deleted events.
+        '''
+        deleted = 0
+        with self.connection:
+            if max_age is not None:
+                deleted += self.connection.execute(
+                    'DELETE FROM events WHERE timestamp < ?',
+                    (utc_isoformat_ago(max_age), )).rowcount
+            if max_events is not None:
+                deleted += self.connection.execute(
+                    'DELETE FROM events WHERE id <= (SELECT id FROM events '
+                    'ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                    (max_events, )).rowcount
+        return deleted
+
+    def compact(self, full=False):
+        '''
+        Return free pages to the file system and truncate the write-ahead
+        log.
+
+        Parameters
+        ----------
+        full : bool, optional
+            Rebuild database (`VACUUM`), e.g., after deleting most events.
+            Blocks writers while running.
+        '''
+        if full:
+            self.connection.execute('VACUUM')
+        else:
+            self.connection.execute('PRAGMA incremental_vacuum')
+        self.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+class EventStoreSink(BatchedSink):
+    '''
+    Result sink writing events to an `EventStore`, one transaction per
+    batch.
+
+    Retention (see `EventStore.apply_retention`) and incremental compaction
+    are applied every `maintenance_interval` seconds by the writer thread.
+
+    Parameters
+    ----------
+    path : str
+        Database file path.
+    max_age : float, optional
+        Retention period (in seconds).
+    max_events : int, optional
+        Maximum number of events to keep.
+    maintenance_interval : float, optional
+        Seconds between retention/compaction runs.
+    **kwargs
+        Keyword arguments for `BatchedSink`.
+    '''
+    def __init__(self, path, max_age=None, max_events=None,
+                 maintenance_interval=600., **kwargs):
+        self.path = path
+        self.max_age = max_age
+        self.max_events = max_events
+        self.maintenance_interval = maintenance_interval
+        self._store = None
+        self._last_maintenance = None
+        super(EventStoreSink, self).__init__(**kwargs)
+
+    def write(self, records):
+        # Connection is created on (and only used by) the writer thread.
+        if self._store is None:
+            self._store = EventStore(self.path)
+        self._store.insert(records)
+        now = time.time()
+        if self._last_maintenance is None:
+            self._last_maintenance = now
+        elif now - self._last_maintenance >= self.maintenance_interval:
+            self._last_maintenance = now
+            deleted = self._store.apply_retention(self.max_age,
+                                                  self.max_events)
+            if deleted:
+                logger.info('Event store: deleted %d expired event(s).',
+                            deleted)
+            self._store.compact()
+
+    def close_connection(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
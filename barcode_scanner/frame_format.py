@@ -0,0 +1,179 @@
+import numpy as np
+
+#: Planar YUV formats, where the first plane is the Y (luma) plane.
+PLANAR_FORMATS = ('I420', 'YV12', 'NV12', 'NV21')
+#: Packed 4:2:2 YUV formats, mapped to the byte offset of the first Y sample.
+PACKED_FORMATS = {'YUY2': 0, 'YUYV': 0, 'YVYU': 0, 'UYVY': 1}
+#: Formats that are scanned without any colorspace conversion.
+LUMA_FORMATS = PLANAR_FORMATS + tuple(sorted(PACKED_FORMATS)) + ('GRAY8', )
+
+
+def round_up_4(value):
+    return (value + 3) & ~3
+
+
+def buffer_format(caps):
+    '''
+    Returns
+    -------
+    str
+        Format of buffer with GStreamer caps structure `caps`, i.e., a YUV
+        fourcc (e.g., `'I420'`), `'GRAY8'`, or `'RGB'`.
+    '''
+    name = caps.get_name()
+    if name == 'video/x-raw-yuv':
+        fourcc = caps['format']
+        return str(getattr(fourcc, 'fourcc', fourcc))
+    elif name == 'video/x-raw-gray':
+        return 'GRAY8'
+    elif name == 'video/x-raw-rgb':
+        return 'RGB'
+    raise ValueError('Unsupported caps: `%s`' % name)
+
+
+def frame_from_buffer(data, caps):
+    '''
+    Parameters
+    ----------
+    data : str
+        Raw buffer data.
+    caps : gst.Structure
+        Caps structure of buffer.
+
+    Returns
+    -------
+    numpy.ndarray
+        Luma plane view with shape `(height, width)` for YUV and gray
+        buffers, or RGB(x) view with shape `(height, width, channels)` for
+        RGB buffers.
+    '''
+    width, height = caps['width'], caps['height']
+    format_ = buffer_format(caps)
+    if format_ == 'RGB':
+        channels = caps['bpp'] // 8
+        return strided_view(data, height, width * channels,
+                            round_up_4(width * channels))\
+            .reshape(height, width, channels)
+    return luma_from_buffer(data, format_, width, height)
+
+
+def luma_from_buffer(data, format_, width, height):
+    '''
+    Returns
+    -------
+    numpy.ndarray
+        View of luma plane of buffer with shape `(height, width)`.  For
+        planar and gray formats, the view is C-contiguous whenever the row
+        stride equals the width (i.e., width is a multiple of 4).
+    '''
+    if format_ in PLANAR_FORMATS or format_ == 'GRAY8':
+        return strided_view(data, height, width, round_up_4(width))
+    elif format_ in PACKED_FORMATS:
+        offset = PACKED_FORMATS[format_]
+        packed = strided_view(data, height, 2 * width, round_up_4(2 * width))
+        return packed[:, offset::2]
+    raise ValueError('Unsupported format: `%s`' % format_)
+
+
+def strided_view(data, height, row_size, row_stride):
+    '''
+    Returns
+    -------
+    numpy.ndarray
+        View with shape `(height, row_size)` of rows spaced `row_stride` bytes
+        apart in `data`.
+    '''
+    np_data = np.frombuffer(data, dtype='uint8', count=height * row_stride)
+    np_rows = np_data.reshape(height, row_stride)
+    if row_stride == row_size:
+        return np_rows
+    return np_rows[:, :row_size]
+
+
+def rgb_to_luma(np_img, out=None, scratch=None):
+    '''
+    Vectorized ITU-R BT.601 luma of RGB(x) frame, using fixed-point weights.
+
+    Parameters
+    ----------
+    np_img : numpy.ndarray
+        RGB(x) frame with shape `(height, width, channels)`.
+    out : numpy.ndarray, optional
+        8-bit array with shape `(height, width)` to write luma to.
+    scratch : numpy.ndarray, optional
+        16-bit array with shape `(2, height, width)` for intermediate
+        results.  If both `out` and `scratch` are provided, no memory is
+        allocated.
+
+    Returns
+    -------
+    numpy.ndarray
+        Luma with shape `(height, width)` (`out`, if provided).
+    '''
+    if scratch is None:
+        luma = np.multiply(np_img[..., 0], 77, dtype='uint16')
+        luma += np.multiply(np_img[..., 1], 150, dtype='uint16')
+        luma += np.multiply(np_img[..., 2], 29, dtype='uint16')
+    else:
+        luma, term = scratch
+        np.multiply(np_img[..., 0], 77, out=luma, dtype='uint16')
+        np.multiply(np_img[..., 1], 150, out=term, dtype='uint16')
+        luma += term
+        np.multiply(np_img[..., 2], 29, out=term, dtype='uint16')
+        luma += term
+    luma >>= 8
+    if out is None:
+        return luma.astype('uint8')
+    np.copyto(out, luma, casting='unsafe')
+    return out
+
+
+def luma(np_img):
+    '''
+    Returns
+    -------
+    numpy.ndarray
+        Luma of frame with shape `(height, width)` (the frame itself if it
+        already is a luma plane).
+    '''
+    if np_img.ndim == 2:
+        return np_img
+    elif np_img.shape[2] == 1:
+        return np_img[..., 0]
+    return rgb_to_luma(np_img)
+
+
+def y800_base(np_luma):
+    '''
+    Returns
+    -------
+    str or None
+        String that luma plane is a C-contiguous view of the start of (e.g.,
+        the data of a GStreamer buffer), or `None`.
+    '''
+    base = np_luma
+    while isinstance(base, np.ndarray):
+        base = base.base
+    if (isinstance(base, str) and np_luma.flags.c_contiguous and
+            len(base) >= np_luma.size and
+            np_luma.__array_interface__['data'][0] ==
+            np.frombuffer(base, dtype='uint8').__array_interface__['data'][0]):
+        return base
+    return None
+
+
+def y800_data(np_luma):
+    '''
+    Returns
+    -------
+    str
+        `Y800` image data of luma plane, suitable for `zbar.Image`.
+
+        If the luma plane is a C-contiguous view of the start of a string
+        (e.g., the data of a GStreamer buffer), the string itself is returned
+        without copying (see `y800_base`).
+    '''
+    base = y800_base(np_luma)
+    if base is not None:
+        return base
+    return np.ascontiguousarray(np_luma).tobytes()
@@ -6,6 +6,8 @@ from pygtkhelpers.delegates import SlaveView
 import gtk
 import matplotlib as mpl
 
+from .clock import monotonic_ns
+
 
 class ScannerView(SlaveView):
     def __init__(self, scanner, width=400, height=300):
@@ -71,17 +73,25 @@ class ScannerView(SlaveView):
         self.cleanup()
 
     def on_frame_update(self, scanner, np_img):
+        stats = scanner.stats
+        if stats is not None:
+            start_ns = monotonic_ns()
         self.axis.clear()
         self.axis.set_axis_off()
-        self.axis.imshow(np_img)
+        if np_img.ndim == 2:
+            # Luma plane.
+            self.axis.imshow(np_img, cmap=mpl.cm.gray)
+        else:
+            self.axis.imshow(np_img)
         self.canvas.draw()
+        if stats is not None:
+            stats.record('render', monotonic_ns() - start_ns)
 
     def on_symbols_found(self, scanner, np_img, symbols):
         patches = []
         if symbols:
             for symbol_record_i in symbols:
-                symbol_i = symbol_record_i['symbol']
-                location_i = Polygon(symbol_i.location)
+                location_i = Polygon(symbol_record_i['location'])
                 patches.append(location_i)
             patch_collection = PatchCollection(patches, cmap=mpl.cm.jet,
                                                alpha=0.4)
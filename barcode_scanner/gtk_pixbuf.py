@@ -0,0 +1,182 @@
+import time
+
+from pygtkhelpers.delegates import SlaveView
+import gobject
+import gtk
+import numpy as np
+
+from .clock import monotonic_ns
+
+
+class PixbufScannerView(SlaveView):
+    '''
+    Scanner preview that blits each frame into a reused `gtk.gdk.Pixbuf` and
+    paints symbol locations as a cairo overlay.
+
+    Same *Scan* button and signal wiring as `gtk_matplotlib.ScannerView`,
+    without rebuilding a matplotlib figure for every frame.  Redraws are
+    capped at `max_fps`, independent of the capture rate, and always run in
+    the GTK main loop.
+
+    Parameters
+    ----------
+    scanner : BarcodeScanner
+        Scanner to preview.
+    width, height : int, optional
+        Requested preview size.
+    max_fps : float, optional
+        Maximum redraw rate (frames per second).
+    single_shot : bool, optional
+        Stop scanning (and freeze the preview) after the first detection,
+        until *Scan* is clicked again.  By default, scanning continues and
+        the locations of the most recent detection are overlaid.
+    '''
+    def __init__(self, scanner, width=400, height=300, max_fps=15,
+                 single_shot=False):
+        self.scanner = scanner
+        self.single_shot = single_shot
+        self.callback_ids = {}
+        self.width = width
+        self.height = height
+        self.max_fps = max_fps
+        self.pixbuf = None
+        self.pixels = None
+        self.polygons = []
+        self._frame = None
+        self._redraw_pending = False
+        self._last_redraw = 0
+        super(PixbufScannerView, self).__init__()
+
+    def on_button_debug__clicked(self, button):
+        import IPython
+
+        IPython.embed()
+
+    def create_ui(self):
+        self.drawing_area = gtk.DrawingArea()
+        self.drawing_area.set_size_request(self.width, self.height)
+        self.drawing_area.connect('expose-event', self._on_expose)
+        self.button_scan = gtk.Button('Scan')
+        self.button_debug = gtk.Button('Debug')
+
+        self.widget.pack_start(self.drawing_area, True, True, 0)
+        for widget_i in (self.button_scan, self.button_debug):
+            self.widget.pack_start(widget_i, False, False, 0)
+
+        self.widget.show_all()
+        self.button_scan.connect('clicked', lambda *args: self.enable_scan())
+
+    def cleanup(self):
+        for callback_id in ['frame', 'symbol']:
+            if callback_id in self.callback_ids:
+                self.scanner.disconnect(self.callback_ids[callback_id])
+                del self.callback_ids[callback_id]
+
+    def disable_scan(self):
+        self.cleanup()
+        self.scanner.disable_scan()
+        self.button_scan.set_sensitive(True)
+
+    def enable_scan(self):
+        self.polygons = []
+        self.scanner.reset()
+        self.scanner.enable_scan()
+        self.button_scan.set_sensitive(False)
+        self.callback_ids['frame'] = self.scanner.connect('frame-update',
+                                                          self.on_frame_update)
+        self.callback_ids['symbol'] = self.scanner.connect('symbols-found',
+                                                           self.on_symbols_found)
+
+    def __dealloc__(self):
+        self.cleanup()
+
+    ###########################################################################
+    # Scanner callbacks (may be called from any thread)
+    def on_frame_update(self, scanner, np_img, force=False):
+        self._frame = np_img
+        now = time.time()
+        if self._redraw_pending or (not force and now - self._last_redraw <
+                                    1. / self.max_fps):
+            return
+        self._redraw_pending = True
+        self._last_redraw = now
+        gobject.idle_add(self._redraw)
+
+    def on_symbols_found(self, scanner, np_img, symbols):
+        if symbols:
+            self.polygons = [symbol_record_i['location']
+                             for symbol_record_i in symbols]
+            self.on_frame_update(scanner, np_img, force=True)
+            if self.single_shot:
+                gobject.idle_add(self.disable_scan)
+
+    ###########################################################################
+    # Drawing (GTK main loop)
+    def _upload(self, np_img):
+        '''
+        Copy frame into pixbuf, (re)allocating pixbuf only if frame size
+        changed.
+        '''
+        height, width = np_img.shape[:2]
+        if (self.pixbuf is None or self.pixbuf.get_width() != width or
+                self.pixbuf.get_height() != height):
+            self.pixbuf = gtk.gdk.Pixbuf(gtk.gdk.COLORSPACE_RGB, False, 8,
+                                         width, height)
+            try:
+                # Writable view of pixbuf data (requires PyGTK with NumPy).
+                self.pixels = self.pixbuf.get_pixels_array()
+            except (AttributeError, RuntimeError):
+                self.pixels = None
+
+        if self.pixels is not None:
+            if np_img.ndim == 2:
+                # Luma plane; replicate to R, G, and B.
+                self.pixels[...] = np_img[..., np.newaxis]
+            else:
+                self.pixels[...] = np_img[..., :3]
+        else:
+            if np_img.ndim == 2:
+                np_rgb = np.repeat(np_img[..., np.newaxis], 3, axis=2)
+            else:
+                np_rgb = np.ascontiguousarray(np_img[..., :3])
+            self.pixbuf = gtk.gdk.pixbuf_new_from_data(np_rgb.tobytes(),
+                                                       gtk.gdk.COLORSPACE_RGB,
+                                                       False, 8, width, height,
+                                                       3 * width)
+
+    def _redraw(self):
+        self._redraw_pending = False
+        if self._frame is not None:
+            stats = self.scanner.stats
+            if stats is not None:
+                start_ns = monotonic_ns()
+            self._upload(self._frame)
+            self.drawing_area.queue_draw()
+            if stats is not None:
+                stats.record('render', monotonic_ns() - start_ns)
+        return False
+
+    def _on_expose(self, widget, event):
+        if self.pixbuf is None:
+            return False
+        allocation = widget.get_allocation()
+        width, height = self.pixbuf.get_width(), self.pixbuf.get_height()
+        scale = min(allocation.width / float(width),
+                    allocation.height / float(height))
+
+        context = widget.window.cairo_create()
+        context.rectangle(event.area.x, event.area.y, event.area.width,
+                          event.area.height)
+        context.clip()
+        context.scale(scale, scale)
+        context.set_source_pixbuf(self.pixbuf, 0, 0)
+        context.paint()
+
+        for polygon_i in self.polygons:
+            context.move_to(*polygon_i[0])
+            for point_j in polygon_i[1:]:
+                context.line_to(*point_j)
+            context.close_path()
+        context.set_source_rgba(0, 0.5, 1, 0.4)
+        context.fill()
+        return False
@@ -0,0 +1,171 @@
+import json
+import logging
+import sys
+
+import gobject
+
+from .io_redirect import nostderr
+from .scanner import BarcodeScanner
+
+logger = logging.getLogger(__name__)
+
+
+def headless_main(pipeline_command, output_path='-', sinks=(),
+                  **scanner_kwargs):
+    '''
+    Run scanner pipeline on a plain GLib main loop (no GTK), writing one JSON
+    line per found symbol.
+
+    Runs until the pipeline reaches end of stream, an error occurs, or the
+    process is interrupted (e.g., `Ctrl-C`).
+
+    Parameters
+    ----------
+    pipeline_command : str
+        `gst-launch` pipeline command (see `BarcodeScanner`).
+    output_path : str, optional
+        Output file path, or `-` for `stdout`.
+    sinks : list, optional
+        Additional result sinks (see `sinks.BatchedSink`); closed (i.e.,
+        flushed) when the pipeline stops.
+    **scanner_kwargs
+        Keyword arguments for `BarcodeScanner`.
+
+    Returns
+    -------
+    BarcodeScanner
+        Scanner (stopped).
+    '''
+    gobject.threads_init()
+    output = sys.stdout if output_path == '-' else open(output_path, 'a')
+    scanner = BarcodeScanner(**scanner_kwargs)
+    loop = gobject.MainLoop()
+
+    def on_symbols_found(scanner, np_img, symbols):
+        for symbol_record_i in symbols:
+            output.write(json.dumps(symbol_record_i.as_dict()) + '\n')
+        output.flush()
+
+    def on_eos(bus, message):
+        loop.quit()
+
+    def on_error(bus, message):
+        error, debug = message.parse_error()
+        logger.error('Pipeline error: %s (%s)', error, debug)
+        loop.quit()
+
+    scanner.connect('symbols-found', on_symbols_found)
+    for sink_i in sinks:
+        sink_i.attach(scanner)
+    if scanner.stats_interval:
+        from .stats import log_stats_update
+
+        scanner.connect('stats-update', log_stats_update)
+    with nostderr():
+        pipeline, status = scanner.start(pipeline_command, enable_scan=True)
+    bus = pipeline.get_bus()
+    bus.add_signal_watch()
+    bus.connect('message::eos', on_eos)
+    bus.connect('message::error', on_error)
+
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scanner.stop()
+        for sink_i in sinks:
+            sink_i.close()
+        if output is not sys.stdout:
+            output.close()
+    return scanner
+
+
+def headless_manager_main(sources, output_path='-', decode_workers=None,
+                          stats_log=False, sinks=()):
+    '''
+    Run several scanner pipelines sharing decode workers (see
+    `manager.ScannerManager`) on a plain GLib main loop, writing one JSON
+    line (including `source`) per found symbol.
+
+    A source whose pipeline reaches end of stream or fails is removed
+    without interrupting other sources.  Runs until no sources remain, or
+    the process is interrupted (e.g., `Ctrl-C`).
+
+    Parameters
+    ----------
+    sources : list
+        List of `(source_id, pipeline_command, scanner_kwargs)` tuples.
+    output_path : str, optional
+        Output file path, or `-` for `stdout`.
+    decode_workers : int, optional
+        Number of shared decode worker threads (default: number of CPUs).
+    stats_log : bool, optional
+        Log statistics of each source on `stats-update`.
+    sinks : list, optional
+        Additional result sinks (see `headless_main`).
+
+    Returns
+    -------
+    manager.ScannerManager
+        Manager (stopped).
+    '''
+    from .manager import ScannerManager
+
+    gobject.threads_init()
+    output = sys.stdout if output_path == '-' else open(output_path, 'a')
+    manager = ScannerManager(decode_workers)
+    loop = gobject.MainLoop()
+
+    def on_symbols_found(manager, source_id, np_img, symbols):
+        for symbol_record_i in symbols:
+            output.write(json.dumps(symbol_record_i.as_dict()) + '\n')
+        output.flush()
+
+    def on_stats_update(manager, source_id, stats):
+        from .stats import format_summary
+
+        logger.info('[%s] %s', source_id, format_summary(stats))
+
+    def remove(source_id):
+        if source_id in manager.sources:
+            manager.remove_source(source_id)
+        if not manager.sources:
+            loop.quit()
+        return False
+
+    def on_eos(bus, message, source_id):
+        logger.info('[%s] End of stream.', source_id)
+        gobject.idle_add(remove, source_id)
+
+    def on_error(bus, message, source_id):
+        error, debug = message.parse_error()
+        logger.error('[%s] Pipeline error: %s (%s)', source_id, error, debug)
+        gobject.idle_add(remove, source_id)
+
+    manager.connect('symbols-found', on_symbols_found)
+    for sink_i in sinks:
+        sink_i.attach(manager)
+    if stats_log:
+        manager.connect('stats-update', on_stats_update)
+    for source_id, pipeline_command, scanner_kwargs in sources:
+        manager.add_source(source_id, pipeline_command, **scanner_kwargs)
+    with nostderr():
+        manager.start()
+    for source_id, scanner in manager.sources.items():
+        bus = scanner.pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect('message::eos', on_eos, source_id)
+        bus.connect('message::error', on_error, source_id)
+
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        manager.stop()
+        for sink_i in sinks:
+            sink_i.close()
+        if output is not sys.stdout:
+            output.close()
+    return manager
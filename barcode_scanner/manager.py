@@ -0,0 +1,181 @@
+from collections import OrderedDict
+import logging
+
+import gobject
+
+from .decode_pool import DecodeWorkerPool, RoundRobinFrameQueue
+from .scanner import BarcodeScanner
+
+logger = logging.getLogger(__name__)
+
+
+class ScannerManager(gobject.GObject):
+    '''
+    Run several scanner pipelines (e.g., one per camera) in one process,
+    sharing a single pool of decode worker threads.
+
+    Each source is a `BarcodeScanner` with its own GStreamer pipeline,
+    deduplication state, region of interest tracker, etc., and statistics.
+    Frames of all sources are decoded by a shared `DecodeWorkerPool`, fed by
+    a `RoundRobinFrameQueue`, i.e., each source has at most one frame waiting
+    (newest frame wins) and sources are served in turn.
+
+    Usage
+    -----
+
+        manager = ScannerManager(decode_workers=4)
+        manager.connect('symbols-found', on_symbols_found)
+        manager.add_source('dock-1', <`gst-launch` pipeline command>)
+        manager.add_source('dock-2', <`gst-launch` pipeline command>)
+        manager.start()
+        ...
+        # Sources may be added or removed while running, without disturbing
+        # other sources.
+        manager.remove_source('dock-1')
+        manager.stop()
+
+    Signals
+    -------
+
+     - `symbols-found`: `(manager, source_id, np_img, symbols)`
+         * `manager` (`ScannerManager`): Manager object.
+         * `source_id`: Identifier of source.
+         * `np_img`, `symbols`: See `BarcodeScanner` `symbols-found` signal.
+           The `source` of every symbol record is `source_id`.
+     - `stats-update`: `(manager, source_id, stats)`
+         * `manager` (`ScannerManager`): Manager object.
+         * `source_id`: Identifier of source.
+         * `stats` (`dict`): Statistics of source (see
+           `BarcodeScanner.get_stats`).
+    '''
+    __gsignals__ = {
+        # Args: `(manager, source_id, np_img, symbols)`
+        'symbols-found': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE,
+                          (object, object, object)),
+        # Args: `(manager, source_id, stats)`
+        'stats-update': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE,
+                         (object, object))}
+
+    def __init__(self, decode_workers=None):
+        '''
+        Parameters
+        ----------
+        decode_workers : int, optional
+            Number of shared decode worker threads (default: number of
+            CPUs).
+        '''
+        super(ScannerManager, self).__init__()
+        self.decode_workers = decode_workers or None
+        self.decode_pool = None
+        self.sources = OrderedDict()
+        self._handler_ids = {}
+
+    @property
+    def running(self):
+        return self.decode_pool is not None
+
+    def __dealloc__(self):
+        self.stop()
+
+    ###########################################################################
+    # Source methods
+    def add_source(self, source_id, pipeline_command, **scanner_kwargs):
+        '''
+        Add source, starting its pipeline if the manager is running.
+
+        Parameters
+        ----------
+        source_id : str
+            Unique source identifier (e.g., camera name).
+        pipeline_command : str
+            `gst-launch` pipeline command (see `BarcodeScanner`).
+        **scanner_kwargs
+            Keyword arguments for `BarcodeScanner`.  Per-source state objects
+            (e.g., `dedup`, `roi_tracker`) must not be shared between
+            sources.  `decode_workers` and `decode_backend` are ignored
+            (decode worker threads are shared).
+
+        Returns
+        -------
+        BarcodeScanner
+            Scanner of source.
+        '''
+        if source_id in self.sources:
+            raise KeyError('Source `%s` already exists.' % source_id)
+        scanner_kwargs['decode_workers'] = 0
+        scanner_kwargs.pop('decode_backend', None)
+        scanner = BarcodeScanner(pipeline_command, source_id=source_id,
+                                 decode_pool=self.decode_pool,
+                                 **scanner_kwargs)
+        self._handler_ids[source_id] = \
+            [scanner.connect('symbols-found', self._on_symbols_found),
+             scanner.connect('stats-update', self._on_stats_update)]
+        self.sources[source_id] = scanner
+        if self.running:
+            scanner.start(enable_scan=True)
+        return scanner
+
+    def remove_source(self, source_id):
+        '''
+        Stop pipeline of source and remove source.
+
+        Other sources are not interrupted.  Results of frames of the source
+        still being decoded are not forwarded.
+
+        Returns
+        -------
+        BarcodeScanner
+            Scanner of removed source.
+        '''
+        scanner = self.sources.pop(source_id)
+        for handler_id in self._handler_ids.pop(source_id):
+            scanner.disconnect(handler_id)
+        scanner.stop()
+        return scanner
+
+    def _on_symbols_found(self, scanner, np_img, symbols):
+        self.emit('symbols-found', scanner.source_id, np_img, symbols)
+
+    def _on_stats_update(self, scanner, stats):
+        self.emit('stats-update', scanner.source_id, stats)
+
+    ###########################################################################
+    # Statistics
+    def get_stats(self):
+        '''
+        Returns
+        -------
+        dict
+            Statistics per source (see `BarcodeScanner.get_stats`).
+        '''
+        return OrderedDict((source_id, scanner.get_stats())
+                           for source_id, scanner in self.sources.items())
+
+    ###########################################################################
+    # Control methods
+    def start(self):
+        '''
+        Start shared decode workers and pipelines of all sources.
+        '''
+        if self.running:
+            return
+        # A stopped pool cannot be restarted; use a new pool for every run.
+        self.decode_pool = DecodeWorkerPool(self.decode_workers,
+                                            queue=RoundRobinFrameQueue())
+        self.decode_pool.start()
+        for scanner in self.sources.values():
+            scanner.decode_pool = self.decode_pool
+            scanner.start(enable_scan=True)
+
+    def stop(self):
+        '''
+        Stop pipelines of all sources (e.g., free cameras) and shared decode
+        workers.
+        '''
+        for scanner in self.sources.values():
+            scanner.stop()
+        if self.decode_pool is not None:
+            decode_pool, self.decode_pool = self.decode_pool, None
+            decode_pool.stop()
+        for scanner in self.sources.values():
+            scanner.decode_pool = None
@@ -0,0 +1,349 @@
+'''
+Structured construction of scanner pipelines (`gst-launch` syntax).
+
+Every scanner pipeline ends in an `appsink` named `app-video`.  How frames
+are buffered in front of the `appsink` determines how stale a frame may be
+by the time it is scanned; this is configured by a *latency profile* (see
+`LATENCY_PROFILES`):
+
+ - `realtime`: At most one frame is buffered (older frames are dropped), so
+   the scanner always sees the newest frame.
+ - `balanced`: Like `realtime`, but two frames are buffered, absorbing
+   short scan hiccups without stalling the source.
+ - `lossless`: No frames are dropped; a slow consumer blocks (throttles)
+   the source, e.g., for recording.
+
+Usage
+-----
+
+    builder = PipelineBuilder('v4l2src', 'video/x-raw-yuv,width=1280,'
+                              'height=720', framerate='15/1',
+                              latency_profile='realtime')
+    scanner = BarcodeScanner(builder.command())
+'''
+import logging
+
+from .clock import monotonic_ns
+
+logger = logging.getLogger(__name__)
+
+#: Default source element.
+DEFAULT_SOURCE = 'autovideosrc name=video-source'
+#: Default source caps.  YUV is requested directly from the source (no
+#: colorspace conversion); only the luma plane is scanned (see
+#: `frame_format`).
+DEFAULT_CAPS = 'video/x-raw-yuv,framerate=30/1,width=640,height=480'
+
+#: `appsink`/`queue` configuration per latency profile.
+#:
+#:  - `max_buffers`: Maximum number of frames queued in `appsink`.
+#:  - `drop`: Drop oldest frame when `appsink` queue is full (otherwise,
+#:    block upstream).
+#:  - `sync`: Synchronize frames to the pipeline clock (adds latency when
+#:    frames arrive late).
+#:  - `leaky_queue`: Size of leaky `queue` (dropping oldest frames) that
+#:    decouples the source streaming thread from the `appsink` (i.e., from
+#:    synchronous scanning), or `None` for a plain (blocking) `queue`.
+LATENCY_PROFILES = {'realtime': {'max_buffers': 1, 'drop': True,
+                                 'sync': False, 'leaky_queue': 1},
+                    'balanced': {'max_buffers': 2, 'drop': True,
+                                 'sync': False, 'leaky_queue': 2},
+                    'lossless': {'max_buffers': 30, 'drop': False,
+                                 'sync': False, 'leaky_queue': None}}
+DEFAULT_LATENCY_PROFILE = 'balanced'
+
+#: `CLOCK_TIME_NONE` (buffer without timestamp).
+_CLOCK_TIME_NONE = 2 ** 64 - 1
+
+
+def latency_profile(name):
+    '''
+    Returns
+    -------
+    dict
+        Latency profile configuration (see `LATENCY_PROFILES`).
+    '''
+    try:
+        return LATENCY_PROFILES[name]
+    except KeyError:
+        raise ValueError('Latency profile must be one of: %s' %
+                         ', '.join(sorted(LATENCY_PROFILES)))
+
+
+def appsink_string(profile=DEFAULT_LATENCY_PROFILE):
+    '''
+    Returns
+    -------
+    str
+        `appsink` element (named `app-video`) configured for latency
+        profile.
+    '''
+    config = latency_profile(profile)
+    return ('appsink name=app-video emit-signals=true max-buffers=%d '
+            'drop=%s sync=%s' % (config['max_buffers'],
+                                 str(config['drop']).lower(),
+                                 str(config['sync']).lower()))
+
+
+def queue_string(profile=DEFAULT_LATENCY_PROFILE):
+    '''
+    Returns
+    -------
+    str
+        `queue` element configured for latency profile.
+    '''
+    size = latency_profile(profile)['leaky_queue']
+    if size is None:
+        return 'queue'
+    return ('queue leaky=downstream max-size-buffers=%d max-size-bytes=0 '
+            'max-size-time=0' % size)
+
+
+def apply_latency_profile(appsink, profile):
+    '''
+    Configure existing `appsink` element (e.g., of a user-supplied pipeline)
+    for latency profile.
+    '''
+    config = latency_profile(profile)
+    appsink.set_property('max-buffers', config['max_buffers'])
+    appsink.set_property('drop', config['drop'])
+    appsink.set_property('sync', config['sync'])
+
+
+def capture_time_ns(element, buf):
+    '''
+    Estimate capture time of buffer from its timestamp.
+
+    Parameters
+    ----------
+    element : gst.Element
+        Element (e.g., `appsink`) of a playing pipeline.
+    buf : gst.Buffer
+        Buffer pulled from `element`.
+
+    Returns
+    -------
+    int or None
+        Monotonic capture time (in nanoseconds, see `clock.monotonic_ns`),
+        i.e., now minus the time since the buffer running time, or `None` if
+        the buffer has no timestamp or the pipeline has no clock.
+    '''
+    if buf.timestamp in (None, _CLOCK_TIME_NONE):
+        return None
+    clock = element.get_clock()
+    if clock is None:
+        return None
+    running_ns = clock.get_time() - element.get_base_time()
+    return monotonic_ns() - max(0, running_ns - buf.timestamp)
+
+
+def device_source(device_name):
+    '''
+    Returns
+    -------
+    unicode
+        Video source element for device (see `pygst_utils.video_source`).
+    '''
+    # Import here, since importing `gst` before calling `parse_args` causes
+    # command-line help to be overridden by GStreamer help.
+    from .io_redirect import nostderr
+
+    with nostderr():
+        from pygst_utils.video_source import VIDEO_SOURCE_PLUGIN, DEVICE_KEY
+
+    return u'{} {}="{}"'.format(VIDEO_SOURCE_PLUGIN, DEVICE_KEY, device_name)
+
+
+def caps_string_from_json(json_source):
+    '''
+    Returns
+    -------
+    unicode
+        Caps string for video source configuration.  If the source pixel
+        format (i.e., `fourcc`) provides a luma plane (see
+        `frame_format.LUMA_FORMATS`), the native format is requested so that
+        no colorspace conversion is necessary.  Otherwise, RGB is requested.
+    '''
+    from .frame_format import LUMA_FORMATS
+
+    fourcc = json_source.get('fourcc')
+    if fourcc == 'GRAY8':
+        caps_str = u'video/x-raw-gray,bpp=8,depth=8'
+    elif fourcc in LUMA_FORMATS:
+        caps_str = u'video/x-raw-yuv,format=(fourcc){}'.format(fourcc)
+    else:
+        caps_str = u'video/x-raw-rgb'
+    return caps_str + (u',width={width:d},height={height:d},'
+                       u'framerate={framerate_num:d}/{framerate_denom:d}'
+                       .format(**json_source))
+
+
+class PipelineBuilder(object):
+    '''
+    Build scanner pipeline command:
+
+        source ! caps [! videorate] [! videoscale] [! ffmpegcolorspace]
+            [! output caps] ! queue ! appsink
+
+    `videorate` is added whenever a frame rate is requested (`framerate`,
+    or a `framerate` field of `caps`), so the rate is enforced even for
+    sources that ignore the requested frame rate.  It is placed before
+    `videoscale` (and colorspace conversion), so frames dropped to reduce
+    the frame rate are never scaled or converted.
+
+    Parameters
+    ----------
+    source : str, optional
+        Source element(s).
+    caps : str, optional
+        Caps requested from source.
+    width, height : int, optional
+        Output frame size (adds `videoscale`).
+    framerate : str, optional
+        Output frame rate, e.g., `'15/1'` (adds `videorate`).
+    rgb : bool, optional
+        Convert to RGB (adds `ffmpegcolorspace`).  By default, the source
+        format is kept (YUV and gray frames are scanned without colorspace
+        conversion).
+    latency_profile : str, optional
+        Latency profile (see `LATENCY_PROFILES`).
+    '''
+    def __init__(self, source=DEFAULT_SOURCE, caps=DEFAULT_CAPS, width=None,
+                 height=None, framerate=None, rgb=False,
+                 latency_profile=DEFAULT_LATENCY_PROFILE):
+        self.source = source
+        self.caps = caps
+        self.width = width
+        self.height = height
+        self.framerate = framerate
+        self.rgb = rgb
+        self.latency_profile = latency_profile
+
+    @classmethod
+    def from_json(cls, json_source, device_cache=None, **kwargs):
+        '''
+        Parameters
+        ----------
+        json_source : dict
+            Device configuration, including: `device_name`, `width`,
+            `height`, `framerate_num`, `framerate_denom` (and optionally
+            `fourcc`), e.g., as listed by the `device_caps` subcommand.
+        device_cache : device_cache.DeviceCache, optional
+            If specified, validate configuration against cached device
+            capabilities (if cached; the device is not probed).
+        **kwargs
+            Keyword arguments for `PipelineBuilder`.
+
+        Raises
+        ------
+        ValueError
+            If the configuration is not supported by the device, according
+            to `device_cache`.
+        '''
+        if device_cache is not None:
+            device_cache.validate(json_source)
+        caps = caps_string_from_json(json_source)
+        if caps.startswith('video/x-raw-rgb'):
+            # Source does not provide a luma plane; convert to RGB.
+            kwargs['rgb'] = True
+        return cls(device_source(json_source['device_name']), caps, **kwargs)
+
+    def output_framerate(self):
+        '''
+        Returns
+        -------
+        str or None
+            Frame rate of frames delivered to `appsink` (`framerate`, or the
+            `framerate` field of `caps`), or `None` if not specified.
+        '''
+        if self.framerate is not None:
+            return self.framerate
+        for field_i in (self.caps or '').split(',')[1:]:
+            key, _, value = field_i.partition('=')
+            if key.strip() == 'framerate':
+                return value.strip()
+        return None
+
+    def output_caps(self):
+        '''
+        Returns
+        -------
+        str or None
+            Caps of frames delivered to `appsink`, or `None` if frames are
+            delivered as produced by the source (and `caps`).
+        '''
+        caps_rgb = (self.caps or '').startswith('video/x-raw-rgb')
+        fields = []
+        if self.width is not None:
+            fields.append('width=%d' % self.width)
+        if self.height is not None:
+            fields.append('height=%d' % self.height)
+        framerate = self.output_framerate()
+        if framerate is not None:
+            fields.append('framerate=%s' % framerate)
+        if not fields and (caps_rgb or not self.rgb):
+            return None
+        if self.rgb:
+            media_type = 'video/x-raw-rgb'
+        else:
+            media_type = (self.caps.split(',')[0] if self.caps else
+                          'video/x-raw-yuv')
+        return ','.join([media_type] + fields)
+
+    def source_elements(self):
+        '''
+        Returns
+        -------
+        list
+            Pipeline elements (and caps), in order, up to (excluding) the
+            `queue` in front of the `appsink`.
+        '''
+        elements = [self.source]
+        if self.caps:
+            if self.caps.startswith('video/x-raw-rgb'):
+                # Source is converted to requested RGB caps.
+                elements.append('ffmpegcolorspace')
+            elements.append(self.caps)
+        if self.output_framerate() is not None:
+            elements.append('videorate')
+        if self.width is not None or self.height is not None:
+            elements.append('videoscale')
+        if self.rgb and not (self.caps or '').startswith('video/x-raw-rgb'):
+            elements.append('ffmpegcolorspace')
+        output_caps = self.output_caps()
+        if output_caps is not None and output_caps != self.caps:
+            elements.append(output_caps)
+        return elements
+
+    def elements(self):
+        '''
+        Returns
+        -------
+        list
+            Pipeline elements (and caps), in order.
+        '''
+        elements = self.source_elements()
+        elements.append(queue_string(self.latency_profile))
+        elements.append(appsink_string(self.latency_profile))
+        return elements
+
+    def command(self):
+        '''
+        Returns
+        -------
+        unicode
+            Pipeline command (`gst-launch` syntax).
+        '''
+        command = u' ! '.join(self.elements())
+        logger.debug('Pipeline command: %s', command)
+        return command
+
+    def source_command(self):
+        '''
+        Returns
+        -------
+        unicode
+            Source part of pipeline command (see `source_elements`), e.g., to
+            feed another sink.
+        '''
+        return u' ! '.join(self.source_elements())
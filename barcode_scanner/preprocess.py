@@ -0,0 +1,256 @@
+'''
+Second-chance preprocessing of frames that look like they contain a barcode
+but decode nothing (e.g., glare, low contrast, or slight blur).
+
+All steps are vectorized NumPy operations on the luma plane.
+'''
+import threading
+
+import numpy as np
+
+from . import frame_format
+from .clock import monotonic_ns
+from .pyramid import structure_score
+
+#: Preprocessing steps, in default order (cheapest first).
+#:
+#:  - `stretch`: Percentile contrast stretch (see `contrast_stretch`).
+#:  - `threshold`: Local adaptive threshold (see `adaptive_threshold`),
+#:    e.g., for glare or uneven illumination.
+#:  - `sharpen`: Unsharp mask (see `sharpen`), e.g., for slight blur.
+STEPS = ('stretch', 'threshold', 'sharpen')
+
+
+def box_mean(np_luma, radius):
+    '''
+    Mean of `(2 * radius + 1) x (2 * radius + 1)` neighbourhood of each
+    pixel (edges are replicated), using an integral image.
+
+    Returns
+    -------
+    numpy.ndarray
+        `uint32` array with the same shape as `np_luma`.
+    '''
+    size = 2 * radius + 1
+    padded = np.pad(np_luma, ((radius + 1, radius), (radius + 1, radius)),
+                    mode='edge')
+    padded[0] = 0
+    padded[:, 0] = 0
+    # Sums wrap around modulo 2 ** 32, but differences of sums (i.e., window
+    # sums) are exact.
+    integral = padded.cumsum(axis=0, dtype='uint32').cumsum(axis=1,
+                                                           dtype='uint32')
+    sums = (integral[size:, size:] - integral[:-size, size:] -
+            integral[size:, :-size] + integral[:-size, :-size])
+    sums //= size * size
+    return sums
+
+
+def contrast_stretch(np_luma, low=1., high=99., sample_step=4):
+    '''
+    Stretch luma range between `low` and `high` percentiles (estimated from
+    every `sample_step`-th pixel) to full 8-bit range.
+
+    Returns
+    -------
+    numpy.ndarray
+        Stretched luma plane.
+    '''
+    sample = np_luma[::sample_step, ::sample_step]
+    lower, upper = np.percentile(sample, (low, high))
+    if upper - lower < 1:
+        return np_luma
+    lut = np.clip((np.arange(256) - lower) * (255. / (upper - lower)), 0,
+                  255).astype('uint8')
+    return lut[np_luma]
+
+
+def adaptive_threshold(np_luma, radius=15, offset=7):
+    '''
+    Binarize luma plane against the mean of each pixel's neighbourhood, so
+    bars are separated from spaces regardless of (local) illumination.
+
+    Returns
+    -------
+    numpy.ndarray
+        Binary (0 or 255) luma plane.
+    '''
+    mean = box_mean(np_luma, radius)
+    mask = np_luma.astype('uint32') + offset > mean
+    return mask.view('uint8') * np.uint8(255)
+
+
+def sharpen(np_luma, amount=1., radius=1):
+    '''
+    Unsharp mask, i.e., add `amount` times the difference between each
+    pixel and its neighbourhood mean.
+
+    Returns
+    -------
+    numpy.ndarray
+        Sharpened luma plane.
+    '''
+    blurred = box_mean(np_luma, radius).astype('float32')
+    sharpened = np_luma.astype('float32')
+    sharpened -= blurred
+    sharpened *= amount
+    sharpened += np_luma
+    return np.clip(sharpened, 0, 255, out=sharpened).astype('uint8')
+
+
+_STEP_FUNCTIONS = {'stretch': contrast_stretch,
+                   'threshold': adaptive_threshold,
+                   'sharpen': sharpen}
+
+
+class RetryPreprocessor(object):
+    '''
+    Second-chance scan of frames where nothing was decoded.
+
+    Only frames with barcode-like structure (i.e., a `structure_score` of at
+    least `min_structure`) are retried.  Each preprocessing step in `steps`
+    is applied to the original luma plane and the result is rescanned, until
+    symbols are found.
+
+    Retries are bounded by `time_budget` per frame: a step is only started
+    if its expected duration (moving average of previous runs) fits in the
+    remaining budget.
+
+    Parameters
+    ----------
+    steps : tuple, optional
+        Preprocessing steps, in order (see `STEPS`).
+    min_structure : float, optional
+        Minimum `structure_score` (at half resolution) to retry frame.
+    edge_threshold : int, optional
+        Edge threshold of `structure_score` (lower than the default, since
+        low contrast frames have weak edges).
+    time_budget : float, optional
+        Maximum time (in seconds) spent retrying a frame.
+    smoothing : float, optional
+        Weight of newest sample in moving average of step durations.
+
+    Attributes
+    ----------
+    stats : dict
+        Number of frames `retried`, `gated` (no barcode-like structure), and
+        `recovered` (symbols found), number of symbols recovered per step
+        (`recovered_by`), number of steps skipped to stay within the time
+        budget (`over_budget`), and total time spent retrying (`retry_ns`;
+        including the structure check).
+    '''
+    def __init__(self, steps=STEPS, min_structure=0.02, edge_threshold=24,
+                 time_budget=0.015, smoothing=0.2):
+        for step_i in steps:
+            if step_i not in _STEP_FUNCTIONS:
+                raise ValueError('Preprocessing step must be one of: %s' %
+                                 ', '.join(STEPS))
+        self.steps = tuple(steps)
+        self.min_structure = min_structure
+        self.edge_threshold = edge_threshold
+        self.time_budget = time_budget
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __reduce__(self):
+        # Picklable (e.g., for decode worker processes); statistics are not
+        # included.
+        return (RetryPreprocessor, (self.steps, self.min_structure,
+                                    self.edge_threshold, self.time_budget,
+                                    self.smoothing))
+
+    def reset(self):
+        with self._lock:
+            self.stats = {'retried': 0, 'gated': 0, 'recovered': 0,
+                          'recovered_by': dict.fromkeys(self.steps, 0),
+                          'over_budget': 0, 'retry_ns': 0}
+            # Moving average of duration (in nanoseconds) of each step.
+            self._step_ns = dict.fromkeys(self.steps, 0)
+
+    def _update(self, step, duration_ns):
+        # Must be called with lock held.
+        average = self._step_ns[step]
+        self._step_ns[step] = (duration_ns if not average else
+                               average + self.smoothing * (duration_ns -
+                                                           average))
+
+    def retry(self, image_scanner, np_img, capture_ns=None, pool=None):
+        '''
+        Retry frame where no symbols were decoded.
+
+        Parameters
+        ----------
+        image_scanner : zbar.ImageScanner
+            Scanner to use.
+        np_img : numpy.ndarray
+            Video frame (RGB or luma).
+        capture_ns : int, optional
+            Monotonic capture time of frame (in nanoseconds).
+        pool : buffer_pool.BufferPool, optional
+            Pool to convert preprocessed frames into `zbar` images.
+
+        Returns
+        -------
+        list
+            List of recovered symbol records (empty if none were found).
+        '''
+        from .scanner import scan_frame
+
+        start_ns = monotonic_ns()
+        budget_ns = self.time_budget * 1e9
+        np_luma = frame_format.luma(np_img)
+        symbols = []
+        step = None
+        if structure_score(np_luma[::2, ::2], self.edge_threshold) < \
+                self.min_structure:
+            with self._lock:
+                self.stats['gated'] += 1
+                self.stats['retry_ns'] += monotonic_ns() - start_ns
+            return symbols
+
+        durations = []
+        over_budget = 0
+        for step_i in self.steps:
+            step_start_ns = monotonic_ns()
+            if step_start_ns - start_ns + self._step_ns[step_i] > budget_ns:
+                over_budget += 1
+                continue
+            np_processed = _STEP_FUNCTIONS[step_i](np_luma)
+            symbols = scan_frame(image_scanner, np_processed,
+                                 capture_ns=capture_ns, pool=pool)
+            durations.append((step_i, monotonic_ns() - step_start_ns))
+            if symbols:
+                step = step_i
+                break
+
+        with self._lock:
+            for step_i, duration_i in durations:
+                self._update(step_i, duration_i)
+            self.stats['retried'] += 1
+            self.stats['over_budget'] += over_budget
+            self.stats['retry_ns'] += monotonic_ns() - start_ns
+            if step is not None:
+                self.stats['recovered'] += 1
+                self.stats['recovered_by'][step] += len(symbols)
+        return symbols
+
+    def summary(self):
+        '''
+        Returns
+        -------
+        dict
+            Statistics (see `stats`), with retry time in milliseconds
+            (`retry_ms`), mean time per retried frame, and mean time per
+            recovered frame (`ms_per_recovery`).
+        '''
+        with self._lock:
+            summary = dict(self.stats)
+            summary['recovered_by'] = dict(self.stats['recovered_by'])
+        retry_ms = summary.pop('retry_ns') / 1e6
+        summary['retry_ms'] = retry_ms
+        summary['ms_per_retry'] = (retry_ms / summary['retried']
+                                   if summary['retried'] else 0.)
+        summary['ms_per_recovery'] = (retry_ms / summary['recovered']
+                                      if summary['recovered'] else None)
+        return summary
@@ -0,0 +1,426 @@
+import logging
+import mmap
+import multiprocessing
+import Queue
+import signal
+import threading
+
+import numpy as np
+
+from .clock import monotonic_ns
+
+logger = logging.getLogger(__name__)
+
+#: Slot states of `SharedFrameRing`.
+FREE, WRITING, READY, DECODING = range(4)
+#: Default ring slot size (in bytes), i.e., a 2160p (4K) RGB frame.  Anonymous
+#: shared memory is only committed when written, so unused slot space costs
+#: address space only.
+DEFAULT_SLOT_BYTES = 3840 * 2160 * 3
+#: Interval (in seconds) at which the collector checks for dead workers.
+WORKER_CHECK_INTERVAL = 0.5
+
+
+class SharedFrameRing(object):
+    '''
+    Ring of fixed-size frame slots in anonymous shared memory.
+
+    The memory is mapped before worker processes are forked, so frames
+    written by the parent are read by workers in place (no pickling).  The
+    state and job id of each slot are kept in a shared array, and every
+    state transition happens under the array lock:
+
+     - Parent: `FREE` (or oldest `READY`, see `acquire`) -> `WRITING` ->
+       `READY` (see `publish`).
+     - Worker: `READY` -> `DECODING` (see `claim`) -> `FREE` (see
+       `release`).
+
+    A worker only claims a slot if it still holds the job the worker was
+    told about, so a slot that was reused for a newer frame is never
+    decoded under a stale job id.
+    '''
+    def __init__(self, slots, slot_bytes):
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.buffer = mmap.mmap(-1, slots * slot_bytes)
+        self.states = multiprocessing.Array('i', slots)
+        self.jobs = multiprocessing.Array('l', slots, lock=False)
+
+    def view(self, slot, shape):
+        '''
+        Returns
+        -------
+        numpy.ndarray
+            Writable 8-bit view of frame slot with `shape`.
+        '''
+        return np.ndarray(shape, dtype='uint8', buffer=self.buffer,
+                          offset=slot * self.slot_bytes)
+
+    def acquire(self):
+        '''
+        Acquire slot for writing.
+
+        Free slots are used first.  If no slot is free, the slot of the
+        oldest frame not yet claimed by a worker is reused (newest frame
+        wins).
+
+        Returns
+        -------
+        tuple
+            `(slot, displaced_job)`, where `displaced_job` is the job id of
+            the reused slot (or `None`).  `slot` is `None` if all slots are
+            being decoded.
+        '''
+        states = self.states
+        with states.get_lock():
+            ready = []
+            for slot_i in xrange(self.slots):
+                if states[slot_i] == FREE:
+                    states[slot_i] = WRITING
+                    return slot_i, None
+                elif states[slot_i] == READY:
+                    ready.append(slot_i)
+            if not ready:
+                return None, None
+            slot = min(ready, key=lambda i: self.jobs[i])
+            states[slot] = WRITING
+            return slot, self.jobs[slot]
+
+    def publish(self, slot, job_id):
+        '''
+        Mark slot written by job `job_id` as ready for decoding.
+        '''
+        with self.states.get_lock():
+            self.jobs[slot] = job_id
+            self.states[slot] = READY
+
+    def claim(self, slot, job_id):
+        '''
+        Returns
+        -------
+        bool
+            `True` if slot was claimed for decoding, or `False` if slot no
+            longer holds job `job_id` (i.e., the frame was dropped).
+        '''
+        with self.states.get_lock():
+            if self.states[slot] == READY and self.jobs[slot] == job_id:
+                self.states[slot] = DECODING
+                return True
+            return False
+
+    def cancel(self, slot, job_id):
+        '''
+        Free slot if it holds job `job_id` and is not being decoded.
+
+        Returns
+        -------
+        bool
+            `True` if job was cancelled.
+        '''
+        with self.states.get_lock():
+            if self.states[slot] == READY and self.jobs[slot] == job_id:
+                self.states[slot] = FREE
+                return True
+            return False
+
+    def release(self, slot):
+        with self.states.get_lock():
+            self.states[slot] = FREE
+
+    def abandon(self, slot, job_id):
+        '''
+        Free slot if it is being decoded for job `job_id` (e.g., by a worker
+        that died).
+        '''
+        with self.states.get_lock():
+            if self.states[slot] == DECODING and self.jobs[slot] == job_id:
+                self.states[slot] = FREE
+
+    def close(self):
+        self.buffer.close()
+
+
+def decode_frame(image_scanner, np_img, region=None, pyramid=None,
+                 pool=None, preprocessor=None):
+    '''
+    Scan frame for symbols (see `BarcodeScanner.decode`).
+
+    Returns
+    -------
+    tuple
+        `(symbols, region)`, where `region` is the region where the symbols
+        were found, or `None` if the full frame was scanned (i.e., no region
+        was specified, or no symbols were found within the region).
+    '''
+    from .scanner import scan_frame
+
+    if region is not None:
+        symbols = scan_frame(image_scanner, np_img, region)
+        if symbols:
+            return symbols, region
+    if pyramid is not None:
+        symbols = pyramid.decode(image_scanner, np_img, pool=pool)
+    else:
+        symbols = scan_frame(image_scanner, np_img, pool=pool)
+    if not symbols and preprocessor is not None:
+        symbols = preprocessor.retry(image_scanner, np_img, pool=pool)
+    return symbols, None
+
+
+def _worker_main(index, ring, current, tasks, results):
+    from .buffer_pool import BufferPool
+    from .symbologies import create_image_scanner
+
+    # Interrupts are handled by the parent process (see `stop`).
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    image_scanners = {}
+    buffer_pool = BufferPool()
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        slot, job_id, shape, region, config, pyramid, preprocessor = task
+        # Last job of worker; dropped by parent if worker dies (see
+        # `ProcessDecodePool._check_workers`).
+        current[index] = job_id
+        if not ring.claim(slot, job_id):
+            # Slot reused for a newer frame (dropped by parent).
+            continue
+        fields = None
+        start_ns = monotonic_ns()
+        try:
+            if config not in image_scanners:
+                image_scanners[config] = create_image_scanner(config)
+            symbols, region = decode_frame(image_scanners[config],
+                                           ring.view(slot, shape), region,
+                                           pyramid, buffer_pool, preprocessor)
+            fields = [(s.type, s.data, s.location) for s in symbols]
+        except Exception:
+            logger.exception('Error decoding frame.')
+        finally:
+            ring.release(slot)
+        results.put((job_id, fields, region, monotonic_ns() - start_ns))
+
+
+class ProcessDecodePool(object):
+    '''
+    Pool of decode worker *processes*, fed through a `SharedFrameRing`.
+
+    Unlike `decode_pool.DecodeWorkerPool`, Python-side work (e.g., luma
+    conversion, pyramid decimation, symbol record building) is not
+    serialized by the GIL.  Each frame is copied once into a ring slot;
+    workers decode it in place and return compact `(type, data, location)`
+    results over a pipe to a collector thread.
+
+    When no slot is free, the oldest frame not yet claimed by a worker is
+    dropped; when all slots are being decoded, the new frame is dropped.
+    The frame being decoded by a worker that dies (e.g., crashes in `zbar`)
+    is dropped as well (see `_check_workers`).
+
+    Each item is submitted together with its *owner*, which must provide:
+
+     - `scanner_config`: Tuple of `zbar` configuration strings.
+     - `decode_request(item)`: Returns `(np_img, region, pyramid,
+       preprocessor)` to decode for item (see `decode_frame`).
+     - `decode_result(item, fields, region, scan_ns)`: Called from the
+       collector thread with the results of item.
+     - `decode_dropped(item)`: Called for items that were not decoded.
+
+    Requires `fork` (i.e., POSIX), since the ring is inherited by worker
+    processes.
+
+    Parameters
+    ----------
+    workers : int, optional
+        Number of worker processes (default: number of CPUs).
+    slots : int, optional
+        Number of ring slots (default: `workers + 1`, i.e., one frame may be
+        waiting while all workers are busy).
+    slot_bytes : int, optional
+        Size of each slot (in bytes).  Larger frames are dropped.
+
+    Worker processes are forked by `start`, i.e., on the calling (e.g.,
+    main) thread before frames are submitted, never from a GStreamer
+    streaming thread.
+    '''
+    def __init__(self, workers=None, slots=None,
+                 slot_bytes=DEFAULT_SLOT_BYTES):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.workers = max(1, int(workers))
+        self.slots = self.workers + 1 if slots is None else max(1, slots)
+        self.slot_bytes = slot_bytes
+        self.ring = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._next_job = 0
+        self._processes = []
+        self._current = None
+        self._dead = set()
+        self._tasks = None
+        self._results = None
+        self._collector = None
+
+    def __len__(self):
+        return len(self._jobs)
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        if self._running:
+            return
+        self.ring = SharedFrameRing(self.slots, self.slot_bytes)
+        self._tasks = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._current = multiprocessing.Array('l', [-1] * self.workers,
+                                              lock=False)
+        self._dead = set()
+        for i in xrange(self.workers):
+            process = multiprocessing.Process(target=_worker_main,
+                                              args=(i, self.ring,
+                                                    self._current,
+                                                    self._tasks,
+                                                    self._results),
+                                              name='decode-process-%d' % i)
+            process.daemon = True
+            process.start()
+            self._processes.append(process)
+        self._collector = threading.Thread(target=self._collect,
+                                           name='decode-collector')
+        self._collector.daemon = True
+        self._collector.start()
+        with self._lock:
+            self._running = True
+
+    def stop(self, timeout=None):
+        with self._lock:
+            self._running = False
+        if self._processes:
+            for process in self._processes:
+                self._tasks.put(None)
+            for process in self._processes:
+                process.join(timeout)
+                if process.is_alive():
+                    process.terminate()
+            self._processes = []
+            self._results.put(None)
+            self._collector.join(timeout)
+            self._collector = None
+        with self._lock:
+            pending = self._jobs.values()
+            self._jobs.clear()
+        for owner, item, slot in pending:
+            owner.decode_dropped(item)
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def submit(self, owner, item):
+        '''
+        Copy frame of item into a ring slot and queue it for decoding
+        without blocking the caller.
+        '''
+        np_img, region, pyramid, preprocessor = owner.decode_request(item)
+        displaced = None
+        with self._lock:
+            if not self._running:
+                slot = None
+            else:
+                if np_img.nbytes > self.ring.slot_bytes:
+                    logger.warning('Frame (%d bytes) exceeds ring slot size '
+                                   '(%d bytes); dropped.', np_img.nbytes,
+                                   self.ring.slot_bytes)
+                    slot = None
+                else:
+                    slot, displaced_job = self.ring.acquire()
+                    if displaced_job is not None:
+                        displaced = self._jobs.pop(displaced_job, None)
+            if slot is not None:
+                job_id = self._next_job
+                self._next_job += 1
+                self._jobs[job_id] = (owner, item, slot)
+        if displaced is not None:
+            displaced_owner, displaced_item, displaced_slot = displaced
+            displaced_owner.decode_dropped(displaced_item)
+        if slot is None:
+            owner.decode_dropped(item)
+            return
+
+        np.copyto(self.ring.view(slot, np_img.shape), np_img)
+        self.ring.publish(slot, job_id)
+        self._tasks.put((slot, job_id, np_img.shape, region,
+                         owner.scanner_config, pyramid, preprocessor))
+
+    def discard(self, owner):
+        '''
+        Drop frames of `owner` not yet claimed by a worker.
+        '''
+        with self._lock:
+            discarded = [(job_id, job) for job_id, job in self._jobs.items()
+                         if job[0] is owner and self.ring is not None and
+                         self.ring.cancel(job[2], job_id)]
+            for job_id, job in discarded:
+                del self._jobs[job_id]
+        for job_id, (owner, item, slot) in discarded:
+            owner.decode_dropped(item)
+
+    def _check_workers(self):
+        '''
+        Drop job of each worker that died (e.g., crashed in `zbar`, or was
+        killed) and free its slot, so frames after it are still published.
+        If no worker is left, all pending frames are dropped and new frames
+        are dropped on submission.
+        '''
+        dropped = []
+        with self._lock:
+            if not self._running:
+                # Workers exit when stopped (see `stop`).
+                return
+            for index, process in enumerate(self._processes):
+                if index in self._dead or process.is_alive():
+                    continue
+                self._dead.add(index)
+                logger.error('Decode worker `%s` died (exit code: %s).',
+                             process.name, process.exitcode)
+                job = self._jobs.pop(self._current[index], None)
+                if job is not None:
+                    self.ring.abandon(job[2], self._current[index])
+                    dropped.append(job)
+            if self._running and len(self._dead) == len(self._processes):
+                logger.error('All decode workers died; dropping frames.')
+                self._running = False
+                for job_id, job in self._jobs.items():
+                    self.ring.cancel(job[2], job_id)
+                    dropped.append(job)
+                self._jobs.clear()
+        for owner, item, slot in dropped:
+            owner.decode_dropped(item)
+
+    def _collect(self):
+        check_ns = monotonic_ns()
+        while True:
+            if monotonic_ns() - check_ns >= WORKER_CHECK_INTERVAL * 1e9:
+                check_ns = monotonic_ns()
+                self._check_workers()
+            try:
+                result = self._results.get(timeout=WORKER_CHECK_INTERVAL)
+            except Queue.Empty:
+                continue
+            if result is None:
+                break
+            job_id, fields, region, scan_ns = result
+            with self._lock:
+                job = self._jobs.pop(job_id, None)
+            if job is None:
+                continue
+            owner, item, slot = job
+            try:
+                if fields is None:
+                    owner.decode_dropped(item)
+                else:
+                    owner.decode_result(item, fields, region, scan_ns)
+            except Exception:
+                logger.exception('Error publishing decode result.')
@@ -0,0 +1,173 @@
+import threading
+
+import numpy as np
+
+from . import frame_format
+from .roi import bounding_box
+
+
+def downsample(np_luma, factor, method='stride'):
+    '''
+    Decimate luma plane by an integer factor.
+
+    Parameters
+    ----------
+    np_luma : numpy.ndarray
+        Luma plane, with shape `(height, width)`.
+    factor : int
+        Decimation factor.
+    method : str, optional
+        `'stride'`: keep every `factor`-th pixel (view, no copy).
+
+        `'box'`: average each `factor x factor` block.
+
+    Returns
+    -------
+    numpy.ndarray
+        Decimated luma plane.
+    '''
+    if factor == 1:
+        return np_luma
+    elif method == 'stride':
+        return np_luma[::factor, ::factor]
+    elif method == 'box':
+        height, width = (np_luma.shape[0] // factor,
+                         np_luma.shape[1] // factor)
+        blocks = np_luma[:height * factor, :width * factor]\
+            .reshape(height, factor, width, factor)
+        return (blocks.sum(axis=(1, 3), dtype='uint32') //
+                (factor * factor)).astype('uint8')
+    raise ValueError('Unsupported downsample method: `%s`' % method)
+
+
+def structure_score(np_luma, edge_threshold=48):
+    '''
+    Cheap measure of barcode-like structure, i.e., the fraction of pixels
+    with a strong horizontal or vertical intensity edge.
+
+    Returns
+    -------
+    float
+        Fraction of pixels (between 0 and 1) on a strong edge.
+    '''
+    np_luma = np_luma.astype('int16')
+    edges_x = np.abs(np.diff(np_luma[:-1], axis=1)) > edge_threshold
+    edges_y = np.abs(np.diff(np_luma[:, :-1], axis=0)) > edge_threshold
+    return (edges_x | edges_y).mean()
+
+
+class ScanPyramid(object):
+    '''
+    Coarse-to-fine scanning strategy.
+
+    Each frame is first scanned at the coarsest level (i.e., decimated by the
+    largest factor) in `levels`.  Scanning escalates to the next finer level
+    (and finally to full resolution) only if the coarse scan *nearly* finds
+    a symbol, i.e., the decimated frame has a `structure_score` of at least
+    `near_miss`.  When a level finds symbols, the matching region is rescanned
+    at full resolution (or the full frame, if `escalate` is `'full'`).
+
+    Since most frames contain no barcode, most frames are only scanned at
+    the coarsest level.
+
+    Parameters
+    ----------
+    levels : tuple, optional
+        Decimation factors of coarse levels (coarse to fine).
+    method : str, optional
+        Decimation method (see `downsample`).
+    near_miss : float, optional
+        Minimum `structure_score` of level to escalate to next finer level.
+    escalate : str, optional
+        `'region'`: rescan padded region around symbols found at a coarse
+        level at full resolution.
+
+        `'full'`: rescan full frame at full resolution.
+    padding : int, optional
+        Padding (in full resolution pixels) around region rescanned after a
+        coarse level hit.
+
+    Attributes
+    ----------
+    stats : dict
+        Hit and miss counts per level (decimation factor; full resolution is
+        level 1), e.g., `{4: {'hits': 3, 'misses': 120}, ...}`.
+    '''
+    def __init__(self, levels=(4, 2), method='stride', near_miss=0.02,
+                 escalate='region', padding=32):
+        self.levels = tuple(sorted(set(levels) - set([1]), reverse=True))
+        self.method = method
+        self.near_miss = near_miss
+        self.escalate = escalate
+        self.padding = padding
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __reduce__(self):
+        # Picklable (e.g., for decode worker processes); statistics are not
+        # included.
+        return (ScanPyramid, (self.levels, self.method, self.near_miss,
+                              self.escalate, self.padding))
+
+    def reset(self):
+        with self._lock:
+            self.stats = dict([(level_i, {'hits': 0, 'misses': 0})
+                               for level_i in self.levels + (1, )])
+
+    def _count(self, level, hit):
+        with self._lock:
+            self.stats[level]['hits' if hit else 'misses'] += 1
+
+    def decode(self, image_scanner, np_img, capture_ns=None, stats=None,
+               pool=None):
+        '''
+        Scan frame for symbols, coarse to fine.
+
+        Returns
+        -------
+        list
+            List of symbol records (locations in full frame coordinates).
+        '''
+        from .scanner import scan_frame
+
+        np_luma = frame_format.luma(np_img)
+        for level_i in self.levels:
+            np_level = downsample(np_luma, level_i, self.method)
+            symbols = scan_frame(image_scanner, np_level,
+                                 capture_ns=capture_ns, scale=level_i,
+                                 stats=stats, pool=pool)
+            self._count(level_i, bool(symbols))
+            if symbols:
+                return self._refine(image_scanner, np_luma, level_i, symbols,
+                                    capture_ns, stats, pool)
+            elif structure_score(np_level) < self.near_miss:
+                # Nothing resembling a barcode; do not escalate.
+                return []
+
+        symbols = scan_frame(image_scanner, np_luma, capture_ns=capture_ns,
+                             stats=stats, pool=pool)
+        self._count(1, bool(symbols))
+        return symbols
+
+    def _refine(self, image_scanner, np_luma, level, coarse_symbols,
+                capture_ns, stats=None, pool=None):
+        '''
+        Rescan symbols found at coarse `level` at full resolution.
+        '''
+        from .scanner import scan_frame
+
+        if self.escalate == 'full':
+            region = None
+        else:
+            height, width = np_luma.shape
+            x0, y0, x1, y1 = bounding_box([s['location']
+                                           for s in coarse_symbols])
+            pad = self.padding + level
+            region = (max(0, x0 - pad), max(0, y0 - pad),
+                      min(width, x1 + pad), min(height, y1 + pad))
+        symbols = scan_frame(image_scanner, np_luma, region, capture_ns,
+                             stats=stats, pool=pool)
+        self._count(1, bool(symbols))
+        # Fall back to coarse level symbols (with scaled locations) if the
+        # full resolution rescan misses.
+        return symbols or coarse_symbols
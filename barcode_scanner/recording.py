@@ -0,0 +1,399 @@
+'''
+Raw frame recording to a memory-mapped file, and replay.
+
+File layout (little endian):
+
+ - Header (`HEADER_SIZE` bytes): magic, version, width, height, channels,
+   pixel format (e.g., `GRAY8`, `RGB`), frames per second, slot size (in
+   bytes), and number of frames.
+ - Frame slots (`slot_bytes` each): capture time (monotonic, in
+   nanoseconds, as a signed 64-bit integer), followed by the raw 8-bit
+   frame (padded to a multiple of 8 bytes).
+
+Only luma planes are kept from YUV sources (see `frame_format`), so frames
+of YUV sources are recorded as `GRAY8`.
+'''
+import logging
+import mmap
+import struct
+import threading
+import time
+
+import numpy as np
+
+from .clock import monotonic_ns
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 'BSFRAMES'
+VERSION = 1
+HEADER_FORMAT = '<8sIIII8sdQQ'
+HEADER_SIZE = 64
+#: Pixel format per number of channels.
+FORMATS = {1: 'GRAY8', 3: 'RGB', 4: 'RGBx'}
+#: Replay pacing (see `FrameReplay.play`).
+PACES = ('recorded', 'max')
+
+_TIMESTAMP = struct.Struct('<q')
+
+
+def slot_size(frame_bytes):
+    '''
+    Returns
+    -------
+    int
+        Size of frame slot (capture time and frame), padded to a multiple of
+        8 bytes.
+    '''
+    return (_TIMESTAMP.size + frame_bytes + 7) & ~7
+
+
+class FrameRecorder(object):
+    '''
+    Append raw frames (e.g., from `frame-update`) to a memory-mapped file.
+
+    The shape of the first frame determines the shape of all frames; frames
+    of any other shape are dropped.  The file is grown `chunk_frames` slots
+    at a time, and the frame count in the header is updated after every
+    frame, so an interrupted recording remains readable.
+
+    Parameters
+    ----------
+    path : str
+        Output file path (overwritten).
+    fps : float, optional
+        Nominal frames per second.  By default, the mean frame rate of the
+        recording is stored when the recorder is closed.
+    max_frames : int, optional
+        Maximum number of frames to record.
+    chunk_frames : int, optional
+        Number of slots to grow the file by.
+    '''
+    def __init__(self, path, fps=None, max_frames=None, chunk_frames=64):
+        self.path = path
+        self.fps = fps
+        self.max_frames = max_frames
+        self.chunk_frames = chunk_frames
+        self.shape = None
+        self.slot_bytes = None
+        self.frame_count = 0
+        self.dropped = 0
+        self._file = open(path, 'w+b')
+        self._mmap = None
+        self._capacity = 0
+        self._first_ns = None
+        self._last_ns = None
+        self._lock = threading.Lock()
+        self._scanner = None
+        self._handler_id = None
+
+    @property
+    def full(self):
+        return (self.max_frames is not None and
+                self.frame_count >= self.max_frames)
+
+    def _write_header(self):
+        height, width = self.shape[:2]
+        channels = 1 if len(self.shape) == 2 else self.shape[2]
+        header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, width, height,
+                             channels, FORMATS.get(channels, ''),
+                             self.fps or 0., self.slot_bytes, self.frame_count)
+        self._mmap[:len(header)] = header
+
+    def _grow(self):
+        self._capacity += self.chunk_frames
+        size = HEADER_SIZE + self._capacity * self.slot_bytes
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+
+    def append(self, np_img, capture_ns=None):
+        '''
+        Append frame.
+
+        Returns
+        -------
+        bool
+            `True` if frame was recorded.
+        '''
+        if capture_ns is None:
+            capture_ns = monotonic_ns()
+        with self._lock:
+            if self._file is None or self.full:
+                return False
+            if self.shape is None:
+                self.shape = np_img.shape
+                self.slot_bytes = slot_size(np_img.nbytes)
+            elif np_img.shape != self.shape:
+                self.dropped += 1
+                return False
+            if self.frame_count >= self._capacity:
+                self._grow()
+            offset = HEADER_SIZE + self.frame_count * self.slot_bytes
+            _TIMESTAMP.pack_into(self._mmap, offset, capture_ns)
+            np.copyto(np.ndarray(self.shape, dtype='uint8', buffer=self._mmap,
+                                 offset=offset + _TIMESTAMP.size), np_img)
+            self.frame_count += 1
+            if self._first_ns is None:
+                self._first_ns = capture_ns
+            self._last_ns = capture_ns
+            self._write_header()
+        return True
+
+    def on_frame_update(self, scanner, np_img):
+        # Capture time estimated by scanner pipeline (see
+        # `BarcodeScanner.start`), i.e., excluding handler latency.
+        self.append(np_img, scanner.capture_ns)
+
+    def attach(self, scanner):
+        '''
+        Record every frame of `scanner` (i.e., `frame-update`).
+        '''
+        self.detach()
+        self._scanner = scanner
+        self._handler_id = scanner.connect('frame-update',
+                                           self.on_frame_update)
+
+    def detach(self):
+        if self._scanner is not None:
+            self._scanner.disconnect(self._handler_id)
+            self._scanner = None
+            self._handler_id = None
+
+    def close(self):
+        '''
+        Detach from scanner, store frame rate, and truncate file to recorded
+        frames.
+        '''
+        self.detach()
+        with self._lock:
+            if self._file is None:
+                return
+            size = HEADER_SIZE
+            if self._mmap is not None:
+                if not self.fps and self.frame_count > 1:
+                    self.fps = ((self.frame_count - 1) * 1e9 /
+                                max(1, self._last_ns - self._first_ns))
+                self._write_header()
+                self._mmap.flush()
+                self._mmap.close()
+                self._mmap = None
+                size += self.frame_count * self.slot_bytes
+            self._file.truncate(size)
+            self._file.close()
+            self._file = None
+
+
+class FrameReplay(object):
+    '''
+    Read frames recorded by `FrameRecorder` as zero-copy NumPy views of the
+    memory-mapped file.
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as input_:
+            self._mmap = mmap.mmap(input_.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER_SIZE:
+            raise ValueError('Not a frame recording: `%s`' % path)
+        (magic, version, width, height, channels, format_, self.fps,
+         self.slot_bytes, frame_count) = \
+            struct.unpack_from(HEADER_FORMAT, self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a frame recording (or unsupported version): '
+                             '`%s`' % path)
+        self.format = format_.rstrip('\0')
+        self.shape = ((height, width) if channels == 1 else
+                      (height, width, channels))
+        self.frame_bytes = width * height * channels
+        # Frames beyond end of file (e.g., interrupted recording) are ignored.
+        self.frame_count = min(frame_count, (len(self._mmap) - HEADER_SIZE) //
+                               max(1, self.slot_bytes))
+
+    def __len__(self):
+        return self.frame_count
+
+    def __iter__(self):
+        for i in xrange(self.frame_count):
+            yield self.capture_ns(i), self.frame(i)
+
+    def _offset(self, i):
+        if not 0 <= i < self.frame_count:
+            raise IndexError(i)
+        return HEADER_SIZE + i * self.slot_bytes
+
+    def capture_ns(self, i):
+        return _TIMESTAMP.unpack_from(self._mmap, self._offset(i))[0]
+
+    def frame(self, i):
+        '''
+        Returns
+        -------
+        numpy.ndarray
+            Read-only view of frame `i` (invalid once replay is closed).
+        '''
+        return np.frombuffer(self._mmap, dtype='uint8',
+                             count=self.frame_bytes,
+                             offset=self._offset(i) + _TIMESTAMP.size)\
+            .reshape(self.shape)
+
+    def play(self, scanner, pace='recorded', repeat=1):
+        '''
+        Emit `frame-update` on `scanner` for every frame, i.e., frames are
+        scanned by `BarcodeScanner.process_frame` (if scanning is enabled)
+        exactly like frames of a live pipeline.
+
+        The capture time of each frame is the recorded capture time, so
+        symbol timestamps (and `capture` latencies) refer to the recording.
+
+        Parameters
+        ----------
+        scanner : BarcodeScanner
+            Scanner.
+        pace : str, optional
+            `'recorded'`: emit frames at recorded capture times.
+
+            `'max'`: emit frames as fast as they are processed.
+        repeat : int, optional
+            Number of times to play recording.
+
+        Returns
+        -------
+        int
+            Number of frames emitted.
+        '''
+        if pace not in PACES:
+            raise ValueError('Pace must be one of: %s' % ', '.join(PACES))
+        stats = scanner.stats
+        count = 0
+        for i in xrange(repeat):
+            start_ns = monotonic_ns()
+            first_ns = None
+            for capture_ns, np_img in self:
+                if pace == 'recorded':
+                    if first_ns is None:
+                        first_ns = capture_ns
+                    delay_ns = (capture_ns - first_ns) - (monotonic_ns() -
+                                                          start_ns)
+                    if delay_ns > 0:
+                        time.sleep(delay_ns * 1e-9)
+                if stats is not None:
+                    stats.count('frames_received')
+                scanner.emit_frame(np_img, capture_ns)
+                count += 1
+        return count
+
+    def close(self):
+        self._mmap.close()
+
+
+def record_main(pipeline_command, output_path, fps=None, max_frames=None,
+                duration=None):
+    '''
+    Record frames of pipeline until end of stream, `max_frames` or
+    `duration` (in seconds) is reached, or the process is interrupted (e.g.,
+    `Ctrl-C`).
+
+    Returns
+    -------
+    FrameRecorder
+        Recorder (closed).
+    '''
+    import gobject
+
+    from .io_redirect import nostderr
+    from .scanner import BarcodeScanner
+
+    gobject.threads_init()
+    scanner = BarcodeScanner()
+    recorder = FrameRecorder(output_path, fps=fps, max_frames=max_frames)
+    recorder.attach(scanner)
+    loop = gobject.MainLoop()
+
+    def on_error(bus, message):
+        error, debug = message.parse_error()
+        logger.error('Pipeline error: %s (%s)', error, debug)
+        loop.quit()
+
+    def check_full():
+        if recorder.full:
+            loop.quit()
+        return True
+
+    with nostderr():
+        pipeline, status = scanner.start(pipeline_command)
+    bus = pipeline.get_bus()
+    bus.add_signal_watch()
+    bus.connect('message::eos', lambda bus, message: loop.quit())
+    bus.connect('message::error', on_error)
+    gobject.timeout_add(100, check_full)
+    if duration:
+        gobject.timeout_add(int(duration * 1000), loop.quit)
+
+    try:
+        loop.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scanner.stop()
+        recorder.close()
+    logger.info('Recorded %d frame(s) (%.1f fps) to `%s`.',
+                recorder.frame_count, recorder.fps or 0, output_path)
+    return recorder
+
+
+def replay_main(path, output_path='-', pace='recorded', repeat=1, sinks=(),
+                **scanner_kwargs):
+    '''
+    Scan recorded frames, writing one JSON line per found symbol (and
+    publishing symbols to `sinks`, see `headless.headless_main`).
+
+    Returns
+    -------
+    BarcodeScanner
+        Scanner.
+    '''
+    import json
+    import sys
+
+    from .scanner import BarcodeScanner
+
+    replay = FrameReplay(path)
+    output = sys.stdout if output_path == '-' else open(output_path, 'a')
+    scanner = BarcodeScanner(**scanner_kwargs)
+
+    def on_symbols_found(scanner, np_img, symbols):
+        for symbol_record_i in symbols:
+            output.write(json.dumps(symbol_record_i.as_dict()) + '\n')
+        output.flush()
+
+    scanner.connect('symbols-found', on_symbols_found)
+    for sink_i in sinks:
+        sink_i.attach(scanner)
+    scanner.start_decode_pool()
+    scanner.enable_scan()
+    try:
+        count = replay.play(scanner, pace=pace, repeat=repeat)
+        # Publish frames still queued for decode workers.
+        scanner.wait_decoded()
+    except KeyboardInterrupt:
+        count = None
+    finally:
+        scanner.stop_decode_pool()
+        scanner.disable_scan()
+        # Frames are views of the memory map; release every reference before
+        # closing it.
+        scanner.status.pop('np_img', None)
+        replay.close()
+        for sink_i in sinks:
+            sink_i.close()
+        if output is not sys.stdout:
+            output.close()
+    if count is not None:
+        logger.info('Replayed %d frame(s) from `%s`.', count, path)
+    if scanner.stats is not None:
+        from .stats import format_summary
+
+        logger.info('[stats] %s', format_summary(scanner.get_stats()))
+    return scanner
@@ -0,0 +1,129 @@
+from .clock import utc_isoformat
+
+
+class SymbolRecord(object):
+    '''
+    Compact record of a symbol found in a video frame.
+
+    Only the `zbar.Symbol`, the capture time (monotonic, in nanoseconds), the
+    offset of the scanned region and the optional `source` identifier (e.g.,
+    camera name) are stored eagerly.  The `type` and `data` strings, the
+    `location` polygon (in full frame coordinates), and the ISO 8601
+    `timestamp` are only formatted when read.
+
+    For compatibility with handlers written for symbol record dictionaries,
+    fields may also be accessed by key, e.g., `record['data']`.
+    '''
+    __slots__ = ('symbol', 'capture_ns', 'offset', 'scale', 'source',
+                 '_type', '_data', '_location', '_timestamp')
+
+    #: Keys available through dictionary-style access.
+    KEYS = ('type', 'data', 'symbol', 'location', 'timestamp', 'source')
+
+    def __init__(self, symbol, capture_ns, offset=(0, 0), scale=1,
+                 source=None):
+        self.symbol = symbol
+        self.source = source
+        self.capture_ns = capture_ns
+        self.offset = offset
+        self.scale = scale
+        self._type = None
+        self._data = None
+        self._location = None
+        self._timestamp = None
+
+    @classmethod
+    def from_fields(cls, type, data, location, capture_ns, source=None):
+        '''
+        Create record without `zbar.Symbol`, e.g., from compact results of a
+        symbol decoded in another process.
+        '''
+        record = cls(None, capture_ns, source=source)
+        record._type = type
+        record._data = data
+        record._location = location
+        return record
+
+    def __repr__(self):
+        return '<SymbolRecord type=%s data=%r>' % (self.type, self.data)
+
+    @property
+    def key(self):
+        '''
+        Hashable `(type, data)` key, without string formatting.
+        '''
+        if self.symbol is None:
+            return (self._type, self._data)
+        return (self.symbol.type, self.symbol.data)
+
+    @property
+    def type(self):
+        if self._type is None:
+            self._type = str(self.symbol.type)
+        return self._type
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = str(self.symbol.data)
+        return self._data
+
+    @property
+    def location(self):
+        if self._location is None:
+            x0, y0 = self.offset
+            scale = self.scale
+            self._location = [(x * scale + x0, y * scale + y0)
+                              for x, y in self.symbol.location]
+        return self._location
+
+    @location.setter
+    def location(self, value):
+        self._location = value
+
+    @property
+    def timestamp(self):
+        if self._timestamp is None:
+            self._timestamp = utc_isoformat(self.capture_ns)
+        return self._timestamp
+
+    ###########################################################################
+    # Dictionary compatibility
+    def __getitem__(self, key):
+        if key not in self.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in ('location', 'source'):
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def get(self, key, default=None):
+        return self[key] if key in self.KEYS else default
+
+    def keys(self):
+        return list(self.KEYS)
+
+    def items(self):
+        return [(key_i, self[key_i]) for key_i in self.KEYS]
+
+    def as_dict(self):
+        '''
+        Returns
+        -------
+        dict
+            JSON-serializable fields, i.e., `type`, `data`, `location` and
+            `timestamp`, and `source` (only if set).
+        '''
+        record = {'type': self.type, 'data': self.data,
+                  'location': self.location, 'timestamp': self.timestamp}
+        if self.source is not None:
+            record['source'] = self.source
+        return record
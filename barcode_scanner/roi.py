@@ -0,0 +1,105 @@
+import threading
+
+
+def bounding_box(locations):
+    '''
+    Parameters
+    ----------
+    locations : list
+        List of symbol location polygons, each a list of `(x, y)` points.
+
+    Returns
+    -------
+    tuple
+        Bounding box `(x0, y0, x1, y1)` of all points.
+    '''
+    xs = [x for location_i in locations for x, y in location_i]
+    ys = [y for location_i in locations for x, y in location_i]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+class RoiTracker(object):
+    '''
+    Track region of interest (ROI) around most recently found symbols, such
+    that consecutive frames only need to be scanned around the last
+    detection.
+
+    A full frame scan is requested:
+
+     - when no symbols have been found by the most recent scan;
+     - every `full_scan_interval` frames while tracking (to pick up new
+       symbols outside of the ROI);
+     - when a scan restricted to the ROI finds no symbols (see
+       `BarcodeScanner.decode`).
+
+    Parameters
+    ----------
+    padding : float, optional
+        Padding added on each side of the bounding box around the symbol
+        locations, as a fraction of the bounding box size.
+    min_padding : int, optional
+        Minimum padding (in pixels).
+    full_scan_interval : int, optional
+        Maximum number of consecutive frames scanned within the ROI before a
+        full frame scan.
+    '''
+    def __init__(self, padding=0.5, min_padding=32, full_scan_interval=30):
+        self.padding = padding
+        self.min_padding = min_padding
+        self.full_scan_interval = full_scan_interval
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.roi = None
+            self.roi_scan_count = 0
+            self.stats = {'roi_scans': 0, 'roi_hits': 0, 'full_scans': 0}
+
+    def region(self, shape):
+        '''
+        Parameters
+        ----------
+        shape : tuple
+            Frame shape, i.e., `(height, width, ...)`.
+
+        Returns
+        -------
+        tuple or None
+            Region `(x0, y0, x1, y1)` to scan (clipped to frame), or `None`
+            if the full frame should be scanned.
+        '''
+        with self._lock:
+            if (self.roi is None or self.roi_scan_count >=
+                    self.full_scan_interval):
+                self.roi_scan_count = 0
+                self.stats['full_scans'] += 1
+                return None
+            self.roi_scan_count += 1
+            self.stats['roi_scans'] += 1
+            height, width = shape[:2]
+            x0, y0, x1, y1 = self.roi
+            return (max(0, x0), max(0, y0), min(width, x1), min(height, y1))
+
+    def update(self, symbols, region=None):
+        '''
+        Update ROI from symbols found in scan of `region` (or full frame).
+
+        Parameters
+        ----------
+        symbols : list
+            Symbol records; `location` of each record must be in full frame
+            coordinates.
+        region : tuple, optional
+            Region that was scanned (as returned by `region`).
+        '''
+        with self._lock:
+            if not symbols:
+                self.roi = None
+                return
+            if region is not None:
+                self.stats['roi_hits'] += 1
+            x0, y0, x1, y1 = bounding_box([s['location'] for s in symbols])
+            pad_x = max(self.min_padding, int(self.padding * (x1 - x0)))
+            pad_y = max(self.min_padding, int(self.padding * (y1 - y0)))
+            self.roi = (x0 - pad_x, y0 - pad_y, x1 + pad_x, y1 + pad_y)
@@ -1,12 +1,84 @@
-from datetime import datetime
 import logging
+import threading
+import time
 
-from pygtkhelpers.utils import gsignal
 import gobject
-import zbar
+
+from . import frame_format
+from .buffer_pool import BufferPool
+from .clock import monotonic_ns
+from .dedup import SymbolDeduplicator
+from .pipeline import (LATENCY_PROFILES, apply_latency_profile,
+                       capture_time_ns)
+from .records import SymbolRecord
+from .symbologies import create_image_scanner, scanner_config
 
 logger = logging.getLogger(__name__)
 
+#: Default `zbar` configuration, applied to every image scanner.
+SCANNER_CONFIG = scanner_config('default')
+#: Decode worker pool implementations (see `BarcodeScanner`).
+DECODE_BACKENDS = ('thread', 'process')
+
+
+def scan_frame(image_scanner, np_img, region=None, capture_ns=None,
+               scale=1, stats=None, pool=None):
+    '''
+    Scan video frame (or region of video frame) for barcode symbols.
+
+    Parameters
+    ----------
+    image_scanner : zbar.ImageScanner
+        Scanner to use.  Must not be used concurrently by another thread.
+    np_img : numpy.ndarray
+        Video frame, with shape of `(height, width, channels)` (RGB) or
+        `(height, width)` (luma).
+    region : tuple, optional
+        Region `(x0, y0, x1, y1)` of frame to scan.  By default, the full
+        frame is scanned.
+    capture_ns : int, optional
+        Monotonic capture time of frame (in nanoseconds).  By default, the
+        current time.
+    scale : int, optional
+        Scale of symbol locations, e.g., if frame is decimated.
+    stats : stats.ScanStats, optional
+        If specified, record `luma` and `scan` stage latencies.
+    pool : buffer_pool.BufferPool, optional
+        If specified, full frames are converted into a pooled luma buffer
+        and `zbar.Image` (regions, whose size varies, are not pooled).
+
+    Returns
+    -------
+    list
+        List of symbol records (see `BarcodeScanner`).
+    '''
+    import zbar
+
+    if stats is not None:
+        start_ns = monotonic_ns()
+    if region is None:
+        x0, y0 = 0, 0
+    else:
+        x0, y0, x1, y1 = region
+        np_img = np_img[y0:y1, x0:x1]
+    if pool is not None and region is None:
+        zbar_image = pool.image(np_img)
+    else:
+        np_luma = frame_format.luma(np_img)
+        height, width = np_luma.shape
+        zbar_image = zbar.Image(width, height, 'Y800',
+                                frame_format.y800_data(np_luma))
+    if stats is not None:
+        converted_ns = monotonic_ns()
+        stats.record('luma', converted_ns - start_ns)
+    image_scanner.scan(zbar_image)
+    if stats is not None:
+        stats.record('scan', monotonic_ns() - converted_ns)
+
+    if capture_ns is None:
+        capture_ns = monotonic_ns()
+    return [SymbolRecord(s, capture_ns, (x0, y0), scale) for s in zbar_image]
+
 
 class BarcodeScanner(gobject.GObject):
     '''
@@ -36,81 +108,486 @@ class BarcodeScanner(gobject.GObject):
      - `frame-update`: `(scanner, np_img)`
          * `scanner` (`BarcodeScanner`): Scanner object.
          * `np_img` (`numpy.ndarray`): Video frame, with shape of
-           `(height, width, channels)`.
+           `(height, width, channels)` for RGB buffers, or luma plane, with
+           shape of `(height, width)`, for YUV and gray buffers (see
+           `frame_format.LUMA_FORMATS`).
      - `symbols-found`: `(scanner, np_img, symbols)`
          * `scanner` (`BarcodeScanner`): Scanner object.
-         * `np_img` (`numpy.ndarray`): Video frame containing found symbols,
-           with shape of `(height, width, channels)`.
-         * `symbols` (`list`): List of symbol record dictionaries.  Each
-           record contains the following:
+         * `np_img` (`numpy.ndarray`): Video frame containing found symbols
+           (see `frame-update`).
+         * `symbols` (`list`): List of symbol records (`SymbolRecord`).
+           Each record provides the following, as attributes or through
+           dictionary-style access (e.g., `record['data']`):
              - `type` (`str`): Type of `zbar` code (e.g., `QRCODE`).
              - `data` (`str`): Data from `zbar` symbol.
              - `symbol` (`zbar.Symbol`): Symbol object.
+             - `location` (`list`): Symbol location polygon, as `(x, y)`
+               points in full frame coordinates.
              - `timestamp` (`str`): UTC timestamp in ISO 8601 format.
+             - `source`: Source identifier (see `source_id`), or `None`.
+
+    Threaded decoding
+    -----------------
+
+    By default, each frame is scanned synchronously by the `frame-update`
+    handler, i.e., on the GStreamer streaming thread.  Setting
+    `decode_workers` to a positive number instead hands each frame to a
+    single-slot queue, where the newest frame always replaces any frame not
+    yet picked up, and scans frames on a pool of `decode_workers` threads.
+    `symbols-found` is still emitted in frame order, from a decode worker
+    thread.
+
+    With a `decode_backend` of `'process'`, frames are instead decoded by
+    `decode_workers` processes (see `process_pool.ProcessDecodePool`), so
+    that Python-side decode work runs on all cores.  Frames are passed
+    through a shared memory ring (no pickling), and `symbols-found` is
+    emitted in frame order from a collector thread.  Pyramid level and
+    retry statistics are not collected by worker processes.
+
+    Region of interest tracking
+    ---------------------------
+
+    If a `roi.RoiTracker` is provided as `roi_tracker`, frames following a
+    detection are only scanned within a padded bounding box around the
+    symbol locations of the most recent detection (see `decode`).
+
+    Coarse-to-fine scanning
+    -----------------------
+
+    If a `pyramid.ScanPyramid` is provided as `pyramid`, full frame scans
+    first scan a decimated copy of the frame, and only escalate to full
+    resolution when the coarse scan finds (or nearly finds) a symbol.
+
+    Scene change gating
+    -------------------
+
+    If a `scene_gate.SceneChangeGate` is provided as `scene_gate`, frames
+    where the scene has not changed since the last scanned frame are not
+    scanned at all.
+
+    Adaptive scan rate
+    ------------------
+
+    If a `scheduler.ScanScheduler` is provided as `scheduler`, frames are
+    only scanned as permitted by its CPU budget, at a low rate while idle,
+    and at full rate after a detection (or a scene change detected by
+    `scene_gate`).
+
+    Second-chance preprocessing
+    ---------------------------
+
+    If a `preprocess.RetryPreprocessor` is provided as `preprocessor`,
+    frames with barcode-like structure where nothing was decoded are
+    preprocessed (e.g., contrast stretched) and rescanned, within a strict
+    per-frame time budget.
+
+    Symbologies
+    -----------
+
+    `scanner_config` is a list of `zbar` configuration strings, e.g., as
+    returned by `symbologies.scanner_config` (default: `SCANNER_CONFIG`,
+    i.e., the `default` profile).
+
+    Shared decode workers
+    ---------------------
+
+    Alternatively, a running `decode_pool.DecodeWorkerPool` may be provided
+    as `decode_pool` to share decode workers between several scanners (see
+    `manager.ScannerManager`).  A shared pool is neither started nor stopped
+    by the scanner.  If `source_id` is set, the `source` of every symbol
+    record is set to `source_id`.
+
+    Latency profile
+    ---------------
+
+    If `latency_profile` is set (see `pipeline.LATENCY_PROFILES`), the
+    `appsink` of the pipeline is configured for the profile when started,
+    e.g., to drop stale frames when scanning falls behind.  Pipelines built
+    with `pipeline.PipelineBuilder` are already configured.
+
+    The capture time of each frame is estimated from its buffer timestamp
+    (see `pipeline.capture_time_ns`), so the `capture` statistics stage
+    measures capture-to-decode latency, including time spent queued in the
+    pipeline.  Frames from other sources may be emitted with their capture
+    time using `emit_frame` (see `capture_ns`).
+
+    Deduplication
+    -------------
+
+    Repeated symbols are suppressed by a `dedup.SymbolDeduplicator` (by
+    default, `symbols-found` is only emitted when the set of symbols changes;
+    see `dedup.POLICIES`).
+
+    Statistics
+    ----------
+
+    If `collect_stats` is `True` (or `stats_interval` is set), per-stage
+    latency histograms and frame counters are collected (see `get_stats`),
+    and the `stats-update` signal is emitted every `stats_interval` seconds
+    while the pipeline is running (requires a GLib main loop).  When
+    disabled, no timing calls are made.
+
+     - `stats-update`: `(scanner, stats)`
+         * `scanner` (`BarcodeScanner`): Scanner object.
+         * `stats` (`dict`): Statistics (see `get_stats`).
     '''
-    gsignal('frame-update', object)  # Args: `(scanner, np_img)`
-    gsignal('symbols-found', object, object)  # Args: `(scanner, np_img, symbols)`
-
-    def __init__(self, pipeline_command=None):
+    __gsignals__ = {
+        # Args: `(scanner, np_img)`
+        'frame-update': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE,
+                         (object, )),
+        # Args: `(scanner, np_img, symbols)`
+        'symbols-found': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE,
+                          (object, object)),
+        # Args: `(scanner, stats)`
+        'stats-update': (gobject.SIGNAL_RUN_LAST, gobject.TYPE_NONE,
+                         (object, ))}
+
+    def __init__(self, pipeline_command=None, decode_workers=0,
+                 roi_tracker=None, pyramid=None, scene_gate=None,
+                 dedup=None, collect_stats=False, stats_interval=None,
+                 scanner_config=None, decode_pool=None, source_id=None,
+                 decode_backend='thread', latency_profile=None,
+                 scheduler=None, preprocessor=None):
         super(BarcodeScanner, self).__init__()
         self.pipeline_command = pipeline_command
-        self.connect('frame-update', self.process_frame)
-        self.scanner = zbar.ImageScanner()
-        self.scanner.parse_config('enable=0')
-        self.scanner.parse_config('ean8.enable=1')
-        self.scanner.parse_config('ean13.enable=1')
-        self.scanner.parse_config('upce.enable=1')
-        self.scanner.parse_config('isbn10.enable=1')
-        self.scanner.parse_config('isbn13.enable=1')
-        self.scanner.parse_config('i25.enable=1')
-        self.scanner.parse_config('upca.enable=1')
-        self.scanner.parse_config('code39.enable=1')
-        self.scanner.parse_config('qrcode.enable=1')
-        self.scanner.parse_config('code128.enable=1')
-        self.scanner.parse_config('code128.ascii=1')
-        self.scanner.parse_config('code128.min=3')
-        self.scanner.parse_config('code128.max=8')
+        self.scanner_config = (SCANNER_CONFIG if scanner_config is None
+                               else tuple(scanner_config))
+        self.scanner = create_image_scanner(self.scanner_config)
+        if decode_backend not in DECODE_BACKENDS:
+            raise ValueError('Decode backend must be one of: %s' %
+                             ', '.join(DECODE_BACKENDS))
+        self.decode_workers = decode_workers
+        self.decode_backend = decode_backend
+        if (latency_profile is not None and
+                latency_profile not in LATENCY_PROFILES):
+            raise ValueError('Latency profile must be one of: %s' %
+                             ', '.join(sorted(LATENCY_PROFILES)))
+        self.latency_profile = latency_profile
+        # Estimated capture time of frame being emitted by `start` pipeline.
+        self._capture_ns = None
+        self.decode_pool = decode_pool
+        # Pool is only started/stopped by the scanner if created by it.
+        self._owns_decode_pool = False
+        self.source_id = source_id
+        # Luma buffers and `zbar` images reused across frames (per thread).
+        self.buffer_pool = BufferPool()
+        self.roi_tracker = roi_tracker
+        self.pyramid = pyramid
+        self.scene_gate = scene_gate
+        self.scheduler = scheduler
+        self.preprocessor = preprocessor
+        self.dedup = SymbolDeduplicator() if dedup is None else dedup
+        self.stats_interval = stats_interval
+        if collect_stats or stats_interval:
+            from .stats import ScanStats
+
+            self.stats = ScanStats()
+        else:
+            self.stats = None
+        self._stats_timer = None
+        # Serializes synchronous scans (replaces racy `processing_scan` check).
+        self._scan_lock = threading.Lock()
+        # Frame sequencing, to emit `symbols-found` in frame order when
+        # decoding on worker threads.
+        self._order_lock = threading.RLock()
+        self._submit_seq = 0
+        self._next_seq = 0
+        self._decoded = {}
         self.scan_id = None
         self.pipeline = None
+        self.reset()
 
     def __dealloc__(self):
         self.stop()
 
     ###########################################################################
     # Callback methods
-    def process_frame(self, obj, np_img):
-        import PIL.Image
-        import zbar
+    @property
+    def capture_ns(self):
+        '''
+        Capture time (monotonic, in nanoseconds) of frame being emitted by
+        `emit_frame` (e.g., for `frame-update` handlers), or `None`.
+        '''
+        return self._capture_ns
+
+    def emit_frame(self, np_img, capture_ns=None):
+        '''
+        Emit `frame-update` for frame captured at `capture_ns` (monotonic, in
+        nanoseconds; default: now).
+        '''
+        self._capture_ns = capture_ns
+        try:
+            self.emit('frame-update', np_img)
+        finally:
+            self._capture_ns = None
 
-        if self.status.get('processing_scan'):
+    def process_frame(self, obj, np_img, capture_ns=None):
+        '''
+        `frame-update` handler scanning frame (see `enable_scan`).
+
+        Parameters
+        ----------
+        capture_ns : int, optional
+            Capture time of frame (default: `capture_ns`, or now).
+        '''
+        stats = self.stats
+        scene_gate = self.scene_gate
+        if scene_gate is not None and not scene_gate.changed(np_img):
+            # Scene unchanged since last scanned frame.
+            if stats is not None:
+                stats.count('frames_skipped')
+            return True
+        scheduler = self.scheduler
+        if scheduler is not None:
+            if scene_gate is not None and scene_gate.scene_changed:
+                scheduler.scene_changed()
+            if not scheduler.should_scan():
+                # Over CPU budget (or idle).
+                if stats is not None:
+                    stats.count('frames_throttled')
+                return True
+
+        if capture_ns is None:
+            capture_ns = self._capture_ns
+        if capture_ns is None:
+            capture_ns = monotonic_ns()
+        decode_pool = self.decode_pool
+        if decode_pool is not None:
+            with self._order_lock:
+                seq = self._submit_seq
+                self._submit_seq += 1
+            if scene_gate is not None:
+                scene_gate.accept()
+            decode_pool.submit(self, (seq, np_img, capture_ns))
+            return True
+
+        if not self._scan_lock.acquire(False):
+            # Previous frame is still being scanned.
+            if stats is not None:
+                stats.count('frames_dropped')
             return True
-        self.status['processing_scan'] = True
-        pil_image = PIL.Image.fromarray(np_img)
-        raw = pil_image.convert(mode='L').tobytes()
-        height, width, channels = np_img.shape
-        zbar_image = zbar.Image(width, height, 'Y800', raw)
-        self.scanner.scan(zbar_image)
-
-        symbols = [{'timestamp': datetime.utcnow().isoformat(), 'type':
-                    str(s.type), 'data': str(s.data), 'symbol': s}
-                   for s in zbar_image]
-
-        def symbols_equal(a, b):
-            key = lambda v: (v['type'], v['data'])
-            if len(a) == len(b):
-                return all([a_i[k] == b_i[k] for k in ('type', 'data')
-                            for a_i, b_i in zip(sorted(a, key=key),
-                                                sorted(b, key=key))])
-            return False
-
-        if symbols and not symbols_equal(symbols, self.status.get('symbols',
-                                                                  [])):
+        if scene_gate is not None:
+            scene_gate.accept()
+        try:
+            self.status['processing_scan'] = True
+            start_ns = monotonic_ns()
+            symbols = self.decode(self.scanner, np_img, capture_ns)
+            if scheduler is not None:
+                scheduler.record(monotonic_ns() - start_ns, bool(symbols))
+            if stats is not None:
+                stats.count('frames_scanned')
+                stats.record('capture', monotonic_ns() - capture_ns)
+            self.publish_symbols(np_img, symbols)
+        finally:
+            self.status['processing_scan'] = False
+            self._scan_lock.release()
+
+    def decode(self, image_scanner, np_img, capture_ns=None):
+        '''
+        Scan frame for symbols using `image_scanner`.
+
+        If region of interest tracking is enabled, only the tracked region is
+        scanned, falling back to a full frame scan if no symbols are found
+        within the region.
+
+        If a `preprocessor` is set and no symbols are found, the frame is
+        retried with preprocessing (see `preprocess.RetryPreprocessor`).
+
+        Returns
+        -------
+        list
+            List of symbol records.
+        '''
+        if capture_ns is None:
+            capture_ns = monotonic_ns()
+        roi_tracker = self.roi_tracker
+        if roi_tracker is None:
+            symbols = self.scan_full_frame(image_scanner, np_img, capture_ns)
+        else:
+            region = roi_tracker.region(np_img.shape)
+            if region is None:
+                symbols = self.scan_full_frame(image_scanner, np_img,
+                                               capture_ns)
+            else:
+                symbols = scan_frame(image_scanner, np_img, region,
+                                     capture_ns, stats=self.stats)
+            roi_tracker.update(symbols, region)
+            if region is not None and not symbols:
+                # Region of interest missed; fall back to full frame scan.
+                symbols = self.scan_full_frame(image_scanner, np_img,
+                                               capture_ns)
+                roi_tracker.update(symbols)
+        if not symbols and self.preprocessor is not None:
+            symbols = self.retry(image_scanner, np_img, capture_ns)
+        return symbols
+
+    def retry(self, image_scanner, np_img, capture_ns=None):
+        '''
+        Second-chance scan of frame with preprocessing.
+        '''
+        stats = self.stats
+        if stats is not None:
+            start_ns = monotonic_ns()
+        symbols = self.preprocessor.retry(image_scanner, np_img, capture_ns,
+                                          self.buffer_pool)
+        if stats is not None:
+            stats.record('retry', monotonic_ns() - start_ns)
+        if symbols and self.roi_tracker is not None:
+            self.roi_tracker.update(symbols)
+        return symbols
+
+    def scan_full_frame(self, image_scanner, np_img, capture_ns=None):
+        '''
+        Scan full frame, coarse to fine if a scan pyramid is configured.
+        '''
+        if self.pyramid is None:
+            return scan_frame(image_scanner, np_img, capture_ns=capture_ns,
+                              stats=self.stats, pool=self.buffer_pool)
+        return self.pyramid.decode(image_scanner, np_img, capture_ns,
+                                   self.stats, self.buffer_pool)
+
+    def publish_symbols(self, np_img, symbols):
+        '''
+        Emit `symbols-found` for symbols scanned from frame that are not
+        suppressed by the deduplication policy.
+        '''
+        symbols = self.dedup.filter(symbols)
+        if symbols:
+            if self.source_id is not None:
+                for symbol_record_i in symbols:
+                    symbol_record_i.source = self.source_id
+            stats = self.stats
+            if stats is not None:
+                start_ns = monotonic_ns()
             self.emit('symbols-found', np_img, symbols)
+            if stats is not None:
+                stats.record('emit', monotonic_ns() - start_ns)
+                stats.count('detections', len(symbols))
             self.status['symbols'] = symbols
-            self.status['np_img'] = np_img
 
         self.status['np_img'] = np_img
-        self.status['processing_scan'] = False
+
+    ###########################################################################
+    # Decode worker pool callbacks (see `DecodeWorkerPool`)
+    def decode_job(self, item, image_scanner):
+        seq, np_img, capture_ns = item
+        start_ns = monotonic_ns()
+        symbols = self.decode(image_scanner, np_img, capture_ns)
+        if self.scheduler is not None:
+            self.scheduler.record(monotonic_ns() - start_ns, bool(symbols))
+        if self.stats is not None:
+            self.stats.count('frames_scanned')
+            self.stats.record('capture', monotonic_ns() - capture_ns)
+        self._complete(seq, (np_img, symbols))
+
+    def decode_request(self, item):
+        '''
+        Returns
+        -------
+        tuple
+            `(np_img, region, pyramid, preprocessor)` to decode in a worker
+            process (see `process_pool.ProcessDecodePool`).
+        '''
+        np_img = item[1]
+        roi_tracker = self.roi_tracker
+        region = (None if roi_tracker is None
+                  else roi_tracker.region(np_img.shape))
+        return np_img, region, self.pyramid, self.preprocessor
+
+    def decode_result(self, item, fields, region, scan_ns):
+        '''
+        Publish `(type, data, location)` fields of symbols decoded in a worker
+        process.
+        '''
+        seq, np_img, capture_ns = item
+        symbols = [SymbolRecord.from_fields(type_i, data_i, location_i,
+                                            capture_ns)
+                   for type_i, data_i, location_i in fields]
+        if self.roi_tracker is not None:
+            self.roi_tracker.update(symbols, region)
+        if self.scheduler is not None:
+            self.scheduler.record(scan_ns, bool(symbols))
+        if self.stats is not None:
+            self.stats.record('scan', scan_ns)
+            self.stats.count('frames_scanned')
+            self.stats.record('capture', monotonic_ns() - capture_ns)
+        self._complete(seq, (np_img, symbols))
+
+    def decode_dropped(self, item):
+        # Frame may already be complete, e.g., if a `symbols-found` handler
+        # raised an exception after the frame was decoded.
+        if self._complete(item[0], None) and self.stats is not None:
+            self.stats.count('frames_dropped')
+
+    def _complete(self, seq, result):
+        '''
+        Record decode result for frame `seq` and publish all results that are
+        next in frame order.  Dropped frames have a result of `None`.
+
+        Returns
+        -------
+        bool
+            `False` if a result was already recorded for frame `seq`.
+        '''
+        with self._order_lock:
+            if seq < self._next_seq or seq in self._decoded:
+                return False
+            self._decoded[seq] = result
+            while self._next_seq in self._decoded:
+                result_i = self._decoded.pop(self._next_seq)
+                self._next_seq += 1
+                if result_i is not None:
+                    try:
+                        self.publish_symbols(*result_i)
+                    except Exception:
+                        # Keep publishing later frames.
+                        logger.exception('Error publishing symbols.')
+            return True
+
+    ###########################################################################
+    # Statistics
+    def get_stats(self):
+        '''
+        Returns
+        -------
+        dict or None
+            Statistics (`None` if statistics are not collected), including:
+
+             - Frame counters (see `stats.COUNTERS`), i.e., frames received
+               from the pipeline, scanned, dropped (while busy), skipped
+               (unchanged scene), and throttled (see `scheduler`), and number
+               of detections.
+             - `detections_per_second` (since previous call).
+             - `queue_depth`: Number of frames waiting to be decoded or
+               published.
+             - `stages`: Latency summary (in milliseconds) per stage (see
+               `stats.STAGES`).
+             - `buffers`: Luma buffer `allocations` and `reuses` (see
+               `buffer_pool.BufferPool`; decode worker processes keep their
+               own pools, which are not included).
+             - `scheduler`: Scan scheduler summary (if `scheduler` is set;
+               see `scheduler.ScanScheduler.summary`).
+             - `retry`: Recovered reads and retry cost (if `preprocessor` is
+               set; see `preprocess.RetryPreprocessor.summary`).
+        '''
+        if self.stats is None:
+            return None
+        stats = self.stats.snapshot()
+        queue_depth = len(self._decoded)
+        decode_pool = self.decode_pool
+        if decode_pool is not None:
+            queue_depth += len(decode_pool)
+        stats['queue_depth'] = queue_depth
+        stats['buffers'] = dict(self.buffer_pool.stats)
+        if self.scheduler is not None:
+            stats['scheduler'] = self.scheduler.summary()
+        if self.preprocessor is not None:
+            stats['retry'] = self.preprocessor.summary()
+        return stats
+
+    def _emit_stats(self):
+        self.emit('stats-update', self.get_stats())
+        return True
 
     ###########################################################################
     # Control methods
@@ -127,7 +604,8 @@ class BarcodeScanner(gobject.GObject):
         '''
         Start scanning each frame for barcode(s).
         '''
-        self.scan_id = self.connect('frame-update', self.process_frame)
+        if self.scan_id is None:
+            self.scan_id = self.connect('frame-update', self.process_frame)
 
     def pause(self):
         '''
@@ -141,6 +619,66 @@ class BarcodeScanner(gobject.GObject):
     def reset(self):
         self.status = {'processing_frame': False,
                        'processing_scan': False}
+        if self.roi_tracker is not None:
+            self.roi_tracker.reset()
+        if self.scene_gate is not None:
+            self.scene_gate.reset()
+        if self.scheduler is not None:
+            self.scheduler.reset()
+        if self.preprocessor is not None:
+            self.preprocessor.reset()
+        self.dedup.reset()
+
+    def start_decode_pool(self):
+        '''
+        Start decode workers (if `decode_workers` is positive and no shared
+        pool was provided).
+
+        Called by `start`; only needs to be called directly to decode frames
+        from another source (e.g., `recording.FrameReplay`).
+        '''
+        if self.decode_pool is None and self.decode_workers > 0:
+            if self.decode_backend == 'process':
+                from .process_pool import ProcessDecodePool as DecodePool
+            else:
+                from .decode_pool import DecodeWorkerPool as DecodePool
+
+            self.decode_pool = DecodePool(self.decode_workers)
+            self._owns_decode_pool = True
+            self.decode_pool.start()
+
+    def wait_decoded(self, timeout=None, interval=0.01):
+        '''
+        Wait until every frame submitted to decode workers is published (or
+        dropped).
+
+        Returns
+        -------
+        bool
+            `False` if `timeout` (in seconds) elapsed first.
+        '''
+        deadline_ns = (None if timeout is None else
+                       monotonic_ns() + timeout * 1e9)
+        while True:
+            with self._order_lock:
+                if self._next_seq >= self._submit_seq:
+                    return True
+            if deadline_ns is not None and monotonic_ns() >= deadline_ns:
+                return False
+            time.sleep(interval)
+
+    def stop_decode_pool(self):
+        '''
+        Stop decode workers started by `start_decode_pool`.  Pending frames
+        are dropped.
+        '''
+        if self._owns_decode_pool:
+            decode_pool, self.decode_pool = self.decode_pool, None
+            self._owns_decode_pool = False
+            decode_pool.stop()
+        elif self.decode_pool is not None:
+            # Shared pool; only drop this scanner's pending frame.
+            self.decode_pool.discard(self)
 
     def start(self, pipeline_command=None, enable_scan=False):
         '''
@@ -163,21 +701,35 @@ class BarcodeScanner(gobject.GObject):
         pipeline = gst.parse_launch(unicode(pipeline_command).encode('utf-8'))
         self.pipeline = pipeline
         app = pipeline.get_by_name('app-video')
+        if self.latency_profile is not None:
+            apply_latency_profile(app, self.latency_profile)
         self.reset()
 
         def on_new_buffer(appsink):
-            import numpy as np
-
             self.status['processing_frame'] = True
+            stats = self.stats
+            if stats is not None:
+                start_ns = monotonic_ns()
             buf = appsink.emit('pull-buffer')
-            caps = buf.caps[0]
-            np_img = (np.frombuffer(buf.data, dtype='uint8', count=buf.size)
-                      .reshape(caps['height'], caps['width'], -1))
-            self.emit('frame-update', np_img)
+            if stats is not None:
+                pulled_ns = monotonic_ns()
+                stats.record('pull', pulled_ns - start_ns)
+            np_img = frame_format.frame_from_buffer(buf.data, buf.caps[0])
+            if stats is not None:
+                stats.record('convert', monotonic_ns() - pulled_ns)
+                stats.count('frames_received')
+            self.emit_frame(np_img, capture_time_ns(appsink, buf))
             self.status['processing_frame'] = False
 
         app.connect('new-buffer', on_new_buffer)
 
+        self.start_decode_pool()
+
+        if self.stats is not None and self.stats_interval:
+            self._stats_timer = \
+                gobject.timeout_add(int(self.stats_interval * 1000),
+                                    self._emit_stats)
+
         pipeline.set_state(gst.STATE_PAUSED)
         pipeline.set_state(gst.STATE_PLAYING)
         self.pipeline = pipeline
@@ -197,3 +749,7 @@ class BarcodeScanner(gobject.GObject):
             self.pipeline.set_state(gst.STATE_NULL)
             del self.pipeline
             self.pipeline = None
+        self.stop_decode_pool()
+        if self._stats_timer is not None:
+            gobject.source_remove(self._stats_timer)
+            self._stats_timer = None
@@ -0,0 +1,117 @@
+import threading
+
+import numpy as np
+
+from . import frame_format
+from .clock import monotonic_ns
+
+
+def thumbnail(np_img, size=(32, 24)):
+    '''
+    Parameters
+    ----------
+    np_img : numpy.ndarray
+        Video frame (RGB or luma).
+    size : tuple, optional
+        Approximate thumbnail size, as `(width, height)`.
+
+    Returns
+    -------
+    numpy.ndarray
+        Stride-decimated luma thumbnail (as `int16`).
+    '''
+    height, width = np_img.shape[:2]
+    step_x = max(1, width // size[0])
+    step_y = max(1, height // size[1])
+    np_thumbnail = frame_format.luma(np_img[::step_y, ::step_x])
+    return np_thumbnail.astype('int16')
+
+
+class SceneChangeGate(object):
+    '''
+    Skip scanning frames where the scene has not changed since the last
+    scanned frame.
+
+    Each frame is reduced to a tiny luma thumbnail, which is compared to the
+    thumbnail of the last scanned frame by mean absolute difference.
+
+    A frame that passes the gate (see `changed`) only becomes the reference
+    once it is actually submitted for scanning (see `accept`), so frames
+    passed by the gate but then throttled or dropped do not reset the
+    reference, and gradual motion still accumulates into a change.
+
+    Parameters
+    ----------
+    threshold : float, optional
+        Minimum mean absolute difference (in 8-bit luma levels) between
+        thumbnails for a frame to be considered changed.
+    max_interval : float, optional
+        Maximum time (in seconds) between scans, regardless of scene changes.
+    size : tuple, optional
+        Approximate thumbnail size, as `(width, height)`.
+
+    Attributes
+    ----------
+    stats : dict
+        Number of `scanned` (passed) and `skipped` frames.
+    scene_changed : bool
+        `True` if the last frame passed because the scene changed (i.e., not
+        because `max_interval` elapsed).
+    '''
+    def __init__(self, threshold=3.0, max_interval=1.0, size=(32, 24)):
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.size = size
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.reference = None
+            self.reference_ns = None
+            self.scene_changed = False
+            # Thumbnail and time of last frame passed by `changed`.
+            self._candidate = None
+            self.stats = {'scanned': 0, 'skipped': 0}
+
+    def changed(self, np_img, now_ns=None):
+        '''
+        Returns
+        -------
+        bool
+            `True` if frame should be scanned, i.e., the scene has changed
+            since the last scanned frame (or `max_interval` has elapsed).
+            Call `accept` once the frame is submitted for scanning.
+        '''
+        if now_ns is None:
+            now_ns = monotonic_ns()
+        np_thumbnail = thumbnail(np_img, self.size)
+        with self._lock:
+            self.scene_changed = (self.reference is None or
+                                  self.reference.shape != np_thumbnail.shape
+                                  or np.abs(np_thumbnail -
+                                            self.reference).mean() >=
+                                  self.threshold)
+            elapsed = (0 if self.reference_ns is None else
+                       (now_ns - self.reference_ns) * 1e-9)
+            # If the clock went backwards (e.g., `now_ns` from another clock),
+            # pass the frame, so the reference time is renewed instead of the
+            # gate stalling until the clock catches up.
+            if (self.scene_changed or elapsed >= self.max_interval or
+                    elapsed < 0):
+                self._candidate = np_thumbnail, now_ns
+                self.stats['scanned'] += 1
+                return True
+            self._candidate = None
+            self.stats['skipped'] += 1
+            return False
+
+    def accept(self):
+        '''
+        Use last frame passed by `changed` as reference, i.e., the frame was
+        submitted for scanning.
+        '''
+        with self._lock:
+            if self._candidate is not None:
+                self.reference, self.reference_ns = self._candidate
+                self._candidate = None
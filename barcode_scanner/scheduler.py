@@ -0,0 +1,207 @@
+import threading
+
+from .clock import monotonic_ns
+
+#: Scheduler modes (see `ScanScheduler`).
+MODES = ('burst', 'active', 'idle')
+
+
+class ScanScheduler(object):
+    '''
+    Adapt how often frames are scanned to a per-camera CPU budget and to
+    scene activity.
+
+    Decode time is accounted against a CPU budget (a fraction of one core)
+    using a token bucket: the bucket refills at `cpu_budget` seconds of CPU
+    per second (holding at most one second worth of budget), and every scan
+    is charged its measured decode time.  Frames arriving while the bucket
+    is empty are not scanned, so, e.g., with a budget of `0.25` and a decode
+    time of 20 ms, at most ~12 frames per second are scanned, regardless of
+    the frame rate.
+
+    Modes:
+
+     - `burst`: For `burst_duration` seconds after a detection (or a scene
+       change, see `scene_changed`), frames are scanned ahead of the budget,
+       i.e., borrowing up to one second worth of budget, which is paid back
+       after the burst.  Activity during a burst extends it, but a burst
+       lasts at most `max_burst` seconds, and a burst cut off at
+       `max_burst` is followed by at least `burst_duration` seconds of
+       `active` mode, so, e.g., a code held in view does not keep the
+       scanner in burst mode.
+     - `active`: Frames are scanned as permitted by the CPU budget.
+     - `idle`: After `idle_after` seconds without detections or scene
+       changes, at most one frame is scanned every `idle_interval` seconds.
+
+    Parameters
+    ----------
+    cpu_budget : float, optional
+        Fraction of one CPU core to spend decoding (e.g., `0.5`).
+    idle_after : float, optional
+        Seconds without activity before switching to idle mode.
+    idle_interval : float, optional
+        Minimum seconds between scans in idle mode.
+    burst_duration : float, optional
+        Seconds of burst mode after activity.
+    max_burst : float, optional
+        Maximum seconds of burst mode, including extensions by activity
+        during the burst.
+    smoothing : float, optional
+        Weight of newest sample in moving averages of decode time and frame
+        interval.
+
+    Attributes
+    ----------
+    stats : dict
+        Number of frames `scanned` and `throttled` (not scanned), and number
+        of `bursts`.
+    mode : str
+        Current mode (see `MODES`).
+    decode_ms : float
+        Moving average of decode time (in milliseconds).
+    frame_interval_ms : float
+        Moving average of frame interval (in milliseconds).
+    '''
+    def __init__(self, cpu_budget=1., idle_after=10., idle_interval=1.,
+                 burst_duration=2., max_burst=10., smoothing=0.2):
+        if cpu_budget <= 0:
+            raise ValueError('CPU budget must be positive.')
+        self.cpu_budget = cpu_budget
+        self.idle_after = idle_after
+        self.idle_interval = idle_interval
+        self.burst_duration = burst_duration
+        self.max_burst = max_burst
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            now_ns = monotonic_ns()
+            self.mode = 'active'
+            self.decode_ms = 0.
+            self.frame_interval_ms = 0.
+            self.stats = {'scanned': 0, 'throttled': 0, 'bursts': 0}
+            # Available CPU time (in nanoseconds).
+            self._tokens_ns = self._capacity_ns
+            self._refill_ns = now_ns
+            self._activity_ns = now_ns
+            self._burst_until_ns = None
+            self._burst_start_ns = None
+            self._frame_ns = None
+            self._scan_ns = None
+
+    @property
+    def _capacity_ns(self):
+        return self.cpu_budget * 1e9
+
+    def _average(self, average, sample):
+        if not average:
+            return sample
+        return average + self.smoothing * (sample - average)
+
+    def _burst(self, now_ns):
+        # Must be called with lock held.
+        self._activity_ns = now_ns
+        if self._burst_until_ns is None or now_ns >= self._burst_until_ns:
+            if (self._burst_start_ns is not None and
+                    self._burst_until_ns - self._burst_start_ns >=
+                    self.max_burst * 1e9 and now_ns < self._burst_until_ns +
+                    self.burst_duration * 1e9):
+                # Previous burst was cut off at `max_burst`; stay active.
+                return
+            self.stats['bursts'] += 1
+            self._burst_start_ns = now_ns
+        self._burst_until_ns = min(now_ns + self.burst_duration * 1e9,
+                                   self._burst_start_ns + self.max_burst * 1e9)
+
+    def _update_mode(self, now_ns):
+        # Must be called with lock held.
+        if self._burst_until_ns is not None and now_ns < self._burst_until_ns:
+            self.mode = 'burst'
+        elif (now_ns - self._activity_ns) * 1e-9 >= self.idle_after:
+            self.mode = 'idle'
+        else:
+            self.mode = 'active'
+        return self.mode
+
+    def should_scan(self, now_ns=None):
+        '''
+        Called for every frame.
+
+        Returns
+        -------
+        bool
+            `True` if frame should be scanned.
+        '''
+        if now_ns is None:
+            now_ns = monotonic_ns()
+        with self._lock:
+            if self._frame_ns is not None:
+                self.frame_interval_ms = \
+                    self._average(self.frame_interval_ms,
+                                  (now_ns - self._frame_ns) / 1e6)
+            self._frame_ns = now_ns
+            if now_ns > self._refill_ns:
+                self._tokens_ns = min(self._capacity_ns, self._tokens_ns +
+                                      (now_ns - self._refill_ns) *
+                                      self.cpu_budget)
+                self._refill_ns = now_ns
+
+            mode = self._update_mode(now_ns)
+            if mode == 'burst':
+                # Scan ahead of budget, up to one second worth of debt.
+                scan = self._tokens_ns > -self._capacity_ns
+            elif mode == 'idle' and self._scan_ns is not None:
+                scan = ((now_ns - self._scan_ns) * 1e-9 >= self.idle_interval
+                        and self._tokens_ns > 0)
+            else:
+                scan = self._tokens_ns > 0
+            if scan:
+                self._scan_ns = now_ns
+                self.stats['scanned'] += 1
+            else:
+                self.stats['throttled'] += 1
+            return scan
+
+    def record(self, decode_ns, detected=False, now_ns=None):
+        '''
+        Charge decode time of scanned frame against the CPU budget, and enter
+        burst mode if symbols were detected.
+        '''
+        if now_ns is None:
+            now_ns = monotonic_ns()
+        with self._lock:
+            self.decode_ms = self._average(self.decode_ms, decode_ns / 1e6)
+            # Debt (i.e., negative tokens) is bounded by `should_scan`, which
+            # only scans ahead of budget up to one second worth of budget.
+            self._tokens_ns -= decode_ns
+            if detected:
+                self._burst(now_ns)
+
+    def scene_changed(self, now_ns=None):
+        '''
+        Enter burst mode (e.g., scene change detected by
+        `scene_gate.SceneChangeGate`).
+        '''
+        if now_ns is None:
+            now_ns = monotonic_ns()
+        with self._lock:
+            self._burst(now_ns)
+
+    def summary(self):
+        '''
+        Returns
+        -------
+        dict
+            Frame counters, current mode, moving averages of decode time and
+            frame interval, and `load`, i.e., the fraction of one core needed
+            to scan every frame.
+        '''
+        with self._lock:
+            summary = dict(self.stats)
+            summary.update(mode=self.mode, decode_ms=self.decode_ms,
+                           frame_interval_ms=self.frame_interval_ms,
+                           load=(self.decode_ms / self.frame_interval_ms
+                                 if self.frame_interval_ms else 0.))
+        return summary
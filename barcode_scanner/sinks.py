@@ -0,0 +1,365 @@
+'''
+Batched asynchronous result sinks.
+
+Each sink buffers symbol records in a bounded in-memory buffer, and writes
+them in batches (by size and time) on a background thread, so publishing
+results never blocks scanning.  Failed batches are retried, and, if a
+`spill_path` is set, spilled to disk while the receiver is down, to be
+delivered (in order) once the receiver is back.
+
+Sinks are selected by URL (see `sink_from_url`):
+
+ - `file:PATH[?max_bytes=N&backup_count=N]`: Rotating JSON lines file
+   (`JsonlFileSink`).
+ - `unix:PATH`: JSON lines over a Unix domain socket (`UnixSocketSink`).
+ - `http://...`: JSON array `POST` requests (`HttpSink`).
+'''
+from collections import deque
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import urlparse
+
+logger = logging.getLogger(__name__)
+
+#: Default size (in bytes) at which `JsonlFileSink` files are rotated.
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+class BatchedSink(object):
+    '''
+    Base class of batched sinks; subclasses implement `write`.
+
+    Parameters
+    ----------
+    batch_size : int, optional
+        Maximum number of records per batch.
+    flush_interval : float, optional
+        Maximum number of seconds a record is buffered before its batch is
+        written.
+    max_buffer : int, optional
+        Maximum number of buffered records; the oldest records are dropped
+        when the buffer is full.
+    retries : int, optional
+        Number of retries of a failed batch before it is spilled (or
+        dropped).
+    retry_interval : float, optional
+        Seconds between retries.
+    spill_path : str, optional
+        JSON lines file to spill undeliverable batches to (its directory is
+        created if necessary).
+
+    Attributes
+    ----------
+    stats : dict
+        Number of records `sent`, `spilled` (i.e., currently waiting in
+        spill file), and `dropped`, and number of `failures` (failed write
+        attempts).
+    '''
+    def __init__(self, batch_size=100, flush_interval=1., max_buffer=10000,
+                 retries=2, retry_interval=1., spill_path=None):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.retries = retries
+        self.retry_interval = retry_interval
+        self.spill_path = spill_path
+        if spill_path is not None:
+            directory = os.path.dirname(spill_path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+        self.stats = {'sent': 0, 'spilled': 0, 'dropped': 0, 'failures': 0}
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run,
+                                        name='%s-writer' %
+                                        self.__class__.__name__)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, records):
+        '''
+        Write batch of JSON-serializable records.  Must raise an exception
+        if the batch was not delivered.
+        '''
+        raise NotImplementedError
+
+    def close_connection(self):
+        '''
+        Release resources of `write` (e.g., after a failure, or on close).
+        '''
+        pass
+
+    ###########################################################################
+    # Producer (any thread)
+    def put(self, symbols):
+        '''
+        Buffer symbol records (or JSON-serializable dictionaries) without
+        blocking.
+        '''
+        with self._condition:
+            if self._closed:
+                return
+            self._buffer.extend(symbols)
+            overflow = len(self._buffer) - self.max_buffer
+            for i in xrange(overflow):
+                self._buffer.popleft()
+            if overflow > 0:
+                self.stats['dropped'] += overflow
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def attach(self, emitter):
+        '''
+        Buffer symbols of every `symbols-found` signal of `emitter` (e.g.,
+        `BarcodeScanner` or `manager.ScannerManager`; symbols are the last
+        signal argument of both).
+
+        Returns
+        -------
+        int
+            Signal handler id.
+        '''
+        return emitter.connect('symbols-found',
+                               lambda *args: self.put(args[-1]))
+
+    def close(self, timeout=None):
+        '''
+        Write buffered records and stop writer thread.
+        '''
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    ###########################################################################
+    # Writer thread
+    def _next_batch(self):
+        with self._condition:
+            deadline = None
+            while not self._closed and len(self._buffer) < self.batch_size:
+                now = time.time()
+                if self._buffer:
+                    if deadline is None:
+                        deadline = now + self.flush_interval
+                    elif now >= deadline:
+                        break
+                    self._condition.wait(deadline - now)
+                else:
+                    deadline = None
+                    self._condition.wait()
+            count = min(len(self._buffer), self.batch_size)
+            return [self._buffer.popleft() for i in xrange(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch:
+                records = [r.as_dict() if hasattr(r, 'as_dict') else r
+                           for r in batch]
+                try:
+                    if not self._drain_spill() or not self._deliver(records):
+                        self._spill(records)
+                except Exception:
+                    # E.g., spill directory removed, or disk full; keep the
+                    # writer thread running.
+                    logger.exception('%s: dropped %d record(s).',
+                                     self.__class__.__name__, len(records))
+                    self.stats['dropped'] += len(records)
+            with self._condition:
+                if self._closed and not self._buffer:
+                    break
+        try:
+            self._drain_spill()
+        except Exception:
+            logger.exception('%s: could not deliver spilled records.',
+                             self.__class__.__name__)
+        self.close_connection()
+
+    def _deliver(self, records):
+        for attempt in xrange(self.retries + 1):
+            try:
+                self.write(records)
+                self.stats['sent'] += len(records)
+                return True
+            except Exception as exception:
+                self.stats['failures'] += 1
+                logger.debug('%s: write failed: %s', self.__class__.__name__,
+                             exception)
+                self.close_connection()
+                if attempt < self.retries and not self._closed:
+                    time.sleep(self.retry_interval)
+        return False
+
+    def _spill(self, records):
+        if self.spill_path is None:
+            self.stats['dropped'] += len(records)
+            logger.warning('%s: dropped %d record(s).',
+                           self.__class__.__name__, len(records))
+            return
+        with open(self.spill_path, 'a') as output:
+            for record_i in records:
+                output.write(json.dumps(record_i) + '\n')
+        self.stats['spilled'] += len(records)
+
+    def _drain_spill(self):
+        '''
+        Deliver spilled records (oldest first).
+
+        Returns
+        -------
+        bool
+            `True` if no spilled records remain.
+        '''
+        if self.spill_path is None or not os.path.exists(self.spill_path):
+            return True
+        with open(self.spill_path) as input_:
+            records = [json.loads(line) for line in input_ if line.strip()]
+        for start in xrange(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            try:
+                self.write(batch)
+            except Exception:
+                self.stats['failures'] += 1
+                self.close_connection()
+                # Keep undelivered records.
+                with open(self.spill_path, 'w') as output:
+                    for record_i in records[start:]:
+                        output.write(json.dumps(record_i) + '\n')
+                return False
+            self.stats['sent'] += len(batch)
+            self.stats['spilled'] -= len(batch)
+        os.remove(self.spill_path)
+        return True
+
+
+class JsonlFileSink(BatchedSink):
+    '''
+    Append records to a JSON lines file, rotated when it exceeds `max_bytes`
+    (`path` is renamed to `path.1`, `path.1` to `path.2`, etc., keeping
+    `backup_count` files).  If `max_bytes` is 0 (or `None`), the file is
+    never rotated.
+    '''
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backup_count=5,
+                 **kwargs):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._output = None
+        super(JsonlFileSink, self).__init__(**kwargs)
+
+    def _rotate(self):
+        self.close_connection()
+        for i in xrange(self.backup_count - 1, 0, -1):
+            source = '%s.%d' % (self.path, i)
+            if os.path.exists(source):
+                os.rename(source, '%s.%d' % (self.path, i + 1))
+        if self.backup_count > 0:
+            os.rename(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+
+    def write(self, records):
+        if (self.max_bytes and os.path.exists(self.path) and
+                os.path.getsize(self.path) >= self.max_bytes):
+            self._rotate()
+        if self._output is None:
+            self._output = open(self.path, 'a')
+        self._output.write(''.join(json.dumps(r) + '\n' for r in records))
+        self._output.flush()
+
+    def close_connection(self):
+        if self._output is not None:
+            self._output.close()
+            self._output = None
+
+
+class UnixSocketSink(BatchedSink):
+    '''
+    Write records as JSON lines to a Unix domain (stream) socket, e.g., a
+    local collector.  The connection is (re)established as needed.
+    '''
+    def __init__(self, path, timeout=5., **kwargs):
+        self.path = path
+        self.timeout = timeout
+        self._socket = None
+        super(UnixSocketSink, self).__init__(**kwargs)
+
+    def write(self, records):
+        if self._socket is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except socket.error:
+                sock.close()
+                raise
+            self._socket = sock
+        self._socket.sendall(''.join(json.dumps(r) + '\n' for r in records))
+
+    def close_connection(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class HttpSink(BatchedSink):
+    '''
+    `POST` each batch of records to `url` as a JSON array.  Any response
+    status other than 2xx is a failure.
+    '''
+    def __init__(self, url, timeout=5., **kwargs):
+        self.url = url
+        self.timeout = timeout
+        super(HttpSink, self).__init__(**kwargs)
+
+    def write(self, records):
+        try:
+            from urllib2 import Request, urlopen
+        except ImportError:
+            from urllib.request import Request, urlopen
+
+        request = Request(self.url, json.dumps(records).encode('utf-8'),
+                          {'Content-Type': 'application/json'})
+        response = urlopen(request, timeout=self.timeout)
+        try:
+            if not 200 <= response.getcode() < 300:
+                raise IOError('HTTP status %d' % response.getcode())
+        finally:
+            response.close()
+
+
+def sink_from_url(url, **kwargs):
+    '''
+    Parameters
+    ----------
+    url : str
+        `file:PATH`, `unix:PATH`, or `http(s)://...` URL.  `file:` URLs may
+        set the `max_bytes` and `backup_count` of `JsonlFileSink` as query
+        parameters, e.g., `file:symbols.jsonl?max_bytes=1000000`.
+    **kwargs
+        Keyword arguments for `BatchedSink`.
+
+    Returns
+    -------
+    BatchedSink
+        Sink (writer thread started).
+    '''
+    if url.startswith('file:'):
+        path, _, query = url[len('file:'):].partition('?')
+        for key_i, value_i in urlparse.parse_qsl(query):
+            if key_i not in ('max_bytes', 'backup_count'):
+                raise ValueError('File sink parameter must be one of: '
+                                 'max_bytes, backup_count')
+            kwargs[key_i] = int(value_i)
+        return JsonlFileSink(path, **kwargs)
+    elif url.startswith('unix:'):
+        return UnixSocketSink(url[len('unix:'):], **kwargs)
+    elif url.startswith('http://') or url.startswith('https://'):
+        return HttpSink(url, **kwargs)
+    raise ValueError('Unsupported sink URL: `%s` (must start with `file:`, '
+                     '`unix:`, `http://` or `https://`)' % url)
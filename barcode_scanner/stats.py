@@ -0,0 +1,156 @@
+import logging
+import threading
+
+from .clock import monotonic_ns
+
+logger = logging.getLogger(__name__)
+
+#: Scan pipeline stages, in order.
+#:
+#:  - `pull`: `appsink` `pull-buffer`.
+#:  - `convert`: Buffer to NumPy frame.
+#:  - `luma`: Frame to `zbar` `Y800` image.
+#:  - `scan`: `zbar.ImageScanner.scan`.
+#:  - `retry`: Second-chance preprocessing and rescan (see `preprocess`).
+#:  - `emit`: `symbols-found` emission (i.e., all handlers).
+#:  - `render`: Preview redraw.
+#:  - `capture`: Capture (buffer timestamp) to decoded, i.e., end-to-end
+#:    latency of scanned frames (see `pipeline.capture_time_ns`).
+STAGES = ('pull', 'convert', 'luma', 'scan', 'retry', 'emit', 'render',
+          'capture')
+#: Frame counters.
+COUNTERS = ('frames_received', 'frames_scanned', 'frames_dropped',
+            'frames_skipped', 'frames_throttled', 'detections')
+
+
+class LatencyHistogram(object):
+    '''
+    Latency histogram with power-of-two microsecond buckets (constant memory
+    and O(1) recording).
+
+    Bucket `i` counts latencies below `2 ** i` microseconds (the last bucket
+    counts all larger latencies).
+    '''
+    BUCKETS = 24
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, duration_ns):
+        bucket = min(self.BUCKETS - 1, int(max(0, duration_ns) //
+                                           1000).bit_length())
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+
+    def percentile(self, q):
+        '''
+        Returns
+        -------
+        float
+            Upper bound (in milliseconds) of bucket containing the `q`-th
+            percentile latency.
+        '''
+        if not self.count:
+            return 0.
+        threshold = q / 100. * self.count
+        cumulative = 0
+        for bucket_i, count_i in enumerate(self.counts):
+            cumulative += count_i
+            if cumulative >= threshold:
+                break
+        return min(2 ** bucket_i / 1e3, self.max_ns / 1e6)
+
+    def summary(self):
+        return {'count': self.count,
+                'mean_ms': (self.total_ns / 1e6 / self.count
+                            if self.count else 0.),
+                'p50_ms': self.percentile(50),
+                'p90_ms': self.percentile(90),
+                'p99_ms': self.percentile(99),
+                'max_ms': self.max_ns / 1e6}
+
+
+class ScanStats(object):
+    '''
+    Thread-safe per-stage latency histograms and frame counters (see
+    `STAGES` and `COUNTERS`).
+    '''
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.start_ns = monotonic_ns()
+            self.histograms = dict((stage_i, LatencyHistogram())
+                                   for stage_i in STAGES)
+            self.counters = dict.fromkeys(COUNTERS, 0)
+            self._rate_ns = self.start_ns
+            self._rate_detections = 0
+
+    def record(self, stage, duration_ns):
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = LatencyHistogram()
+            self.histograms[stage].record(duration_ns)
+
+    def count(self, counter, value=1):
+        with self._lock:
+            self.counters[counter] += value
+
+    def snapshot(self):
+        '''
+        Returns
+        -------
+        dict
+            Frame counters, `detections_per_second` (since previous
+            snapshot), `uptime_seconds`, and per-stage latency summaries
+            (`stages`).
+        '''
+        now = monotonic_ns()
+        with self._lock:
+            detections = self.counters['detections']
+            elapsed = (now - self._rate_ns) / 1e9
+            snapshot = dict(self.counters)
+            snapshot['detections_per_second'] = \
+                ((detections - self._rate_detections) / elapsed
+                 if elapsed > 0 else 0.)
+            snapshot['uptime_seconds'] = (now - self.start_ns) / 1e9
+            snapshot['stages'] = dict((stage_i, histogram_i.summary())
+                                      for stage_i, histogram_i in
+                                      self.histograms.iteritems()
+                                      if histogram_i.count)
+            self._rate_ns = now
+            self._rate_detections = detections
+        return snapshot
+
+
+def format_summary(stats):
+    '''
+    Returns
+    -------
+    str
+        One-line summary of statistics snapshot (see `ScanStats.snapshot`).
+    '''
+    stages = ' '.join('%s=%.2f/%.2fms' % (stage_i, stats['stages'][stage_i]
+                                          ['p50_ms'],
+                                          stats['stages'][stage_i]['p99_ms'])
+                      for stage_i in STAGES if stage_i in stats['stages'])
+    return ('received=%(frames_received)d scanned=%(frames_scanned)d '
+            'dropped=%(frames_dropped)d skipped=%(frames_skipped)d '
+            'throttled=%(frames_throttled)d '
+            'detections/s=%(detections_per_second).1f '
+            'queue=%(queue_depth)d' % stats) + ' p50/p99: ' + stages
+
+
+def log_stats_update(scanner, stats):
+    '''
+    `stats-update` signal handler logging a summary line.
+    '''
+    logger.info('[stats] %s', format_summary(stats))
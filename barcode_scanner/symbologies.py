@@ -0,0 +1,94 @@
+#: `zbar` symbology configuration names.
+SYMBOLOGIES = ('ean8', 'ean13', 'upca', 'upce', 'isbn10', 'isbn13', 'i25',
+               'code39', 'code128', 'qrcode')
+
+#: Named symbology profiles.  Every enabled decoder costs CPU time on every
+#: scan line, so enable only the symbologies that are actually read.
+PROFILES = {'default': ('ean8', 'ean13', 'upce', 'isbn10', 'isbn13', 'i25',
+                        'upca', 'code39', 'qrcode', 'code128'),
+            'retail-1d': ('ean8', 'ean13', 'upca', 'upce'),
+            'qr-only': ('qrcode', ),
+            'lab-code128': ('code128', ),
+            'lab': ('code128', 'qrcode')}
+
+#: Additional configuration applied when a symbology is enabled.
+SYMBOLOGY_OPTIONS = {'code128': ('code128.ascii=1', 'code128.min=3',
+                                 'code128.max=8')}
+
+
+def parse_symbologies(symbologies):
+    '''
+    Parameters
+    ----------
+    symbologies : str or list
+        Profile name (see `PROFILES`), comma-separated list of symbology
+        names (see `SYMBOLOGIES`), or list of symbology names.
+
+    Returns
+    -------
+    tuple
+        Symbology names.
+    '''
+    if isinstance(symbologies, basestring):
+        if symbologies in PROFILES:
+            return PROFILES[symbologies]
+        symbologies = [s.strip() for s in symbologies.split(',') if s.strip()]
+    unknown = sorted(set(symbologies) - set(SYMBOLOGIES))
+    if unknown:
+        raise ValueError('Unknown symbology/profile: %s.  Must be one of: %s '
+                         '(or profile: %s)' % (', '.join(unknown),
+                                               ', '.join(SYMBOLOGIES),
+                                               ', '.join(sorted(PROFILES))))
+    return tuple(symbologies)
+
+
+def symbology_name(symbol_type):
+    '''
+    Returns
+    -------
+    str
+        Symbology configuration name of `zbar` symbol type (e.g., `'QRCODE'`
+        becomes `'qrcode'`).
+    '''
+    return str(symbol_type).lower().replace('_', '-')
+
+
+def scanner_config(symbologies='default', x_density=None, y_density=None):
+    '''
+    Parameters
+    ----------
+    symbologies : str or list, optional
+        Symbologies to enable (see `parse_symbologies`).
+    x_density, y_density : int, optional
+        Scan every n-th column/row (`zbar` default is 1).  Higher values scan
+        faster, but may miss small or rotated symbols.
+
+    Returns
+    -------
+    tuple
+        `zbar` configuration strings (see `create_image_scanner`).
+    '''
+    config = ['enable=0']
+    for symbology_i in parse_symbologies(symbologies):
+        config.append('%s.enable=1' % symbology_i)
+        config.extend(SYMBOLOGY_OPTIONS.get(symbology_i, ()))
+    if x_density is not None:
+        config.append('x-density=%d' % x_density)
+    if y_density is not None:
+        config.append('y-density=%d' % y_density)
+    return tuple(config)
+
+
+def create_image_scanner(config=None):
+    '''
+    Create `zbar.ImageScanner` configured with the specified `zbar`
+    configuration strings (default: `scanner_config()`).
+    '''
+    import zbar
+
+    if config is None:
+        config = scanner_config()
+    image_scanner = zbar.ImageScanner()
+    for config_i in config:
+        image_scanner.parse_config(config_i)
+    return image_scanner
@@ -0,0 +1,183 @@
+'''
+Per-frame allocation benchmark of luma conversion and `zbar.Image` creation.
+
+Synthetic frames (see `synthetic.py`) are scanned with `scan_frame`, both
+without and with a `BufferPool`.  For each resolution and mode, the
+benchmark reports per-frame latency percentiles, buffer pool allocations
+after warm-up (expected: zero), and memory growth over the run, i.e.,
+growth of resident set size, of peak resident set size (`resource`), and
+of the number of objects tracked by the garbage collector.  Where
+`tracemalloc` is available (Python 3.4+), the median peak number of bytes
+allocated per frame is reported as well (`None` on Python 2).
+
+Usage:
+
+    python benchmarks/allocations.py [-o results.json]
+        [--resolutions vga,1080p] [--frames N] [--rgb]
+'''
+from argparse import ArgumentParser
+import gc
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from barcode_scanner.buffer_pool import BufferPool
+from barcode_scanner.clock import monotonic_ns
+from barcode_scanner.scanner import scan_frame
+from barcode_scanner.symbologies import create_image_scanner
+from synthetic import RESOLUTIONS, synthetic_frames
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def rss_bytes():
+    '''
+    Returns
+    -------
+    int or None
+        Resident set size of process (Linux only).
+    '''
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError):
+        return None
+
+
+def max_rss_bytes():
+    '''
+    Returns
+    -------
+    int
+        Peak resident set size of process (`ru_maxrss` is in kilobytes on
+        Linux).
+    '''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_case(frames, pool=None, rgb=False):
+    '''
+    Scan frames (cycling through them 10 times).
+
+    Returns
+    -------
+    dict
+        Benchmark results for frames.
+    '''
+    image_scanner = create_image_scanner()
+    np_frames = [np_frame_i for data_i, np_frame_i, parameters_i in frames]
+    if rgb:
+        np_frames = [np.repeat(np_frame_i[..., np.newaxis], 3, axis=2)
+                     for np_frame_i in np_frames]
+    # Warm up (not measured).
+    scan_frame(image_scanner, np_frames[0], pool=pool)
+    allocations = pool.stats['allocations'] if pool is not None else None
+
+    latencies_ns = []
+    peaks = []
+    gc.collect()
+    rss_start = rss_bytes()
+    max_rss_start = max_rss_bytes()
+    objects_start = len(gc.get_objects())
+    for i in xrange(10):
+        for np_frame_j in np_frames:
+            if tracemalloc is not None:
+                tracemalloc.start()
+            start_ns = monotonic_ns()
+            scan_frame(image_scanner, np_frame_j, pool=pool)
+            latencies_ns.append(monotonic_ns() - start_ns)
+            if tracemalloc is not None:
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+    gc.collect()
+    rss_end = rss_bytes()
+    max_rss_end = max_rss_bytes()
+    objects_end = len(gc.get_objects())
+
+    latencies_ms = np.array(latencies_ns) / 1e6
+    result = {'frames': len(latencies_ns),
+              'latency_ms': dict(('p%d' % q, float(np.percentile(latencies_ms,
+                                                                 q)))
+                                 for q in (50, 90, 99)),
+              'rss_growth_bytes': (rss_end - rss_start
+                                   if rss_start is not None else None),
+              'max_rss_growth_bytes': max_rss_end - max_rss_start,
+              'gc_objects_growth': objects_end - objects_start,
+              'peak_bytes_per_frame': (int(np.median(peaks)) if peaks
+                                       else None)}
+    if pool is not None:
+        result['pool_allocations'] = pool.stats['allocations'] - allocations
+    return result
+
+
+def run(resolutions, count, seed=0, rgb=False):
+    '''
+    Returns
+    -------
+    list
+        Results per resolution and mode (see `run_case`).
+    '''
+    results = []
+    for resolution_i in resolutions:
+        frames = synthetic_frames(resolution_i, 'ean13', count, seed)
+        for mode_j in ('unpooled', 'pooled'):
+            pool = BufferPool() if mode_j == 'pooled' else None
+            result = {'resolution': resolution_i, 'mode': mode_j}
+            result.update(run_case(frames, pool=pool, rgb=rgb))
+            results.append(result)
+            sys.stderr.write('%s\n' % json.dumps(result, sort_keys=True))
+    return results
+
+
+def parse_args(args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    parser = ArgumentParser(description='Per-frame allocation benchmark.')
+    parser.add_argument('-o', '--output', default='-', help='Output JSON file'
+                        ' (`-` for stdout).  Default: %(default)s')
+    parser.add_argument('--resolutions', default=','.join(['vga', '720p',
+                                                           '1080p']),
+                        help='Comma-separated resolutions (%s).  Default: '
+                        '%%(default)s' % ', '.join(sorted(RESOLUTIONS)))
+    parser.add_argument('--frames', type=int, default=10, help='Distinct '
+                        'frames per resolution.  Default: %(default)s')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.  '
+                        'Default: %(default)s')
+    parser.add_argument('--rgb', action='store_true', help='Feed RGB frames '
+                        '(default: luma frames, as from YUV sources).')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    results = run(args.resolutions.split(','), args.frames, seed=args.seed,
+                  rgb=args.rgb)
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'platform': platform.platform(),
+              'python': platform.python_version(),
+              'config': {'frames': args.frames, 'seed': args.seed,
+                         'rgb': args.rgb},
+              'results': results}
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
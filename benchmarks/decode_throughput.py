@@ -0,0 +1,173 @@
+'''
+Decode throughput benchmark using synthetic barcode frames.
+
+Frames are generated offline (see `synthetic.py`) and fed through the real
+`BarcodeScanner.process_frame` path.  For each resolution and symbology, the
+benchmark reports frames per second, per-frame latency percentiles, and the
+fraction of frames where the encoded data was decoded.  Results are written
+as JSON, so that runs may be compared across versions (see `--compare`).
+
+Usage:
+
+    python benchmarks/decode_throughput.py [-o results.json]
+        [--resolutions vga,1080p] [--frames N] [--compare baseline.json]
+'''
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from barcode_scanner.clock import monotonic_ns
+from barcode_scanner.dedup import SymbolDeduplicator
+from barcode_scanner.scanner import BarcodeScanner
+from synthetic import RESOLUTIONS, SYMBOLOGIES, synthetic_frames
+
+
+def run_case(scanner, frames, rgb=False):
+    '''
+    Scan frames through `scanner.process_frame`.
+
+    Returns
+    -------
+    dict
+        Benchmark results for frames.
+    '''
+    found = []
+    handler_id = scanner.connect('symbols-found', lambda scanner, np_img,
+                                 symbols: found.extend(s.data
+                                                       for s in symbols))
+    latencies_ns = []
+    decoded = 0
+    expected = 0
+    try:
+        # Warm up (not measured).
+        scanner.process_frame(None, frames[0][1])
+        for data_i, np_frame_i, parameters_i in frames:
+            if rgb:
+                np_frame_i = np.repeat(np_frame_i[..., np.newaxis], 3, axis=2)
+            del found[:]
+            start_ns = monotonic_ns()
+            scanner.process_frame(None, np_frame_i)
+            latencies_ns.append(monotonic_ns() - start_ns)
+            if data_i is not None:
+                expected += 1
+                decoded += data_i in found
+    finally:
+        scanner.disconnect(handler_id)
+
+    latencies_ms = np.array(latencies_ns) / 1e6
+    total_seconds = latencies_ms.sum() / 1e3
+    return {'frames': len(frames),
+            'fps': len(frames) / total_seconds if total_seconds else None,
+            'latency_ms': dict(('p%d' % q, float(np.percentile(latencies_ms,
+                                                               q)))
+                               for q in (50, 90, 99)),
+            'decode_rate': decoded / float(expected) if expected else None}
+
+
+def run(resolutions, symbologies, count, seed=0, rgb=False):
+    '''
+    Returns
+    -------
+    list
+        Results per resolution and symbology (see `run_case`).
+    '''
+    # Every frame is scanned synchronously, and every detection emitted.
+    scanner = BarcodeScanner(dedup=SymbolDeduplicator(policy='always'))
+    scanner.enable_scan()
+    results = []
+    for resolution_i in resolutions:
+        for symbology_j in symbologies:
+            frames = synthetic_frames(resolution_i, symbology_j, count, seed)
+            result = {'resolution': resolution_i, 'symbology': symbology_j}
+            if not frames:
+                result['skipped'] = 'symbology not available'
+            else:
+                result.update(run_case(scanner, frames, rgb=rgb))
+            results.append(result)
+            sys.stderr.write('%s\n' % json.dumps(result, sort_keys=True))
+    return results
+
+
+def compare(results, baseline):
+    '''
+    Returns
+    -------
+    list
+        Ratio of frames per second and difference in decode rate relative to
+        baseline, per resolution and symbology.
+    '''
+    baseline_cases = dict(((r['resolution'], r['symbology']), r)
+                          for r in baseline['results'])
+    comparison = []
+    for result_i in results:
+        base_i = baseline_cases.get((result_i['resolution'],
+                                     result_i['symbology']))
+        if base_i is None or not result_i.get('fps') or not base_i.get('fps'):
+            continue
+        comparison_i = {'resolution': result_i['resolution'],
+                        'symbology': result_i['symbology'],
+                        'fps_ratio': result_i['fps'] / base_i['fps']}
+        if result_i['decode_rate'] is not None:
+            comparison_i['decode_rate_delta'] = (result_i['decode_rate'] -
+                                                 base_i['decode_rate'])
+        comparison.append(comparison_i)
+    return comparison
+
+
+def parse_args(args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    parser = ArgumentParser(description='Decode throughput benchmark.')
+    parser.add_argument('-o', '--output', default='-', help='Output JSON file'
+                        ' (`-` for stdout).  Default: %(default)s')
+    parser.add_argument('--resolutions', default=','.join(['vga', '720p',
+                                                           '1080p', '4k']),
+                        help='Comma-separated resolutions (%s).  Default: '
+                        '%%(default)s' % ', '.join(sorted(RESOLUTIONS)))
+    parser.add_argument('--symbologies', default=','.join(SYMBOLOGIES),
+                        help='Comma-separated symbologies.  Default: '
+                        '%(default)s')
+    parser.add_argument('--frames', type=int, default=30, help='Frames per '
+                        'resolution and symbology.  Default: %(default)s')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.  '
+                        'Default: %(default)s')
+    parser.add_argument('--rgb', action='store_true', help='Feed RGB frames '
+                        '(default: luma frames, as from YUV sources).')
+    parser.add_argument('--compare', metavar='BASELINE', help='Results JSON '
+                        'file of a previous run to compare against.')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    results = run(args.resolutions.split(','), args.symbologies.split(','),
+                  args.frames, seed=args.seed, rgb=args.rgb)
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'platform': platform.platform(),
+              'python': platform.python_version(),
+              'config': {'frames': args.frames, 'seed': args.seed,
+                         'rgb': args.rgb},
+              'results': results}
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            report['comparison'] = compare(results, json.load(baseline_file))
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
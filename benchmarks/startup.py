@@ -0,0 +1,130 @@
+'''
+Measure command-line startup time and imported modules per subcommand.
+
+Each command is run in a fresh interpreter.  Results are written as JSON
+(one object per command) and, with `--check`, the benchmark fails if a
+command imports heavy modules it does not need.
+
+Usage:
+
+    python benchmarks/startup.py [--repeat N] [--device NAME] [--check]
+'''
+from argparse import ArgumentParser
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#: Modules that should only be loaded by subcommands that need them.
+HEAVY_MODULES = ('gtk', 'gst', 'zbar', 'matplotlib', 'PIL', 'pygst_utils',
+                 'pygtkhelpers', 'numpy', 'pandas')
+
+#: Commands to measure, mapped to heavy modules they are allowed to import.
+COMMANDS = [(['--help'], ()),
+            (['launch', '--help'], ()),
+            (['fromjson', '--help'], ()),
+            (['scan-files', '--help'], ()),
+            (['device_list'], ('gst', 'pygst_utils', 'numpy', 'pandas'))]
+
+# Runs in child interpreter: `argv[1]` is the report path, remaining
+# arguments are passed to the command-line interface.
+CHILD_CODE = '''
+import json, sys, time
+start = time.time()
+report_path = sys.argv[1]
+modules_before = set(sys.modules)
+sys.argv = ['barcode_scanner'] + sys.argv[2:]
+error = None
+try:
+    from barcode_scanner.bin.main import main
+    main()
+except SystemExit:
+    pass
+except Exception as exception:
+    error = '%s: %s' % (type(exception).__name__, exception)
+modules = set(sys.modules) - modules_before
+with open(report_path, 'w') as output:
+    json.dump({'error': error, 'main_seconds': time.time() - start,
+               'module_count': len(modules),
+               'modules': sorted(m for m in modules
+                                 if sys.modules[m] is not None)}, output)
+'''
+
+
+def measure(command, repeat=3):
+    '''
+    Returns
+    -------
+    dict
+        Best wall time of interpreter plus command (`wall_seconds`), time
+        spent from importing the command-line interface until exit
+        (`main_seconds`), number of imported modules, and imported heavy
+        modules.
+    '''
+    handle, report_path = tempfile.mkstemp(suffix='.json')
+    os.close(handle)
+    env = dict(os.environ, PYTHONPATH=os.pathsep
+               .join([ROOT] + [p for p in [os.environ.get('PYTHONPATH')]
+                               if p]))
+    results = []
+    try:
+        for i in range(repeat):
+            start = time.time()
+            with open(os.devnull, 'w') as devnull:
+                subprocess.call([sys.executable, '-c', CHILD_CODE,
+                                 report_path] + command, stdout=devnull,
+                                stderr=devnull, env=env)
+            wall_seconds = time.time() - start
+            with open(report_path) as report_file:
+                report = json.load(report_file)
+            report['wall_seconds'] = wall_seconds
+            results.append(report)
+    finally:
+        os.remove(report_path)
+
+    best = min(results, key=lambda r: r['wall_seconds'])
+    heavy = sorted(set(m.split('.')[0] for m in best.pop('modules')) &
+                   set(HEAVY_MODULES))
+    best.update({'command': command, 'heavy_modules': heavy})
+    return best
+
+
+def parse_args(args=None):
+    if args is None:
+        args = sys.argv[1:]
+
+    parser = ArgumentParser(description='Command-line startup benchmark.')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per '
+                        'command (best is reported).  Default: %(default)s')
+    parser.add_argument('--device', help='Also measure `device_caps` for '
+                        'video device with specified name.')
+    parser.add_argument('--check', action='store_true', help='Exit with '
+                        'non-zero status if a command imports heavy modules '
+                        'it does not need.')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    args = parse_args(args)
+    commands = list(COMMANDS)
+    if args.device:
+        commands.append((['device_caps', args.device],
+                         ('gst', 'pygst_utils', 'numpy', 'pandas')))
+
+    failed = False
+    for command_i, allowed_i in commands:
+        result_i = measure(command_i, args.repeat)
+        unexpected = sorted(set(result_i['heavy_modules']) - set(allowed_i))
+        result_i['unexpected_modules'] = unexpected
+        failed = failed or bool(unexpected)
+        sys.stdout.write(json.dumps(result_i, sort_keys=True) + '\n')
+    if args.check and failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
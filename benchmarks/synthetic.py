@@ -0,0 +1,249 @@
+'''
+Synthetic barcode frame generation for benchmarks.
+
+Frames are generated offline from a seeded random number generator, so a
+given seed always produces the same frames.  EAN-13 and Code 128 symbols are
+encoded here; QR codes require the optional `qrcode` package.
+'''
+import numpy as np
+import PIL.Image
+import PIL.ImageFilter
+
+RESOLUTIONS = {'vga': (640, 480), '720p': (1280, 720), '1080p': (1920, 1080),
+               '4k': (3840, 2160)}
+SYMBOLOGIES = ('ean13', 'code128', 'qr', 'empty')
+
+_EAN_L = ('0001101', '0011001', '0010011', '0111101', '0100011', '0110001',
+          '0101111', '0111011', '0110111', '0001011')
+_EAN_G = ('0100111', '0110011', '0011011', '0100001', '0011101', '0111001',
+          '0000101', '0010001', '0001001', '0010111')
+_EAN_PARITY = ('LLLLLL', 'LLGLGG', 'LLGGLG', 'LLGGGL', 'LGLLGG', 'LGGLLG',
+               'LGGGLL', 'LGLGLG', 'LGLGGL', 'LGGLGL')
+
+# Bar/space widths of Code 128 symbol values 0-105.
+_CODE128 = ('212222 222122 222221 121223 121322 131222 122213 122312 132212 '
+            '221213 221312 231212 112232 122132 122231 113222 123122 123221 '
+            '223211 221132 221231 213212 223112 312131 311222 321122 321221 '
+            '312212 322112 322211 212123 212321 232121 111323 131123 131321 '
+            '112313 132113 132311 211313 231113 231311 112133 112331 132131 '
+            '113123 113321 133121 313121 211331 231131 213113 213311 213131 '
+            '311123 311321 331121 312113 312311 332111 314111 221411 431111 '
+            '111224 111422 121124 121421 141122 141221 112214 112412 122114 '
+            '122411 142112 142211 241211 221114 413111 241112 134111 111242 '
+            '121142 121241 114212 124112 124211 411212 421112 421211 212141 '
+            '214121 412121 111143 111341 131141 114113 114311 411113 411311 '
+            '113141 114131 311141 411131 211412 211214 211232').split()
+_CODE128_START_B = 104
+_CODE128_STOP = '2331112'
+
+
+def ean13_checksum(digits):
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return str((10 - total % 10) % 10)
+
+
+def ean13_modules(digits):
+    '''
+    Parameters
+    ----------
+    digits : str
+        12 digits (checksum digit is appended).
+
+    Returns
+    -------
+    tuple
+        `(data, modules)`, where `data` is the full 13 digit code and
+        `modules` is a string of `1` (bar) and `0` (space) modules.
+    '''
+    data = digits + ean13_checksum(digits)
+    parity = _EAN_PARITY[int(data[0])]
+    left = ''.join((_EAN_L if p == 'L' else _EAN_G)[int(d)]
+                   for p, d in zip(parity, data[1:7]))
+    right = ''.join(''.join('1' if b == '0' else '0' for b in _EAN_L[int(d)])
+                    for d in data[7:])
+    return data, '101' + left + '01010' + right + '101'
+
+
+def code128_modules(text):
+    '''
+    Encode text using Code 128 code set B.
+
+    Returns
+    -------
+    tuple
+        `(data, modules)` (see `ean13_modules`).
+    '''
+    values = [_CODE128_START_B] + [ord(c) - 32 for c in text]
+    checksum = (values[0] + sum(i * v for i, v in
+                                enumerate(values[1:], 1))) % 103
+    widths = ''.join(_CODE128[v] for v in values + [checksum]) + _CODE128_STOP
+    modules = ''.join(('1' if i % 2 == 0 else '0') * int(w)
+                      for i, w in enumerate(widths))
+    return text, modules
+
+
+def linear_symbol(modules, module_px, height_modules=40, quiet_modules=10):
+    '''
+    Returns
+    -------
+    numpy.ndarray
+        8-bit luma image of 1D symbol (black bars on white), including quiet
+        zone.
+    '''
+    row = np.array([0 if m == '1' else 255 for m in modules], dtype='uint8')
+    row = np.pad(row, quiet_modules, 'constant', constant_values=255)
+    row = np.repeat(row, module_px)
+    height = (height_modules + 2 * quiet_modules) * module_px
+    np_symbol = np.tile(row, (height, 1))
+    np_symbol[:quiet_modules * module_px] = 255
+    np_symbol[-quiet_modules * module_px:] = 255
+    return np_symbol
+
+
+def qr_symbol(text, module_px, quiet_modules=4):
+    '''
+    Returns
+    -------
+    numpy.ndarray or None
+        8-bit luma image of QR code, or `None` if the `qrcode` package is not
+        available.
+    '''
+    try:
+        import qrcode
+    except ImportError:
+        return None
+    qr = qrcode.QRCode(border=quiet_modules)
+    qr.add_data(text)
+    qr.make(fit=True)
+    matrix = np.array(qr.get_matrix(), dtype=bool)
+    np_symbol = np.where(matrix, 0, 255).astype('uint8')
+    return np.kron(np_symbol, np.ones((module_px, module_px), dtype='uint8'))
+
+
+def random_symbol(symbology, rng, module_px):
+    '''
+    Returns
+    -------
+    tuple
+        `(data, np_symbol)`, or `(None, None)` if the symbology is not
+        available.
+    '''
+    if symbology == 'ean13':
+        # A leading zero is reported by `zbar` as UPC-A (without the zero),
+        # so the first digit is nonzero to compare decoded data verbatim.
+        digits = ''.join(str(d) for d in
+                         [rng.randint(1, 10)] + list(rng.randint(0, 10,
+                                                                 size=11)))
+        data, modules = ean13_modules(digits)
+        return data, linear_symbol(modules, module_px)
+    elif symbology == 'code128':
+        # Default `zbar` configuration reads 3-8 character Code 128 symbols.
+        text = ''.join(chr(c) for c in rng.randint(ord('A'), ord('Z') + 1,
+                                                   size=6))
+        data, modules = code128_modules(text)
+        return data, linear_symbol(modules, module_px)
+    elif symbology == 'qr':
+        text = 'BENCH-%08d' % rng.randint(0, 10 ** 8)
+        np_symbol = qr_symbol(text, module_px)
+        return (None, None) if np_symbol is None else (text, np_symbol)
+    raise ValueError('Unsupported symbology: `%s`' % symbology)
+
+
+def background(width, height, rng):
+    '''
+    Returns
+    -------
+    numpy.ndarray
+        Smooth gray gradient background.
+    '''
+    x = np.linspace(0, 1, width, dtype='float32')
+    y = np.linspace(0, 1, height, dtype='float32')[:, np.newaxis]
+    level = 120 + 60 * rng.rand()
+    np_background = level + 40 * (x - 0.5) * rng.randn() + 40 * (y - 0.5) *\
+        rng.randn()
+    return np.clip(np_background, 0, 255).astype('uint8')
+
+
+def synthetic_frame(resolution, symbology, rng, module_px=3, rotation=0.,
+                    blur=0., noise=0.):
+    '''
+    Parameters
+    ----------
+    resolution : str
+        Key of `RESOLUTIONS`.
+    symbology : str
+        One of `SYMBOLOGIES`.
+    rng : numpy.random.RandomState
+        Random number generator.
+    module_px : int, optional
+        Width of narrowest bar (or QR module) in pixels.
+    rotation : float, optional
+        Rotation of symbol (in degrees).
+    blur : float, optional
+        Gaussian blur radius (in pixels).
+    noise : float, optional
+        Standard deviation of additive Gaussian noise (in 8-bit luma levels).
+
+    Returns
+    -------
+    tuple
+        `(data, np_frame)`, where `data` is the encoded data (`None` for
+        empty frames) and `np_frame` is an 8-bit luma frame of shape
+        `(height, width)`, or `(None, None)` if the symbology is not
+        available.
+    '''
+    width, height = RESOLUTIONS[resolution]
+    np_frame = background(width, height, rng)
+    data = None
+    if symbology != 'empty':
+        data, np_symbol = random_symbol(symbology, rng, module_px)
+        if np_symbol is None:
+            return None, None
+        if rotation:
+            # Rotate inverted image so that corners are filled with white.
+            symbol = PIL.Image.fromarray(255 - np_symbol)
+            np_symbol = 255 - np.asarray(symbol.rotate(rotation,
+                                                       PIL.Image.BILINEAR,
+                                                       expand=True))
+        symbol_height, symbol_width = np_symbol.shape
+        if symbol_width > width or symbol_height > height:
+            raise ValueError('Symbol (%dx%d) does not fit in %s frame.' %
+                             (symbol_width, symbol_height, resolution))
+        x0 = rng.randint(0, width - symbol_width + 1)
+        y0 = rng.randint(0, height - symbol_height + 1)
+        np_frame[y0:y0 + symbol_height, x0:x0 + symbol_width] = np_symbol
+    if blur:
+        np_frame = np.asarray(PIL.Image.fromarray(np_frame)
+                              .filter(PIL.ImageFilter.GaussianBlur(blur)))
+    if noise:
+        np_frame = np.clip(np_frame + rng.normal(0, noise, np_frame.shape),
+                           0, 255).astype('uint8')
+    return data, np.ascontiguousarray(np_frame)
+
+
+def synthetic_frames(resolution, symbology, count, seed=0,
+                     module_px=(2, 3, 4), rotation=(0., 10., 30.),
+                     blur=(0., 1.), noise=(0., 6.)):
+    '''
+    Generate frames with randomly chosen symbol size, rotation, blur and
+    noise.
+
+    Returns
+    -------
+    list
+        List of `(data, np_frame, parameters)` tuples (empty if the
+        symbology is not available).
+    '''
+    rng = np.random.RandomState(seed)
+    frames = []
+    for i in range(count):
+        parameters = {'module_px': int(rng.choice(module_px)),
+                      'rotation': float(rng.choice(rotation)),
+                      'blur': float(rng.choice(blur)),
+                      'noise': float(rng.choice(noise))}
+        data, np_frame = synthetic_frame(resolution, symbology, rng,
+                                         **parameters)
+        if np_frame is None:
+            return []
+        frames.append((data, np_frame, parameters))
+    return frames